@@ -0,0 +1,238 @@
+"""Benchmark Troupe Data
+
+Times and memory-profiles each stage of the pipeline on spreadsheets made
+by GenerateTroupeData, and compares the results against saved baselines:
+
+  read     streaming the "avail" sheet (ODS, CSV, TSV or XLSX), or with
+           --format memory, generating the rows with no spreadsheet at all
+  collate  process_row over every row (process_troupe_data)
+  relate   related troupes through the cast overlap index (see
+           TroupeRelations), also timed per cast membership, which should
+           hold steady as --rows grows
+  render   create_troupe_page for every troupe (create_troupe_pages)
+  output   unidecode and write every page (output_troupe_pages)
+
+Peak memory comes from tracemalloc where the interpreter has it, and
+otherwise from the growth in the process's peak RSS, which only shows a
+stage that pushes the peak higher than any stage before it.
+
+Command line usage:
+$ python BenchmarkTroupeData.py [--rows N ...] [--engine rows|columns]
+      [--format ods|csv|tsv|xlsx|memory] [--baseline FILE] [--save]
+      [--threshold R]
+"""
+
+import os
+import time
+
+import TroupeProfile
+
+STAGES = ("read", "collate", "relate", "render", "output")
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.2
+
+
+# returns (result, seconds, peak bytes or None)
+def measure(function, *args):
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+
+    if tracemalloc:
+        tracemalloc.start()
+    else:
+        rss_before = TroupeProfile.peak_rss()
+    start = time.time()
+    result = function(*args)
+    seconds = time.time() - start
+    if tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    elif rss_before is None:
+        peak = None
+    else:
+        peak = TroupeProfile.peak_rss() - rss_before
+    return result, seconds, peak
+
+
+def measure_stage(function, *args):
+    result, seconds, peak = measure(function, *args)
+    return result, {'seconds': seconds, 'peak_bytes': peak}
+
+
+def read_stage(filename):
+    import ProcessTroupeData
+    return list(ProcessTroupeData.load_troupe_info(filename))
+
+
+def generate_stage(rows, generate_options):
+    import itertools
+    import GenerateTroupeData
+    generate_options = dict(generate_options)
+    generate_options.pop('blank_columns', None)
+    return list(itertools.islice(
+        GenerateTroupeData.generate_rows(rows, **generate_options), 1, None))
+
+
+def collate_stage(table, engine="rows"):
+    import ProcessTroupeData
+    return ProcessTroupeData.collate_table(table, engine)
+
+
+def relate_stage(troupe_dict):
+    import ProcessTroupeData
+    import TroupeRelations
+    return TroupeRelations.related_troupes(troupe_dict,
+                                           ProcessTroupeData.RELATED_TROUPES)
+
+
+def render_stage(troupe_dict, related):
+    import ProcessTroupeData
+    templates = ProcessTroupeData.load_template_files()
+    return [ProcessTroupeData.create_troupe_page(troupe_name, troupe_data,
+                                                 templates,
+                                                 related.get(troupe_name))
+            for troupe_name, troupe_data in troupe_dict.items()]
+
+
+def output_stage(pages, output_dir):
+    import ProcessTroupeData
+    from unidecode import unidecode
+    for index, troupe_page in enumerate(pages):
+        ProcessTroupeData.write_troupe_file(
+            os.path.join(output_dir, "%d.wiki" % index),
+            unidecode(troupe_page))
+    return len(pages)
+
+
+def run_benchmark(rows, engine="rows", source_format="ods",
+                  **generate_options):
+    """Generates a rows-row spreadsheet in source_format (or just the
+    rows, for "memory") and measures every stage on it, collating with
+    the given engine.
+
+    Returns {stage: {'seconds': ..., 'peak_bytes': ...}, 'troupes': ...,
+    'memberships': ...}.
+    """
+    import shutil
+    import tempfile
+    import GenerateTroupeData
+    import TroupeRelations
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        output_dir = os.path.join(temp_dir, "pages")
+        os.mkdir(output_dir)
+
+        results = {}
+        if source_format == "memory":
+            table, results['read'] = measure_stage(generate_stage, rows,
+                                                   generate_options)
+        else:
+            filename = os.path.join(temp_dir, "troupes." + source_format)
+            GenerateTroupeData.generate_rows_file(filename, rows,
+                                                  **generate_options)
+            table, results['read'] = measure_stage(read_stage, filename)
+        troupe_dict, results['collate'] = measure_stage(
+            collate_stage, table, engine)
+        del table
+        related, results['relate'] = measure_stage(relate_stage,
+                                                   troupe_dict)
+        pages, results['render'] = measure_stage(render_stage, troupe_dict,
+                                                 related)
+        _, results['output'] = measure_stage(output_stage, pages, output_dir)
+        results['troupes'] = len(troupe_dict)
+        results['memberships'] = TroupeRelations.cast_memberships(
+            troupe_dict)
+        return results
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def find_regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Returns (stage, metric, baseline value, new value) for every stage
+    metric more than threshold (a fraction) worse than the baseline."""
+    regressions = []
+    for stage in STAGES:
+        if stage not in baseline or stage not in results:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            old = baseline[stage].get(metric)
+            new = results[stage].get(metric)
+            if old and new is not None and new > old * (1 + threshold):
+                regressions.append((stage, metric, old, new))
+    return regressions
+
+
+def load_baselines(baseline_file):
+    import json
+    if not os.path.exists(baseline_file):
+        return {}
+    with open(baseline_file) as file_handle:
+        return json.load(file_handle)
+
+
+def save_baselines(baseline_file, baselines):
+    import json
+    with open(baseline_file, "w") as file_handle:
+        json.dump(baselines, file_handle, indent=1, sort_keys=True)
+
+
+def print_results(rows, results):
+    print("%d rows, %d troupes, %d cast memberships" %
+          (rows, results['troupes'], results['memberships']))
+    for stage in STAGES:
+        peak = results[stage]['peak_bytes']
+        line = "  %-8s %9.3fs  %s" % (stage, results[stage]['seconds'],
+                                      "%.1f MB" % (peak / 1048576.0)
+                                      if peak is not None else "n/a")
+        if stage == "relate" and results['memberships']:
+            line += "  (%.2f us per membership)" % (
+                results[stage]['seconds'] * 1e6 / results['memberships'])
+        print(line)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Benchmark each stage of "
+                                     "the troupe pipeline.")
+    parser.add_argument("--rows", type=int, action="append",
+                        help="spreadsheet size to test (repeatable; "
+                        "default 10000)")
+    parser.add_argument("--engine", default="rows",
+                        choices=("rows", "columns"),
+                        help="collation engine to benchmark")
+    parser.add_argument("--format", default="ods",
+                        choices=("ods", "csv", "tsv", "xlsx", "memory"),
+                        help="spreadsheet format to read from (memory "
+                        "generates the rows without a spreadsheet)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="JSON file of saved baselines")
+    parser.add_argument("--save", action="store_true",
+                        help="store these results as the new baselines")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before flagging a regression, "
+                        "as a fraction")
+    args = parser.parse_args()
+
+    baselines = load_baselines(args.baseline)
+    regressed = False
+    for rows in args.rows or [10000]:
+        results = run_benchmark(rows, args.engine, args.format)
+        print_results(rows, results)
+        key = "%d %s" % (rows, args.engine)
+        if args.format != "ods":
+            key += " " + args.format
+        if args.save:
+            baselines[key] = results
+            continue
+        for stage, metric, old, new in find_regressions(
+                results, baselines.get(key, {}), args.threshold):
+            regressed = True
+            print("  REGRESSION %s %s: %.4g -> %.4g" %
+                  (stage, metric, old, new))
+    if args.save:
+        save_baselines(args.baseline, baselines)
+    sys.exit(1 if regressed else 0)
@@ -0,0 +1,38 @@
+import BenchmarkTroupeData
+import unittest
+
+
+class ValidateBenchmark(unittest.TestCase):
+
+    def test_stages_measured(self):
+        """Every stage should report a time."""
+
+        results = BenchmarkTroupeData.run_benchmark(40)
+        for stage in BenchmarkTroupeData.STAGES:
+            self.assertTrue(results[stage]['seconds'] >= 0)
+        self.assertTrue(results['troupes'] > 0)
+        self.assertTrue(results['memberships'] >= results['troupes'])
+
+    def test_in_memory(self):
+        """Generated rows should give the same troupes as their file."""
+
+        self.assertEqual(
+            BenchmarkTroupeData.run_benchmark(40, source_format="memory",
+                                              blank_columns=5)['troupes'],
+            BenchmarkTroupeData.run_benchmark(40)['troupes'])
+
+    def test_find_regressions(self):
+        """Only metrics worse than the threshold should be flagged."""
+
+        baseline = {'read': {'seconds': 1.0, 'peak_bytes': 1000},
+                    'render': {'seconds': 1.0, 'peak_bytes': None}}
+        results = {'read': {'seconds': 1.1, 'peak_bytes': 2000},
+                   'render': {'seconds': 2.0, 'peak_bytes': 5}}
+        self.assertEqual(
+            BenchmarkTroupeData.find_regressions(results, baseline, 0.2),
+            [('read', 'peak_bytes', 1000, 2000),
+             ('render', 'seconds', 1.0, 2.0)])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
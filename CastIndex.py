@@ -0,0 +1,72 @@
+"""Cast Index
+
+Cast list parsing for the collation engines.  The splitting rules are
+compiled once, each distinct raw cast string is parsed once (repeat
+applications usually list the same cast verbatim), and performer names
+are interned so a performer in many troupes is one string object shared
+by every troupe's cast set.
+
+A CastIndex passed to the collation builds the performer -> troupes
+inverted index in the same pass, so performer lookups need no second
+scan of the troupes.
+"""
+
+import re
+
+AND_PATTERN = re.compile(r'\sAND\s', re.IGNORECASE)
+SEPARATOR_PATTERN = re.compile('[&,\n]')
+
+# cap on remembered raw strings, so one huge run can't grow it forever
+MAX_PARSED_CASTS = 100000
+
+parsed_casts = {}
+performer_names = {}
+
+
+def intern_name(name):
+    return performer_names.setdefault(name, name)
+
+
+def parse_cast(new_string):
+    """Returns the frozenset of performer names in a raw cast string."""
+    try:
+        return parsed_casts[new_string]
+    except KeyError:
+        pass
+    # Handle AND
+    split_string = AND_PATTERN.sub(' & ', new_string)
+    names = (name.strip() for name in SEPARATOR_PATTERN.split(split_string))
+    cast = frozenset(intern_name(name) for name in names if name)
+    if len(parsed_casts) >= MAX_PARSED_CASTS:
+        parsed_casts.clear()
+    parsed_casts[new_string] = cast
+    return cast
+
+
+class CastIndex(object):
+    """Performer name -> set of the troupes they've been listed in."""
+
+    def __init__(self):
+        self.performer_troupes = {}
+
+    def add(self, troupe_name, cast):
+        for performer in cast:
+            troupes = self.performer_troupes.get(performer)
+            if troupes is None:
+                self.performer_troupes[performer] = {troupe_name}
+            else:
+                troupes.add(troupe_name)
+
+    def add_troupes(self, troupe_dict):
+        for troupe_name, troupe_data in troupe_dict.items():
+            if 'cast' in troupe_data:
+                self.add(troupe_name, troupe_data['cast'])
+
+    def performers(self):
+        return sorted(self.performer_troupes)
+
+    def troupes_for(self, performer):
+        return sorted(self.performer_troupes.get(performer, ()))
+
+    def __len__(self):
+        return len(self.performer_troupes)
@@ -0,0 +1,38 @@
+import CastIndex
+import ProcessTroupeData
+import unittest
+
+
+class ValidateCastIndex(unittest.TestCase):
+
+    def test_parse_cast(self):
+        """Casts should split on &, commas, newlines and AND."""
+
+        self.assertEqual(CastIndex.parse_cast(u"A & B, C\nD and E AND F,,"),
+                         {"A", "B", "C", "D", "E", "F"})
+        self.assertEqual(CastIndex.parse_cast(u"  Andy  "), {"Andy"})
+
+    def test_interned_names(self):
+        """A performer should be one shared string across casts."""
+
+        first = CastIndex.parse_cast(u"Pat Smith, " + u"Lou")
+        second = CastIndex.parse_cast(u"Lou & " + u"Pat Smith")
+        shared = [name for name in first if name == u"Pat Smith"][0]
+        self.assertTrue(any(name is shared for name in second))
+        self.assertTrue(CastIndex.parse_cast(u"Lou & Pat Smith") is second)
+
+    def test_performer_index(self):
+        """Collation should fill the performer -> troupes index."""
+
+        index = CastIndex.CastIndex()
+        ProcessTroupeData.process_troupe_data("test/Casts.ods",
+                                              cast_index=index)
+        self.assertEqual(index.troupes_for("A"),
+                         ["separators", "union", "whitespace"])
+        self.assertEqual(index.troupes_for("C"), ["separators", "union"])
+        self.assertEqual(index.troupes_for("nobody"), [])
+        self.assertEqual(len(index), 8)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
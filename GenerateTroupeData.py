@@ -0,0 +1,361 @@
+"""Generate Troupe Data
+
+Writes synthetic troupe application spreadsheets with the same "avail"
+sheet layout as the real ones, for benchmarking the pipeline at sizes our
+test fixtures can't reach.  Rows are streamed to disk, so a million-row
+file needs no more memory than a small one.
+
+Command line usage:
+$ python GenerateTroupeData.py filename [--rows N] [--unique-ratio R]
+      [--min-cast N] [--max-cast N] [--url-ratio R] [--blank-columns N]
+      [--seed N]
+
+A filename ending in .csv, .tsv or .xlsx is written in that format
+instead of ODS.
+"""
+
+import random
+
+HEADERS = [
+    "Timestamp",
+    "Group Name",
+    "Troupe's website",
+    "Contact person's name",
+    "Who is currently in your group?",
+    "Contact person's email address",
+    "Contact person's phone number",
+    "Press Blurb",
+    "How often does your troupe rehearse?",
+    "What other shows does your troupe perform in? How often? ",
+    "How does your troupe promote itself?",
+    "Have you performed before?",
+    "How long have you been together?",
+    "What's your deal?",
+    "Which Thursday Threefer dates are you available for?",
+    "Which Friday Spectacle dates are you available for?",
+    "Which Weekenders are you available for?",
+    "Are you willing, available, and eager to be the Threefer headlining "
+    "troupe for one of the months?",
+    "Comments, thoughts, questions and such",
+    "Link to a troupe photo",
+    "Link to show video",
+    "Which Friday 2x4 dates are you available for?",
+    "Year",
+]
+
+ADJECTIVES = ["Amazing", "Blue", "Crooked", "Dancing", "Electric", "Fancy",
+              "Golden", "Hidden", "Infinite", "Jolly", "Kinetic", "Lucky",
+              "Midnight", "Nervous", "Orange", "Peculiar", "Quiet", "Rusty",
+              "Silver", "Tiny", "Unlikely", "Velvet", "Wandering", "Yellow"]
+NOUNS = ["Bills", "Lobsters", "Pirates", "Robots", "Teacups", "Wizards",
+         "Cowboys", "Llamas", "Narwhals", "Detectives", "Zombies", "Ghosts",
+         "Penguins", "Bandits", "Astronauts", "Monkeys", "Doctors"]
+FIRST_NAMES = ["Alex", "Beth", "Carlos", "Dana", "Eli", "Fran", "Gus",
+               "Hana", "Ivan", "Jo", "Kim", u"Pe\xf1a", "Lou", "Mia", "Ned",
+               "Ola", "Pat", "Quin", "Ray", "Sam", u"Zo\xeb"]
+LAST_NAMES = ["Adams", "Baker", "Chen", "Diaz", "Evans", "Fox", "Garcia",
+              "Hill", "Ito", "Jones", "Kahn", "Lopez", u"M\xfcller", "Nash",
+              "Ortiz", "Park", "Reyes", "Smith", "Tran", "Vega", "Wu"]
+WORDS = ["improv", "comedy", "scenes", "longform", "musical", "characters",
+         "Austin", "audience", "suggestion", "story", "play", "laughs",
+         "weird", "heartfelt", "fast", "physical", "grounded", "genre"]
+CAST_SEPARATORS = [", ", " & ", " and ", " AND ", "\n", ","]
+PERFORMED_ANSWERS = ["Yes", "yes!", "No", "no", "Maybe", "Y", ""]
+FIRST_YEAR = 2005
+LAST_YEAR = 2015
+
+
+def troupe_name(rng, index):
+    return "The %s %s %d" % (rng.choice(ADJECTIVES), rng.choice(NOUNS), index)
+
+
+def performer_name(index):
+    return u"%s %s %d" % (FIRST_NAMES[index % len(FIRST_NAMES)],
+                          LAST_NAMES[(index // len(FIRST_NAMES)) %
+                                     len(LAST_NAMES)], index)
+
+
+def sentence(rng, low, high):
+    return " ".join(rng.choice(WORDS)
+                    for _ in range(rng.randint(low, high))).capitalize() + "."
+
+
+def paragraph(rng):
+    return "\n".join(sentence(rng, 5, 20) for _ in range(rng.randint(1, 3)))
+
+
+# a valid link most of the time, but also the junk real forms collect
+def url(rng, kind, url_ratio):
+    if rng.random() >= url_ratio:
+        return rng.choice(["", "n/a", "none yet", "ask me"])
+    prefix = rng.choice(["http://www.", "https://www.", "www.", "http://"])
+    return "%s%s%d.example.com/%s" % (prefix, kind, rng.randint(0, 10 ** 6),
+                                      rng.choice(["", "a.jpg", "watch"]))
+
+
+def generate_rows(rows=1000, unique_ratio=0.3, cast_size=(2, 8),
+                  url_ratio=0.7, seed=0):
+    """Yields rows of HEADERS' width, the header row first.
+
+    unique_ratio is the number of distinct troupes per row, so 0.3 gives
+    each troupe about three applications.  Troupes keep a core cast that
+    drifts a little between applications, and performers are shared
+    across troupes.
+    """
+    rng = random.Random(seed)
+    troupe_count = max(1, int(rows * unique_ratio))
+    performer_count = max(cast_size[1], troupe_count * 3)
+    troupes = []
+    for index in range(troupe_count):
+        core = [rng.randrange(performer_count)
+                for _ in range(rng.randint(*cast_size))]
+        troupes.append((troupe_name(rng, index), core))
+
+    yield list(HEADERS)
+    for row_index in range(rows):
+        name, core = troupes[rng.randrange(troupe_count)]
+        cast = list(core)
+        if rng.random() < 0.3:
+            cast.append(rng.randrange(performer_count))
+        cast_string = rng.choice(CAST_SEPARATORS).join(
+            performer_name(index) for index in cast)
+        if rng.random() < 0.1:
+            name = rng.choice([name + " ", name.replace("The ", "")])
+
+        row = [""] * len(HEADERS)
+        row[0] = "%d/%d/%d" % (rng.randint(1, 12), rng.randint(1, 28),
+                               rng.randint(FIRST_YEAR, LAST_YEAR))
+        row[1] = name
+        row[2] = url(rng, "site", url_ratio)
+        row[3] = performer_name(cast[0])
+        row[4] = cast_string
+        row[5] = "contact%d@example.com" % row_index
+        row[6] = "512-555-%04d" % rng.randrange(10000)
+        row[7] = paragraph(rng) if rng.random() < 0.8 else ""
+        row[8] = rng.choice(["Weekly", "Twice a month", "Never"])
+        row[10] = sentence(rng, 3, 10)
+        row[11] = rng.choice(PERFORMED_ANSWERS)
+        row[12] = "%d years" % rng.randint(0, 10)
+        row[13] = paragraph(rng) if rng.random() < 0.7 else ""
+        row[19] = url(rng, "photo", url_ratio)
+        row[20] = url(rng, "video", url_ratio)
+        row[22] = str(rng.randint(FIRST_YEAR, LAST_YEAR))
+        yield row
+
+
+MIMETYPE = "application/vnd.oasis.opendocument.spreadsheet"
+
+MANIFEST = """<?xml version="1.0" encoding="UTF-8"?>
+<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">
+ <manifest:file-entry manifest:full-path="/" manifest:version="1.2" manifest:media-type="%s"/>
+ <manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>
+</manifest:manifest>
+""" % MIMETYPE
+
+CONTENT_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" office:version="1.2"><office:body><office:spreadsheet><table:table table:name="avail">"""
+
+CONTENT_FOOTER = """</table:table></office:spreadsheet></office:body></office:document-content>"""
+
+
+def cell_xml(value, repeat=1):
+    from xml.sax.saxutils import escape
+    repeat_attribute = ""
+    if repeat > 1:
+        repeat_attribute = ' table:number-columns-repeated="%d"' % repeat
+    if not value:
+        return '<table:table-cell%s/>' % repeat_attribute
+    paragraphs = "".join("<text:p>%s</text:p>" % escape(line)
+                         for line in value.split("\n"))
+    return '<table:table-cell office:value-type="string"%s>%s' \
+        '</table:table-cell>' % (repeat_attribute, paragraphs)
+
+
+# runs of empty cells are written the way LibreOffice writes them, with
+# number-columns-repeated, followed by a wide trailing blank run
+def row_xml(row, blank_columns):
+    cells = []
+    empty_run = 0
+    for value in row:
+        if not value:
+            empty_run += 1
+            continue
+        if empty_run:
+            cells.append(cell_xml("", empty_run))
+            empty_run = 0
+        cells.append(cell_xml(value))
+    cells.append(cell_xml("", empty_run + blank_columns))
+    return "<table:table-row>%s</table:table-row>" % "".join(cells)
+
+
+def write_ods(filename, rows, blank_columns=1000):
+    """Streams rows into a one-sheet ("avail") ODS file."""
+    import os
+    import tempfile
+    import zipfile
+
+    content_handle, content_file = tempfile.mkstemp(suffix=".xml")
+    try:
+        with os.fdopen(content_handle, "wb") as content:
+            content.write(CONTENT_HEADER.encode("utf8"))
+            for row in rows:
+                content.write(row_xml(row, blank_columns).encode("utf8"))
+            content.write(CONTENT_FOOTER.encode("utf8"))
+
+        with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(zipfile.ZipInfo("mimetype"), MIMETYPE)
+            archive.writestr("META-INF/manifest.xml", MANIFEST)
+            archive.write(content_file, "content.xml")
+    finally:
+        os.remove(content_file)
+
+
+def write_csv(filename, rows, delimiter=","):
+    """Streams rows into a UTF-8 CSV file (or TSV, with a tab delimiter)."""
+    import csv
+    import sys
+    if sys.version_info[0] < 3:
+        with open(filename, "wb") as file_handle:
+            writer = csv.writer(file_handle, delimiter=delimiter)
+            for row in rows:
+                writer.writerow([cell.encode("utf8") for cell in row])
+    else:
+        with open(filename, "w", newline="", encoding="utf8") as file_handle:
+            writer = csv.writer(file_handle, delimiter=delimiter)
+            writer.writerows(rows)
+
+
+XLSX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="xml" ContentType="application/xml"/><Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/><Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/><Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>
+"""
+
+XLSX_RELATIONSHIPS = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>
+"""
+
+XLSX_WORKBOOK = """<?xml version="1.0" encoding="UTF-8"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets><sheet name="avail" sheetId="1" r:id="rId1"/></sheets></workbook>
+"""
+
+XLSX_WORKBOOK_RELATIONSHIPS = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/><Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/></Relationships>
+"""
+
+XLSX_SHEET_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>"""
+
+XLSX_SHEET_FOOTER = """</sheetData></worksheet>"""
+
+
+def column_name(index):
+    name = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(ord("A") + remainder) + name
+    return name
+
+
+# text goes through the shared strings table, and empty cells are left
+# out, the way Excel writes them
+def xlsx_row_xml(row_number, row, shared_strings):
+    cells = []
+    for index, value in enumerate(row):
+        if value:
+            string_index = shared_strings.setdefault(value,
+                                                     len(shared_strings))
+            cells.append('<c r="%s%d" t="s"><v>%d</v></c>' %
+                         (column_name(index), row_number, string_index))
+    return '<row r="%d">%s</row>' % (row_number, "".join(cells))
+
+
+def write_xlsx(filename, rows):
+    """Writes rows into a one-sheet ("avail") XLSX file.  The sheet is
+    streamed through a temporary file, but the shared strings table holds
+    every distinct cell string in memory until the end."""
+    import os
+    import tempfile
+    import zipfile
+    from xml.sax.saxutils import escape
+
+    shared_strings = {}
+    sheet_handle, sheet_file = tempfile.mkstemp(suffix=".xml")
+    try:
+        with os.fdopen(sheet_handle, "wb") as sheet:
+            sheet.write(XLSX_SHEET_HEADER.encode("utf8"))
+            for row_number, row in enumerate(rows, 1):
+                sheet.write(xlsx_row_xml(row_number, row,
+                                         shared_strings).encode("utf8"))
+            sheet.write(XLSX_SHEET_FOOTER.encode("utf8"))
+
+        strings = sorted(shared_strings, key=shared_strings.__getitem__)
+        strings_xml = u'<?xml version="1.0" encoding="UTF-8"?>\n<sst ' \
+            u'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/' \
+            u'main" count="%d" uniqueCount="%d">%s</sst>' % (
+                len(strings), len(strings),
+                u"".join(u'<si><t xml:space="preserve">%s</t></si>' %
+                         escape(string) for string in strings))
+
+        with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES)
+            archive.writestr("_rels/.rels", XLSX_RELATIONSHIPS)
+            archive.writestr("xl/workbook.xml", XLSX_WORKBOOK)
+            archive.writestr("xl/_rels/workbook.xml.rels",
+                             XLSX_WORKBOOK_RELATIONSHIPS)
+            archive.write(sheet_file, "xl/worksheets/sheet1.xml")
+            archive.writestr("xl/sharedStrings.xml",
+                             strings_xml.encode("utf8"))
+    finally:
+        os.remove(sheet_file)
+
+
+# picks the file format from filename's extension
+def write_rows(filename, rows, blank_columns=1000):
+    import os
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        write_csv(filename, rows)
+    elif extension == ".tsv":
+        write_csv(filename, rows, "\t")
+    elif extension == ".xlsx":
+        write_xlsx(filename, rows)
+    else:
+        write_ods(filename, rows, blank_columns)
+
+
+def generate_rows_file(filename, rows=1000, unique_ratio=0.3,
+                       cast_size=(2, 8), url_ratio=0.7, blank_columns=1000,
+                       seed=0):
+    """Writes a generated spreadsheet in the format filename's extension
+    names (ODS unless it's .csv, .tsv or .xlsx)."""
+    write_rows(filename, generate_rows(rows, unique_ratio, cast_size,
+                                       url_ratio, seed), blank_columns)
+
+
+def generate_ods(filename, rows=1000, unique_ratio=0.3, cast_size=(2, 8),
+                 url_ratio=0.7, blank_columns=1000, seed=0):
+    """Writes a generated ODS spreadsheet."""
+    write_ods(filename, generate_rows(rows, unique_ratio, cast_size,
+                                      url_ratio, seed), blank_columns)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Write a synthetic troupe "
+                                     "applications spreadsheet.")
+    parser.add_argument("filename", help="ODS file to write (or .csv, "
+                        ".tsv or .xlsx)")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--unique-ratio", type=float, default=0.3,
+                        help="distinct troupes per row")
+    parser.add_argument("--min-cast", type=int, default=2)
+    parser.add_argument("--max-cast", type=int, default=8)
+    parser.add_argument("--url-ratio", type=float, default=0.7,
+                        help="share of link cells holding a real link")
+    parser.add_argument("--blank-columns", type=int, default=1000,
+                        help="width of the trailing blank cell run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_rows_file(args.filename, args.rows, args.unique_ratio,
+                       (args.min_cast, args.max_cast), args.url_ratio,
+                       args.blank_columns, args.seed)
@@ -0,0 +1,57 @@
+import GenerateTroupeData
+import ODSReader
+import ProcessTroupeData
+import RowSources
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class ValidateGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, "troupes.ods")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_round_trip(self):
+        """Generated rows should read back exactly through ODSReader."""
+
+        rows = list(GenerateTroupeData.generate_rows(50, seed=3))
+        GenerateTroupeData.write_ods(self.filename, rows, blank_columns=500)
+        sheet = ODSReader.ODSReader(self.filename).getSheet("avail")
+        self.assertEqual(len(sheet), 51)
+        self.assertEqual(sheet[0][:23], GenerateTroupeData.HEADERS)
+        for row, read_row in zip(rows, sheet):
+            self.assertEqual(read_row[:23], row)
+            self.assertEqual(len(read_row), 523)
+
+    def test_duplication(self):
+        """unique_ratio should control how many troupes the rows collapse to."""
+
+        GenerateTroupeData.generate_ods(self.filename, 300, unique_ratio=0.1,
+                                        url_ratio=1.0)
+        troupe_dict = ProcessTroupeData.process_troupe_data(self.filename)
+        self.assertTrue(30 <= len(troupe_dict) <= 90)
+        self.assertTrue(all('start_year' in troupe_data
+                            for troupe_data in troupe_dict.values()))
+
+    def test_file_formats(self):
+        """generate_rows_file should pick the format from the extension."""
+
+        csv_file = os.path.join(self.temp_dir, "troupes.csv")
+        GenerateTroupeData.generate_rows_file(csv_file, 20)
+        GenerateTroupeData.generate_ods(self.filename, 20)
+        self.assertEqual(RowSources.detect_format(csv_file), "csv")
+        self.assertEqual(RowSources.detect_format(self.filename), "ods")
+        self.assertEqual([row[:23] for row in
+                          RowSources.iter_rows(csv_file, "avail")],
+                         [row[:23] for row in
+                          RowSources.iter_rows(self.filename, "avail")])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
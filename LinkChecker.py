@@ -0,0 +1,158 @@
+"""Link Checker
+
+Checks troupes' site, photo and video links concurrently.  Every distinct
+URL is checked once, however many troupes share it, over the pooled
+keep-alive connections PhotoDownloader uses: a HEAD request first, then a
+GET if the server turns HEAD down (plenty of servers answer HEAD with 403,
+404 or 405 for pages that are there).  Requests to any one host are spaced
+out, so a site most troupes link to isn't hit by every worker at once.
+
+Results go into a JSON cache with the time each link was checked, and a
+rerun only rechecks the links whose result is older than the TTL.  A link
+is dead if it ends in an HTTP error or can't be reached at all.
+"""
+
+import socket
+import threading
+import time
+
+import PhotoDownloader
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+try:
+    from urlparse import urljoin, urlsplit
+except ImportError:
+    from urllib.parse import urljoin, urlsplit
+
+DEFAULT_JOBS = 16
+DEFAULT_TIMEOUT = 15
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_HOST_INTERVAL = 0.5
+
+
+class HostThrottle(object):
+    """Spaces out requests to each host by at least interval seconds."""
+
+    def __init__(self, interval=DEFAULT_HOST_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_request = {}  # host -> earliest time of its next request
+
+    def wait(self, url):
+        host = urlsplit(PhotoDownloader.normalize_url(url)).netloc.lower()
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_request.get(host, now))
+            self.next_request[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def request_status(pool, throttle, method, url):
+    for _ in range(PhotoDownloader.MAX_REDIRECTS + 1):
+        throttle.wait(url)
+        status, headers, _ = pool.request(method, url)
+        if status in PhotoDownloader.REDIRECT_CODES and 'location' in headers:
+            url = urljoin(PhotoDownloader.normalize_url(url),
+                          headers['location'])
+            continue
+        return status
+    raise PhotoDownloader.DownloadError("too many redirects")
+
+
+def check_link(pool, throttle, url):
+    """Returns a cache entry: whether url is 'ok', its final HTTP 'status'
+    (None if it couldn't be reached), the 'error' if not ok, and when it
+    was 'checked'."""
+    status = None
+    try:
+        status = request_status(pool, throttle, 'HEAD', url)
+        if status >= 400:
+            status = request_status(pool, throttle, 'GET', url)
+    except (PhotoDownloader.DownloadError, httplib.HTTPException,
+            socket.error, ValueError) as e:
+        error = str(e) or e.__class__.__name__
+    else:
+        error = "HTTP %d" % status if status >= 400 else None
+    return {'ok': error is None, 'status': status, 'error': error,
+            'checked': time.time()}
+
+
+def is_fresh(entry, ttl, now):
+    return entry is not None and now - entry['checked'] < ttl
+
+
+# round robin over the hosts, so the workers start on different hosts
+# instead of queueing behind one host's throttle
+def interleave_hosts(urls):
+    by_host = {}
+    for url in urls:
+        host = urlsplit(PhotoDownloader.normalize_url(url)).netloc.lower()
+        by_host.setdefault(host, []).append(url)
+    queues = [by_host[host] for host in sorted(by_host)]
+    interleaved = []
+    for index in range(max(len(queue) for queue in queues) if queues else 0):
+        interleaved.extend(queue[index] for queue in queues
+                           if index < len(queue))
+    return interleaved
+
+
+def check_links(urls, cache_file=None, jobs=DEFAULT_JOBS,
+                timeout=DEFAULT_TIMEOUT, ttl=DEFAULT_TTL,
+                host_interval=DEFAULT_HOST_INTERVAL):
+    """Checks every distinct URL in urls, returning a report dict.
+
+    The report lists the URLs that are 'alive', the (url, error) pairs
+    that are 'dead', and which URLs were 'checked' this time rather than
+    taken from the cache ('cached').  Cache entries that have gone stale
+    without being rechecked are dropped from the cache.
+    """
+    from multiprocessing.pool import ThreadPool
+    import PageWriter
+
+    cache = PageWriter.load_manifest(cache_file)
+    now = time.time()
+    urls = sorted(set(urls))
+    stale = [url for url in urls if not is_fresh(cache.get(url), ttl, now)]
+
+    if stale:
+        pool = PhotoDownloader.ConnectionPool(timeout)
+        throttle = HostThrottle(host_interval)
+        threads = ThreadPool(max(1, min(jobs, len(stale))))
+        try:
+            entries = threads.map(
+                lambda url: (url, check_link(pool, throttle, url)),
+                interleave_hosts(stale))
+        finally:
+            threads.close()
+            threads.join()
+            pool.close()
+        cache.update(entries)
+
+    checked = set(stale)
+    report = {'alive': [], 'dead': [], 'checked': stale,
+              'cached': [url for url in urls if url not in checked]}
+    for url in urls:
+        entry = cache[url]
+        if entry['ok']:
+            report['alive'].append(url)
+        else:
+            report['dead'].append((url, entry['error']))
+
+    if cache_file:
+        kept = set(urls)
+        for url in list(cache):
+            if url not in kept and not is_fresh(cache[url], ttl, now):
+                del cache[url]
+        PageWriter.save_manifest(cache, cache_file)
+    return report
+
+
+def print_report(report):
+    print("Links: %d alive, %d dead (%d checked, %d from the cache)" %
+          (len(report['alive']), len(report['dead']), len(report['checked']),
+           len(report['cached'])))
@@ -0,0 +1,138 @@
+import LinkChecker
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+
+class LinkHandler(BaseHTTPRequestHandler):
+    """Serves /ok, 404s /gone, turns HEAD down for /nohead and redirects
+    /moved to /ok."""
+
+    protocol_version = "HTTP/1.1"
+
+    def respond(self, status, location=None):
+        self.server.requests.append((self.command, self.path, time.time()))
+        self.send_response(status)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        if self.path == "/nohead":
+            self.respond(405)
+        else:
+            self.do_GET()
+
+    def do_GET(self):
+        if self.path == "/gone":
+            self.respond(404)
+        elif self.path == "/moved":
+            self.respond(301, "/ok")
+        else:
+            self.respond(200)
+
+    def log_message(self, *args):
+        pass
+
+
+class LinkServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ValidateLinkChecker(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LinkServer(("127.0.0.1", 0), LinkHandler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = "http://127.0.0.1:%d/" % self.server.server_address[1]
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = os.path.join(self.temp_dir, "link_cache.json")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir)
+
+    def check(self, *paths, **options):
+        options.setdefault('host_interval', 0)
+        urls = [self.base + path for path in paths]
+        return LinkChecker.check_links(urls, self.cache, **options)
+
+    def test_dead_and_alive(self):
+        """404s and unreachable hosts are dead; redirects are followed."""
+
+        report = LinkChecker.check_links(
+            [self.base + "ok", self.base + "gone", self.base + "moved",
+             "http://127.0.0.1:1/x"], host_interval=0, timeout=5)
+        self.assertEqual(report['alive'], [self.base + "moved",
+                                           self.base + "ok"])
+        dead = dict(report['dead'])
+        self.assertEqual(sorted(dead), ["http://127.0.0.1:1/x",
+                                        self.base + "gone"])
+        self.assertEqual(dead[self.base + "gone"], "HTTP 404")
+
+    def test_head_fallback(self):
+        """A link that turns HEAD down is retried with GET."""
+
+        report = self.check("nohead", "ok")
+        self.assertEqual(len(report['alive']), 2)
+        requests = sorted((method, path)
+                          for method, path, _ in self.server.requests)
+        self.assertEqual(requests, [("GET", "/nohead"), ("HEAD", "/nohead"),
+                                    ("HEAD", "/ok")])
+
+    def test_duplicates_checked_once(self):
+        """Each distinct URL is requested once."""
+
+        report = self.check("ok", "ok", "ok", "gone", "gone")
+        self.assertEqual(len(report['checked']), 2)
+        self.assertEqual(len(self.server.requests), 3)  # HEAD, GET for 404
+
+    def test_cache_ttl(self):
+        """A rerun inside the TTL comes from the cache; stale ones recheck."""
+
+        self.check("ok", "gone")
+        self.server.requests = []
+        report = self.check("ok", "gone")
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(len(report['cached']), 2)
+        self.assertEqual(report['dead'], [(self.base + "gone", "HTTP 404")])
+
+        report = self.check("ok", ttl=0)
+        self.assertEqual(report['checked'], [self.base + "ok"])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_host_interval(self):
+        """Requests to one host are spaced out, however many workers."""
+
+        self.check("a", "b", "c", jobs=3, host_interval=0.2)
+        times = sorted(when for _, _, when in self.server.requests)
+        self.assertEqual(len(times), 3)
+        for earlier, later in zip(times, times[1:]):
+            self.assertGreater(later - earlier, 0.15)
+
+    def test_interleave_hosts(self):
+        """Links are ordered round robin across their hosts."""
+
+        self.assertEqual(
+            LinkChecker.interleave_hosts(["a.com/1", "a.com/2", "a.com/3",
+                                          "http://b.com/1", "c.com/1"]),
+            ["a.com/1", "http://b.com/1", "c.com/1", "a.com/2", "a.com/3"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
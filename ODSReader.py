@@ -14,73 +14,213 @@
 
 # Thanks to grt for the fixes
 
-import odf.opendocument
-from odf.table import *
-from odf.text import P
+import zipfile
+
+try:
+	import xml.etree.cElementTree as ElementTree
+except ImportError:
+	import xml.etree.ElementTree as ElementTree
+
+TABLE_NS = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+TEXT_NS = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+TABLE = TABLE_NS + "table"
+TABLE_ROW = TABLE_NS + "table-row"
+TABLE_CELL = TABLE_NS + "table-cell"
+TABLE_NAME = TABLE_NS + "name"
+COLUMNS_REPEATED = TABLE_NS + "number-columns-repeated"
+TEXT_P = TEXT_NS + "p"
+TEXT_SPAN = TEXT_NS + "span"
 
 class ODSReader:
 
-	# loads the file
+	# remembers the file; nothing is parsed until a sheet is asked for
 	def __init__(self, file):
-		self.doc = odf.opendocument.load(file)
+		self.file = file
 		self.SHEETS = {}
-		for sheet in self.doc.spreadsheet.getElementsByType(Table):
-			self.readSheet(sheet)
-	
 
-	# reads a sheet in the sheet dictionary, storing each sheet as an array (rows) of arrays (columns)
-	def readSheet(self, sheet):
-		name = sheet.getAttribute("name")
-		rows = sheet.getElementsByType(TableRow)
-		arrRows = []
-		
-		# for each row
-		for row in rows:
-			row_comment = ""
-			arrCells = []
-			cells = row.getElementsByType(TableCell)
-			
-			# for each cell
-			for cell in cells:
-				# repeated value?
-				repeat = cell.getAttribute("numbercolumnsrepeated")
-				if(not repeat):
-					repeat = 1
-					
-				ps = cell.getElementsByType(P)
-				textItems = []
-								
-				# for each text/text:span node
-				for p in ps:
-					for n in p.childNodes:
-                                                if (n.nodeType == 1 and n.tagName == "text:span"):
-							for c in n.childNodes:
-								if (c.nodeType == 3):
-									textItems.append(c.data)
-							
-						if (n.nodeType == 3):
-							textItems.append(n.data)
-					
-				if(textItems):
-					textContent = "\n".join(textItems)
-					if(textContent[0] != "#"): # ignore comments cells
-						for rr in range(int(repeat)): # repeated?
-							arrCells.append(textContent)
+
+	# streams content.xml out of the zip, yielding the rows of one sheet as
+	# arrays of columns without ever building the whole document in memory.
+	# With a columns selection each row only holds those columns (the rest
+	# are left as ""), and cells past the last wanted column are skipped.
+	def iterSheet(self, name, columns=None):
+		archive = zipfile.ZipFile(self.file)
+		try:
+			content = archive.open("content.xml")
+			try:
+				for row in self.parseSheet(content, name, columns):
+					yield row
+			finally:
+				content.close()
+		finally:
+			archive.close()
+
+
+	# incremental parse of a content.xml stream; only the named sheet is read
+	def parseSheet(self, content, name, columns=None):
+		found = False
+		inSheet = False
+		parents = []
+		row = None
+		inCell = False
+		cellTexts = None
+
+		for event, elem in ElementTree.iterparse(content, ("start", "end")):
+			if event == "start":
+				if elem.tag == TABLE and elem.get(TABLE_NAME) == name:
+					found = True
+					inSheet = True
+				elif inSheet and elem.tag == TABLE_ROW:
+					if columns is None:
+						row = SheetRow()
 					else:
-						row_comment = row_comment + textContent + " ";
-				else:
-					for rr in range(int(repeat)):
-						arrCells.append("")
-
-			# if row contained something
-			if(len(arrCells)):
-				arrRows.append(arrCells)
-				
-			#else:
-			#	print "Empty or commented row (", row_comment, ")"
-		
-		self.SHEETS[name] = arrRows
-		
+						row = ProjectedRow(columns)
+				elif row is not None and elem.tag == TABLE_CELL:
+					inCell = True
+					cellTexts = row.startCell(cellRepeat(elem))
+				parents.append(elem)
+				continue
+
+			parents.pop()
+
+			if elem.tag == TEXT_P:
+				if inCell and cellTexts is not None:
+					cellTexts.extend(self.paragraphText(elem))
+				elif inCell and not row.leadKnown:
+					row.setLead(self.paragraphText(elem))
+				continue
+
+			if elem.tag == TABLE_CELL:
+				if inCell:
+					row.endCell(cellRepeat(elem), cellTexts)
+				inCell = False
+				cellTexts = None
+			elif elem.tag == TABLE_ROW:
+				# if row contained something
+				if row is not None and row.hasCells():
+					yield row.cells
+				row = None
+			elif elem.tag == TABLE and inSheet:
+				break
+			else:
+				continue
+
+			# drop finished cells and rows so memory stays flat
+			elem.clear()
+			if parents:
+				parents[-1].remove(elem)
+
+		if not found:
+			raise KeyError(name)
+
+
+	# the text/text:span nodes directly under a paragraph, in document order
+	def paragraphText(self, p):
+		textItems = []
+		if p.text:
+			textItems.append(p.text)
+		for n in p:
+			if n.tag == TEXT_SPAN:
+				if n.text:
+					textItems.append(n.text)
+				for c in n:
+					if c.tail:
+						textItems.append(c.tail)
+			if n.tail:
+				textItems.append(n.tail)
+		return textItems
+
+
+	# reads a sheet in the sheet dictionary, storing each sheet as an array (rows) of arrays (columns)
+	def readSheet(self, name):
+		self.SHEETS[name] = list(self.iterSheet(name))
+
 	# returns a sheet as an array (rows) of arrays (columns)
 	def getSheet(self, name):
-		return self.SHEETS[name]
\ No newline at end of file
+		if name not in self.SHEETS:
+			self.readSheet(name)
+		return self.SHEETS[name]
+
+
+# repeated value?
+def cellRepeat(cell):
+	repeat = cell.get(COLUMNS_REPEATED)
+	if(not repeat):
+		repeat = 1
+	return int(repeat)
+
+
+# a row holding every cell, with repeated values expanded
+class SheetRow:
+
+	leadKnown = True
+
+	def __init__(self):
+		self.cells = []
+
+	# returns the list the cell's text should be gathered into
+	def startCell(self, repeat):
+		return []
+
+	def endCell(self, repeat, textItems):
+		if(textItems):
+			textContent = u"\n".join(textItems)
+			if(textContent[0] != "#"): # ignore comments cells
+				self.cells.extend([textContent] * repeat)
+		else:
+			self.cells.extend([""] * repeat)
+
+	def hasCells(self):
+		return len(self.cells) > 0
+
+
+# a row holding only the selected columns.  Other cells are never joined
+# into strings; only their first text item is looked at, because comment
+# cells don't take up a column and so still shift everything after them.
+class ProjectedRow:
+
+	def __init__(self, columns):
+		self.columns = frozenset(columns)
+		self.width = max(self.columns) + 1
+		self.cells = [""] * self.width
+		self.column = 0
+		self.leadKnown = True
+		self.lead = None
+
+	# returns the list the cell's text should be gathered into, or None if
+	# the cell covers no wanted column
+	def startCell(self, repeat):
+		self.lead = None
+		if self.column >= self.width:
+			self.leadKnown = True
+			return None
+		for index in range(self.column, min(self.column + repeat, self.width)):
+			if index in self.columns:
+				self.leadKnown = True
+				return []
+		self.leadKnown = False
+		return None
+
+	def setLead(self, textItems):
+		if textItems:
+			self.lead = textItems[0]
+			self.leadKnown = True
+
+	def endCell(self, repeat, textItems):
+		if textItems is not None:
+			textContent = u"\n".join(textItems)
+			if textContent and textContent[0] == "#": # ignore comments cells
+				return
+			if not textContent:
+				textContent = ""
+			for index in range(self.column,
+			                   min(self.column + repeat, self.width)):
+				if index in self.columns:
+					self.cells[index] = textContent
+		elif self.lead and self.lead[0] == "#":
+			return
+		self.column += repeat
+
+	def hasCells(self):
+		return self.column > 0
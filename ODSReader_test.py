@@ -0,0 +1,37 @@
+import ODSReader
+import unittest
+
+
+class ValidateODSReader(unittest.TestCase):
+
+    def test_stream_matches_sheet(self):
+        """Streaming a sheet should give the same rows as getSheet."""
+
+        streamed = list(ODSReader.ODSReader("test/TwoRows.ods")
+                        .iterSheet("avail"))
+        sheet = ODSReader.ODSReader("test/TwoRows.ods").getSheet("avail")
+        self.assertEqual(streamed, sheet)
+        self.assertEqual(sheet[1][1], "name1")
+
+    def test_column_selection(self):
+        """Selected columns should match the full rows; others stay empty."""
+
+        reader = ODSReader.ODSReader("test/Casts.ods")
+        full = reader.getSheet("avail")
+        projected = list(reader.iterSheet("avail", (1, 4)))
+        self.assertEqual(len(full), len(projected))
+        for full_row, projected_row in zip(full, projected):
+            self.assertEqual(len(projected_row), 5)
+            self.assertEqual(projected_row[1], full_row[1])
+            self.assertEqual(projected_row[4], full_row[4])
+            self.assertEqual(projected_row[2], "")
+
+    def test_missing_sheet(self):
+        """Asking for a sheet that isn't there should raise KeyError."""
+
+        reader = ODSReader.ODSReader("test/OneRow.ods")
+        self.assertRaises(KeyError, reader.getSheet, "no such sheet")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
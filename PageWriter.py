@@ -0,0 +1,120 @@
+"""Page Writer
+
+Writes troupe pages only when their text changes.  A JSON manifest maps
+every output file to the SHA-1 of the text last written there, so reruns
+leave unchanged pages (and their timestamps) alone.  Changed pages are
+written to a temporary file beside the target and renamed over it, so a
+sync that runs mid-write never picks up half a page, and the only pages
+removed are the ones the manifest knows about that weren't produced this
+time (the troupe disappeared or moved to another subdirectory).
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+MANIFEST_FILE = ".\\output\\page_manifest.json"
+
+
+def text_hash(text):
+    if not isinstance(text, bytes):
+        text = text.encode('utf8')
+    return hashlib.sha1(text).hexdigest()
+
+
+def file_hash(file_name):
+    with open(file_name, "r") as file_handle:
+        return text_hash(file_handle.read())
+
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    if not manifest_file or not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file) as file_handle:
+        return json.load(file_handle)
+
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    write_atomic(manifest_file, json.dumps(manifest, indent=1,
+                                           sort_keys=True))
+
+
+def replace_file(source, destination):
+    try:
+        os.replace(source, destination)
+    except AttributeError:
+        # Python 2 has no os.replace, and its rename won't overwrite an
+        # existing file on Windows
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+def write_atomic(file_name, text):
+    directory = os.path.dirname(file_name) or "."
+    handle, temp_name = tempfile.mkstemp(prefix=".", suffix=".tmp",
+                                         dir=directory)
+    try:
+        with os.fdopen(handle, "w") as file_handle:
+            file_handle.write(text)
+        # mkstemp files are private to us; pages shouldn't be
+        os.chmod(temp_name, 0o644)
+        replace_file(temp_name, file_name)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
+
+def write_page(file_name, text, previous_hash=None):
+    """Returns ('added', 'changed' or 'unchanged', text hash).
+
+    previous_hash is the manifest's hash for file_name; without one, a
+    file already on disk is hashed instead, so the first run with a new
+    manifest doesn't rewrite pages that are already right.
+    """
+    digest = text_hash(text)
+    if not os.path.exists(file_name):
+        status = 'added'
+    elif (previous_hash or file_hash(file_name)) == digest:
+        return 'unchanged', digest
+    else:
+        status = 'changed'
+    write_atomic(file_name, text)
+    return status, digest
+
+
+def update_manifest(manifest, results, replaced=None):
+    """Records (file_name, status, hash) results in manifest, removes the
+    pages it listed that aren't among them, and returns a report dict of
+    the file names 'added', 'changed', 'unchanged' and 'removed'.
+
+    For results covering only some troupes, replaced names the pages an
+    earlier run made for those troupes: only they can be removed, and the
+    rest of the manifest is kept.
+    """
+    report = {'added': [], 'changed': [], 'unchanged': [], 'removed': []}
+    written = {}
+    for file_name, status, digest in results:
+        report[status].append(file_name)
+        written[file_name] = digest
+
+    if replaced is None:
+        stale = set(manifest) - set(written)
+        manifest.clear()
+    else:
+        stale = set(replaced) - set(written)
+    for file_name in stale:
+        manifest.pop(file_name, None)
+        if os.path.exists(file_name):
+            os.remove(file_name)
+            report['removed'].append(file_name)
+    manifest.update(written)
+    return report
+
+
+def print_report(report):
+    print("Pages: %d added, %d changed, %d removed, %d unchanged" %
+          (len(report['added']), len(report['changed']),
+           len(report['removed']), len(report['unchanged'])))
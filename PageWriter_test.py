@@ -0,0 +1,73 @@
+import PageWriter
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class ValidatePageWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def page(self, name):
+        return os.path.join(self.temp_dir, name + ".wiki")
+
+    def read(self, file_name):
+        with open(file_name) as file_handle:
+            return file_handle.read()
+
+    def test_write_if_changed(self):
+        """Pages should only be written when their text changes."""
+
+        file_name = self.page("a")
+        status, digest = PageWriter.write_page(file_name, "one")
+        self.assertEqual(status, 'added')
+        os.utime(file_name, (1, 1))
+        self.assertEqual(PageWriter.write_page(file_name, "one", digest),
+                         ('unchanged', digest))
+        self.assertEqual(os.path.getmtime(file_name), 1)
+        self.assertEqual(PageWriter.write_page(file_name, "two", digest)[0],
+                         'changed')
+        self.assertEqual(self.read(file_name), "two")
+        self.assertEqual(os.listdir(self.temp_dir), ["a.wiki"])
+
+    def test_existing_page_without_manifest(self):
+        """A page already on disk should be compared by its contents."""
+
+        file_name = self.page("a")
+        with open(file_name, "w") as file_handle:
+            file_handle.write("one")
+        self.assertEqual(PageWriter.write_page(file_name, "one")[0],
+                         'unchanged')
+
+    def test_update_manifest(self):
+        """Only pages missing from this run should be removed."""
+
+        manifest = {}
+        results = [(self.page(name), ) + PageWriter.write_page(
+            self.page(name), name) for name in ("a", "b")]
+        PageWriter.update_manifest(manifest, results)
+
+        results = [(self.page(name), ) + PageWriter.write_page(
+            self.page(name), name + "!", manifest.get(self.page(name)))
+            for name in ("a", "c")]
+        report = PageWriter.update_manifest(manifest, results)
+        self.assertEqual(report, {'added': [self.page("c")],
+                                  'changed': [self.page("a")],
+                                  'unchanged': [],
+                                  'removed': [self.page("b")]})
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         ["a.wiki", "c.wiki"])
+        self.assertEqual(sorted(manifest), [self.page("a"), self.page("c")])
+
+        manifest_file = os.path.join(self.temp_dir, "manifest.json")
+        PageWriter.save_manifest(manifest, manifest_file)
+        self.assertEqual(PageWriter.load_manifest(manifest_file), manifest)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
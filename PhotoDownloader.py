@@ -0,0 +1,197 @@
+"""Photo Downloader
+
+Fetches troupe photos concurrently over a thread pool.  Each worker
+thread keeps one keep-alive connection per host, and a JSON manifest
+remembers the ETag, Last-Modified and SHA-1 of every photo, so reruns
+send conditional requests and leave unchanged photos alone.
+"""
+
+import hashlib
+import os
+import socket
+import threading
+
+import PageWriter
+import TroupeProfile
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+try:
+    from urlparse import urljoin, urlsplit
+except ImportError:
+    from urllib.parse import urljoin, urlsplit
+
+DEFAULT_JOBS = 8
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ConnectionPool(object):
+    """Keep-alive connections, one per host for each thread."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.all_connections = []
+
+    def connection(self, scheme, netloc):
+        connections = getattr(self.local, 'connections', None)
+        if connections is None:
+            connections = self.local.connections = {}
+        key = (scheme, netloc)
+        if key not in connections:
+            if scheme == 'https':
+                connection_class = httplib.HTTPSConnection
+            else:
+                connection_class = httplib.HTTPConnection
+            connections[key] = connection_class(netloc, timeout=self.timeout)
+            with self.lock:
+                self.all_connections.append(connections[key])
+        return connections[key]
+
+    def discard(self, scheme, netloc):
+        connection = self.local.connections.pop((scheme, netloc))
+        connection.close()
+
+    # returns (status, headers, content), with header names lowercased
+    def request(self, method, url, headers=None, body=None):
+        url = normalize_url(url)
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        # a pooled connection may have been dropped by the server; retry
+        # once on a fresh one before giving up
+        for attempt in range(2):
+            connection = self.connection(parts.scheme, parts.netloc)
+            try:
+                connection.request(method, path, body, headers or {})
+                response = connection.getresponse()
+                content = response.read()
+            except (httplib.HTTPException, socket.error):
+                self.discard(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+                continue
+            response_headers = dict((name.lower(), value) for name, value
+                                    in response.getheaders())
+            if response.will_close:
+                self.discard(parts.scheme, parts.netloc)
+            return response.status, response_headers, content
+
+    def close(self):
+        with self.lock:
+            for connection in self.all_connections:
+                connection.close()
+            self.all_connections = []
+
+
+# is_url lets through bare "www..." links, which need a scheme to fetch
+def normalize_url(url):
+    if '://' not in url:
+        url = 'http://' + url
+    return url
+
+
+def fetch(pool, url, headers):
+    for _ in range(MAX_REDIRECTS + 1):
+        status, response_headers, body = pool.request('GET', url, headers)
+        if status in REDIRECT_CODES and 'location' in response_headers:
+            url = urljoin(normalize_url(url), response_headers['location'])
+            continue
+        return status, response_headers, body
+    raise DownloadError("too many redirects")
+
+
+def download_photo(pool, url, file_name, entry):
+    """Returns ('downloaded' or 'unchanged', new manifest entry)."""
+    have_file = os.path.exists(file_name)
+    if not (entry and have_file and entry.get('url') == url):
+        entry = None
+
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    status, response_headers, body = fetch(pool, url, headers)
+    if status == 304 and entry:
+        return 'unchanged', entry
+    if status != 200:
+        raise DownloadError("HTTP %d" % status)
+
+    digest = hashlib.sha1(body).hexdigest()
+    new_entry = {'url': url,
+                 'etag': response_headers.get('etag'),
+                 'last_modified': response_headers.get('last-modified'),
+                 'sha1': digest}
+    if entry and entry.get('sha1') == digest:
+        return 'unchanged', new_entry
+
+    with open(file_name, 'wb') as file_handle:
+        file_handle.write(body)
+    TroupeProfile.count("download", bytes=len(body))
+    return 'downloaded', new_entry
+
+
+def download_photos(photos, manifest_file=None, jobs=DEFAULT_JOBS,
+                    timeout=DEFAULT_TIMEOUT):
+    """Downloads (url, file_name) pairs, returning a report dict.
+
+    The report lists the file names that were 'downloaded' or left
+    'unchanged', and the (file_name, url, error) triples that 'failed'.
+    """
+    from multiprocessing.pool import ThreadPool
+
+    manifest = PageWriter.load_manifest(manifest_file)
+    pool = ConnectionPool(timeout)
+
+    def download(photo):
+        url, file_name = photo
+        try:
+            result, entry = download_photo(pool, url, file_name,
+                                           manifest.get(file_name))
+        except (DownloadError, httplib.HTTPException, socket.error,
+                IOError, ValueError) as e:
+            return file_name, url, 'failed', str(e) or e.__class__.__name__
+        return file_name, url, result, entry
+
+    threads = ThreadPool(max(1, jobs))
+    try:
+        results = threads.map(download, photos)
+    finally:
+        threads.close()
+        threads.join()
+        pool.close()
+
+    report = {'downloaded': [], 'unchanged': [], 'failed': []}
+    for file_name, url, result, detail in results:
+        if result == 'failed':
+            report['failed'].append((file_name, url, detail))
+            manifest.pop(file_name, None)
+        else:
+            report[result].append(file_name)
+            manifest[file_name] = detail
+
+    if manifest_file:
+        PageWriter.save_manifest(manifest, manifest_file)
+    return report
+
+
+def print_report(report):
+    print("Photos: %d downloaded, %d unchanged, %d failed" %
+          (len(report['downloaded']), len(report['unchanged']),
+           len(report['failed'])))
+    for file_name, url, error in sorted(report['failed']):
+        print("  %s (%s): %s" % (file_name, url, error))
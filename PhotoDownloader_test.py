@@ -0,0 +1,123 @@
+import PhotoDownloader
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+
+class PhotoHandler(BaseHTTPRequestHandler):
+    """Serves /<name>.jpg with an ETag, and 404s for /missing.jpg."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.client_address))
+        if self.path == "/missing.jpg":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/moved.jpg":
+            self.send_response(301)
+            self.send_header("Location", "/a.jpg")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.path.encode("ascii") * 10
+        etag = '"%s"' % self.path
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PhotoServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ValidatePhotoDownloader(unittest.TestCase):
+
+    def setUp(self):
+        self.server = PhotoServer(("127.0.0.1", 0), PhotoHandler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = "http://127.0.0.1:%d/" % self.server.server_address[1]
+        self.temp_dir = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.temp_dir, "manifest.json")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir)
+
+    def photos(self, *names):
+        return [(self.base + name, os.path.join(self.temp_dir, name))
+                for name in names]
+
+    def test_download_and_revalidate(self):
+        """A second run should get 304s and leave the photos alone."""
+
+        photos = self.photos("a.jpg", "b.jpg", "c.jpg")
+        report = PhotoDownloader.download_photos(photos, self.manifest, 2)
+        self.assertEqual(len(report['downloaded']), 3)
+        with open(photos[0][1], "rb") as file_handle:
+            self.assertEqual(file_handle.read(), b"/a.jpg" * 10)
+
+        report = PhotoDownloader.download_photos(photos, self.manifest, 2)
+        self.assertEqual(len(report['unchanged']), 3)
+        self.assertEqual(report['downloaded'], [])
+
+    def test_failures_reported(self):
+        """Missing photos and dead hosts should land in the failure list."""
+
+        photos = self.photos("a.jpg", "missing.jpg")
+        photos.append(("http://127.0.0.1:1/x.jpg",
+                       os.path.join(self.temp_dir, "x.jpg")))
+        report = PhotoDownloader.download_photos(photos, self.manifest,
+                                                 timeout=5)
+        self.assertEqual(len(report['downloaded']), 1)
+        failed = {file_name: error
+                  for file_name, _, error in report['failed']}
+        self.assertEqual(len(failed), 2)
+        self.assertEqual(failed[photos[1][1]], "HTTP 404")
+
+    def test_redirect(self):
+        """Redirects should be followed."""
+
+        photos = self.photos("moved.jpg")
+        report = PhotoDownloader.download_photos(photos)
+        self.assertEqual(len(report['downloaded']), 1)
+        with open(photos[0][1], "rb") as file_handle:
+            self.assertEqual(file_handle.read(), b"/a.jpg" * 10)
+
+    def test_connection_reuse(self):
+        """One worker should fetch every photo over a single connection."""
+
+        photos = self.photos("a.jpg", "b.jpg", "c.jpg", "d.jpg")
+        PhotoDownloader.download_photos(photos, jobs=1)
+        clients = {client for _, client in self.server.requests}
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(len(clients), 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
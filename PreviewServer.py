@@ -0,0 +1,247 @@
+"""Preview Server
+
+A local web server for checking a template or data change on a few
+troupes without regenerating every page.  The collated troupes stay in
+memory, and a troupe's page is only rendered when it's asked for, then
+cached under a hash of the troupe's data, its related troupes and a hash
+of the templates, so it's rendered again only once one of those changes.
+Before each request the input files, templates and extant_troupes.txt
+are checked for changes the way --watch checks them (see TroupeWatcher),
+and only the troupes whose rows changed are re-collated.
+
+  /                 a search box; /?q=bills lists the troupes whose names
+                    start that way, or failing that, near spellings of it
+  /troupe/<name>    the troupe's page
+  /raw/<name>       its wikitext alone, as text/plain
+
+Page responses say in X-Cache whether the page came from the cache, and
+in X-Render-Ms how long the request took.
+"""
+
+import bisect
+import hashlib
+import time
+
+import ProcessTroupeData
+import TroupeNames
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from urllib import quote, unquote
+    from urlparse import parse_qs, urlsplit
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from xml.sax.saxutils import escape
+
+DEFAULT_PORT = 8000
+SEARCH_LIMIT = 50
+
+SEARCH_HTML = u"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Troupe preview</title></head>
+<body>
+<form action="/"><input name="q" value="%(query)s" autofocus>
+<input type="submit" value="Search"></form>
+<p>%(summary)s</p>
+<ul>
+%(results)s
+</ul>
+</body></html>
+"""
+
+PAGE_HTML = u"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>%(name)s</title></head>
+<body>
+<p><a href="/">Search</a> | <a href="/raw/%(path)s">wikitext</a> |
+goes in output\\%(subdir)s</p>
+<pre>%(text)s</pre>
+</body></html>
+"""
+
+
+def troupe_data_hash(troupe_data):
+    fields = sorted((field_name, sorted(value)
+                     if isinstance(value, frozenset) else value)
+                    for field_name, value in troupe_data.items())
+    return hashlib.sha1(repr(fields).encode('utf8')).hexdigest()
+
+
+def templates_hash(templates):
+    digest = hashlib.sha1()
+    for name in sorted(templates):
+        digest.update((u"%s\0%s\0" % (name, templates[name].text))
+                      .encode('utf8'))
+    return digest.hexdigest()
+
+
+class TroupePreview(object):
+    """The collated troupes, rendered pages and search index behind the
+    server; refresh() brings them up to date with the files."""
+
+    def __init__(self, filenames, merge_names=False, template_dir=None):
+        import TroupeWatcher
+        self.watcher = TroupeWatcher.TroupeWatcher(
+            filenames, merge_names, template_dir=template_dir)
+        self.templates = None
+        self.template_hash = None
+        self.pages = {}        # troupe name -> (cache key, page)
+        self.related = {}      # troupe name -> its related troupes
+        self.search_keys = []  # sorted (name key, name)
+        self.name_index = None  # for near spellings, built when first needed
+        self.refresh()
+
+    def refresh(self):
+        watcher = self.watcher
+        changed_files = watcher.changed_paths(watcher.filenames)
+        extant_changed = watcher.changed_paths(
+            [ProcessTroupeData.EXTANT_TROUPES_FILE])
+        rows_changed = changed_files or (extant_changed and
+                                         watcher.merge_names)
+        if rows_changed:
+            watcher.update_rows(changed_files)
+            self.search_keys = sorted((TroupeNames.name_key(troupe_name),
+                                       troupe_name)
+                                      for troupe_name in watcher.troupe_dict)
+            self.name_index = None
+        if extant_changed or watcher.extant_troupes is None:
+            watcher.update_extant()
+        templates = ProcessTroupeData.load_template_files(
+            watcher.template_dir)
+        templates_changed = templates is not self.templates
+        if templates_changed:
+            self.templates = templates
+            self.template_hash = templates_hash(templates)
+        if rows_changed or templates_changed:
+            self.related = ProcessTroupeData.troupe_relations(
+                watcher.troupe_dict, templates) or {}
+
+    def page(self, troupe_name):
+        """Returns (page, output subdirectory, whether it was cached), or
+        None if there's no such troupe."""
+        troupe_data = self.watcher.troupe_dict.get(troupe_name)
+        if troupe_data is None:
+            return None
+        related = self.related.get(troupe_name)
+        key = (troupe_data_hash(troupe_data), related, self.template_hash)
+        cached = self.pages.get(troupe_name)
+        if cached and cached[0] == key:
+            troupe_page = cached[1]
+        else:
+            troupe_page = ProcessTroupeData.create_troupe_page(
+                troupe_name, troupe_data, self.templates, related)
+            self.pages[troupe_name] = (key, troupe_page)
+        subdir = ProcessTroupeData.troupe_page_subdir(
+            troupe_name, troupe_page, self.watcher.extant_troupes)
+        return troupe_page, subdir, cached is not None and cached[0] == key
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Troupe names starting with query (articles, case and punctuation
+        aside), or if none do, near spellings of it."""
+        key = TroupeNames.name_key(query)
+        keys = self.search_keys
+        index = bisect.bisect_left(keys, (key,))
+        matches = []
+        while index < len(keys) and len(matches) < limit and \
+                keys[index][0].startswith(key):
+            matches.append(keys[index][1])
+            index += 1
+        if matches or not key:
+            return matches
+        if self.name_index is None:
+            self.name_index = TroupeNames.NameIndex(self.watcher.troupe_dict)
+        return self.name_index.lookup(query)[:limit]
+
+
+def troupe_path(troupe_name):
+    return quote(troupe_name.encode('utf8'), safe="")
+
+
+class PreviewHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        start = time.time()
+        preview = self.server.preview
+        parts = urlsplit(self.path)
+        path = unquote(parts.path)
+        if isinstance(path, bytes):
+            path = path.decode('utf8')
+        preview.refresh()
+
+        headers = []
+        if path == "/":
+            query = parse_qs(parts.query).get('q', [""])[0]
+            if isinstance(query, bytes):
+                query = query.decode('utf8')
+            status, content_type, body = 200, "text/html", \
+                self.search_page(preview, query)
+        elif path.startswith(("/troupe/", "/raw/")):
+            raw = path.startswith("/raw/")
+            troupe_name = path.split("/", 2)[2]
+            result = preview.page(troupe_name)
+            if result is None:
+                status, content_type, body = 404, "text/plain", \
+                    u"No troupe called %s" % troupe_name
+            else:
+                troupe_page, subdir, cached = result
+                headers.append(("X-Cache", "hit" if cached else "miss"))
+                status = 200
+                if raw:
+                    content_type, body = "text/plain", troupe_page
+                else:
+                    content_type = "text/html"
+                    body = PAGE_HTML % {'name': escape(troupe_name),
+                                        'path': troupe_path(troupe_name),
+                                        'subdir': escape(subdir),
+                                        'text': escape(troupe_page)}
+        else:
+            status, content_type, body = 404, "text/plain", u"Not found"
+
+        data = body.encode('utf8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("X-Render-Ms", "%.1f" % ((time.time() - start) *
+                                                  1000))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def search_page(self, preview, query):
+        if query:
+            troupe_names = preview.search(query)
+            summary = u"%d troupes found" % len(troupe_names)
+        else:
+            troupe_names = []
+            summary = u"%d troupes" % len(preview.watcher.troupe_dict)
+        results = u"\n".join(u'<li><a href="/troupe/%s">%s</a></li>' % (
+            troupe_path(troupe_name), escape(troupe_name))
+            for troupe_name in troupe_names)
+        return SEARCH_HTML % {'query': escape(query, {'"': "&quot;"}),
+                              'summary': summary, 'results': results}
+
+    def log_message(self, *args):
+        pass
+
+
+def make_server(filenames, merge_names=False, port=DEFAULT_PORT,
+                host="127.0.0.1", template_dir=None):
+    server = HTTPServer((host, port), PreviewHandler)
+    server.preview = TroupePreview(filenames, merge_names, template_dir)
+    return server
+
+
+def serve(filenames, merge_names=False, port=DEFAULT_PORT):
+    """Serves previews of the troupes in filenames until interrupted."""
+    server = make_server(filenames, merge_names, port)
+    print("Previewing %d troupes at http://%s:%d/ (Ctrl-C to stop)" % (
+        len(server.preview.watcher.troupe_dict),
+        server.server_address[0], server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
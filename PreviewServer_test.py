@@ -0,0 +1,144 @@
+import GenerateTroupeData
+import PreviewServer
+import ProcessTroupeData
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+try:
+    from urllib2 import HTTPError, urlopen
+except ImportError:
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+
+
+class ValidatePreviewServer(unittest.TestCase):
+
+    def setUp(self):
+        # the tests change directory, and modules imported lazily must
+        # still be found from there
+        self.old_path = sys.path[:]
+        sys.path[:] = [os.path.abspath(path) for path in sys.path]
+        self.old_dir = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+        self.clock = 1000000000
+        os.mkdir("templates")
+        for name in ("deal", "more_info", "media"):
+            self.write_template(name, u"")
+        self.write_template("blurb", u"{blurb}")
+        self.write_template("summary", u"{blurb_section}")
+        self.write_template("troupe", u"{name} {years} {summary_section}"
+                            u"{other_categories}")
+        with open("extant_troupes.txt", "w") as file_handle:
+            file_handle.write("Tiny Robots\n")
+        self.rows = [GenerateTroupeData.HEADERS,
+                     ProcessTroupeData.troupe_row("Tiny Robots", year="2010",
+                                                  blurb="Beep."),
+                     ProcessTroupeData.troupe_row("Blue Llamas", year="2011",
+                                                  blurb="Spit.",
+                                                  performed_before="Yes"),
+                     ProcessTroupeData.troupe_row("Blue Lobsters",
+                                                  year="2012")]
+        self.write_input()
+
+        self.server = PreviewServer.make_server(["troupes.csv"], port=0,
+                                                template_dir="templates")
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.old_dir)
+        shutil.rmtree(self.temp_dir)
+        sys.path[:] = self.old_path
+
+    # gives every write its own (past) modification time, so a rewrite
+    # within the same clock tick still counts as a change
+    def touch(self, file_name):
+        self.clock += 1
+        os.utime(file_name, (self.clock, self.clock))
+
+    def write_template(self, name, text):
+        file_name = os.path.join("templates", name + "_template.wiki")
+        with open(file_name, "w") as file_handle:
+            file_handle.write(text.encode('utf-8'))
+        self.touch(file_name)
+
+    def write_input(self):
+        GenerateTroupeData.write_csv("troupes.csv", self.rows)
+        self.touch("troupes.csv")
+
+    def get(self, path):
+        response = urlopen(self.url + path)
+        try:
+            return response.read().decode('utf8'), response.info()
+        finally:
+            response.close()
+
+    def test_cached_page(self):
+        """A page is rendered when first asked for, then served cached."""
+
+        self.assertEqual(self.server.preview.pages, {})
+        page, headers = self.get("/raw/Blue%20Llamas")
+        self.assertTrue(page.startswith(u"Blue Llamas 2011 Spit."))
+        self.assertEqual(headers["X-Cache"], "miss")
+        self.assertEqual(list(self.server.preview.pages), [u"Blue Llamas"])
+
+        page, headers = self.get("/troupe/Blue%20Llamas")
+        self.assertEqual(headers["X-Cache"], "hit")
+        self.assertTrue(u"<pre>Blue Llamas 2011 Spit." in page)
+        self.assertTrue(u"goes in output\\pages</p>" in page)
+        self.assertTrue(u"output\\pages\\extant" in
+                        self.get("/troupe/Tiny%20Robots")[0])
+
+    def test_invalidation(self):
+        """Changed rows or templates re-render only the pages they touch."""
+
+        self.get("/raw/Blue%20Llamas")
+        self.get("/raw/Tiny%20Robots")
+        self.rows[2][7] = "Spits."
+        self.write_input()
+        page, headers = self.get("/raw/Blue%20Llamas")
+        self.assertEqual(headers["X-Cache"], "miss")
+        self.assertTrue(u"Spits." in page)
+        self.assertEqual(self.get("/raw/Tiny%20Robots")[1]["X-Cache"], "hit")
+
+        self.write_template("blurb", u"''{blurb}''")
+        page, headers = self.get("/raw/Tiny%20Robots")
+        self.assertEqual(headers["X-Cache"], "miss")
+        self.assertTrue(u"''Beep.''" in page)
+
+    def test_search(self):
+        """Search finds name prefixes, then near spellings."""
+
+        page, _ = self.get("/?q=the+blue+l")
+        self.assertTrue(u'href="/troupe/Blue%20Llamas"' in page)
+        self.assertTrue(u'href="/troupe/Blue%20Lobsters"' in page)
+        self.assertEqual(self.server.preview.search(u"Tiny Robts"),
+                         [u"Tiny Robots"])
+        self.assertEqual(self.server.preview.search(u"Wizards"), [])
+
+    def test_unknown_troupe(self):
+        """Troupes that aren't in the input are not found."""
+
+        self.rows.pop()
+        self.write_input()
+        for path in ("/troupe/Blue%20Lobsters", "/elsewhere"):
+            try:
+                self.get(path)
+                self.fail("%s was found" % path)
+            except HTTPError as e:
+                self.assertEqual(e.code, 404)
+        self.assertEqual(self.server.preview.search(u"blue"),
+                         [u"Blue Llamas"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -1,19 +1,102 @@
 """Process Troupe Data
 
-This takes in an ODS file of troupe applications to the Hideout Theatre,
-collates them into a single dictionary of troupes->troupe data, and then
-converts that to a set of files for the AIC Wiki.
+This takes in an ODS (or CSV, TSV or XLSX) file of troupe applications to
+the Hideout Theatre, collates them into a single dictionary of
+troupes->troupe data, and then converts that to a set of files for the
+AIC Wiki.
 
 Command line usage:
-$ python ProcessTroupeData.py filename
+$ python ProcessTroupeData.py pages filename... [--state STATE_FILE]
+      [--jobs N] [--engine rows|columns] [--merge-names] [--drop-dead-links]
+      [--pics] [--buffer-rows N] [--dump [--gzip] |
+      --watch [--interval SECONDS] | --list-duplicates]
+$ python ProcessTroupeData.py pics [filename...] [--state STATE_FILE]
+      [--jobs N] [--timeout SECONDS]
+$ python ProcessTroupeData.py stats filename... [--state STATE_FILE]
+      [--jobs N] [--engine rows|columns] [--merge-names]
+$ python ProcessTroupeData.py check filename... [--state STATE_FILE]
+$ python ProcessTroupeData.py check-links filename... [--state STATE_FILE]
+      [--jobs N] [--timeout SECONDS] [--ttl HOURS]
+$ python ProcessTroupeData.py store filename... [--db STORE_FILE]
+      [--state STATE_FILE] [--jobs N] [--engine rows|columns] [--merge-names]
+$ python ProcessTroupeData.py query [--db STORE_FILE] [--active-in YEAR]
+      [--performer NAME] [--class extant|never|performed]
+$ python ProcessTroupeData.py publish filename... --api URL [--user NAME]
+      [--jobs N] [--batch N] [--include-extant] [--summary TEXT]
+      [--state STATE_FILE] [--engine rows|columns] [--merge-names]
+      [--drop-dead-links] [--buffer-rows N]
+$ python ProcessTroupeData.py preview filename... [--port N] [--merge-names]
+
+Without a subcommand, pages is assumed.  Each subcommand's --help says
+what it does.
 """
 
+# modules only some subcommands need (unidecode, the network code, NumPy,
+# multiprocessing) are imported where they're used, so stats and check
+# start quickly
+import CastIndex
+import TroupeProfile
+import TroupeRecord
 
+# the spreadsheet columns process_row looks at
+TROUPE_COLUMNS = (1, 2, 4, 7, 11, 13, 19, 20, 22)
+ROW_COLUMNS = {'name': 1, 'site': 2, 'cast': 4, 'blurb': 7,
+               'performed_before': 11, 'deal': 13, 'photo': 19, 'video': 20,
+               'year': 22}
+
+
+# ODS, CSV, TSV or XLSX, told apart by RowSources
 def load_troupe_info(filename):
-    from ODSReader import ODSReader
-    doc = ODSReader(filename)
-    troupeDatabase = doc.getSheet("avail")
-    return troupeDatabase[1:]  # remove headers
+    import itertools
+    import RowSources
+    if TroupeProfile.enabled:
+        import os
+        TroupeProfile.count("load", bytes=os.path.getsize(filename))
+    troupeDatabase = TroupeProfile.timed_iter(
+        "read", RowSources.iter_rows(filename, "avail", TROUPE_COLUMNS),
+        "load")
+    return itertools.islice(troupeDatabase, 1, None)  # remove headers
+
+
+# the rows of every file in turn, as if they were one spreadsheet
+def load_troupe_files(filenames):
+    import itertools
+    return itertools.chain.from_iterable(load_troupe_info(filename)
+                                         for filename in filenames)
+
+
+# spreadsheets named on the command line; a directory stands for the
+# spreadsheets in it, in name order
+def input_file_names(paths):
+    import os
+    import RowSources
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if os.path.splitext(name)[1].lower() in
+                RowSources.EXTENSIONS))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+# one application as a row, for building tables in memory instead of
+# spreadsheets: troupe_row("The Bills", cast="Ann, Bob", year="2012")
+def troupe_row(name, **fields):
+    row = [""] * (max(TROUPE_COLUMNS) + 1)
+    row[ROW_COLUMNS['name']] = name
+    for field_name, value in fields.items():
+        if field_name not in ROW_COLUMNS:
+            raise TypeError("no such application field: %r" % field_name)
+        row[ROW_COLUMNS[field_name]] = value
+    return row
+
+
+# rows for applications given as dicts of troupe_row's arguments
+def troupe_table(applications):
+    return [troupe_row(**application) for application in applications]
 
 
 def is_url(string):
@@ -27,7 +110,7 @@ def set_first_valid_url(data, field_name, new_string):
 
 def collect_valid_urls(data, field_name, new_string):
     if is_url(new_string):
-        new_item_set = set([new_string])
+        new_item_set = frozenset([new_string])
         if field_name in data:
             data[field_name] = data[field_name] | new_item_set
         else:
@@ -43,15 +126,19 @@ def set_longest_string(data, field_name, new_string):
     return True
 
 
-def collate_cast(data, field_name, new_string):
-    import re
+# memoized, with interned names (see CastIndex); the frozenset returned is
+# shared, so troupes with one cast list all point at the same set
+def parse_cast(new_string):
+    return CastIndex.parse_cast(new_string)
+
+
+def collate_cast(data, field_name, new_string, cast_index=None,
+                 troupe_name=None):
     if not new_string:
         return
-    # Handle AND
-    new_string = re.sub(r'\sAND\s', ' & ', new_string, flags=re.IGNORECASE)
-    new_cast_set = set(re.split('[&,\n]', new_string))  # set of split-up names
-    new_cast_set = {name.strip() for name in new_cast_set}  # strip whitespace
-    new_cast_set = {name for name in new_cast_set if name}  # kill empty
+    new_cast_set = parse_cast(new_string)
+    if cast_index is not None:
+        cast_index.add(troupe_name, new_cast_set)
 
     if field_name in data:
         data[field_name] = data[field_name] | new_cast_set
@@ -97,11 +184,11 @@ def set_yes_no_field(data, field_name, new_string):
     data[field_name] = result
 
 
-def process_row(troupe_dict, row):
+def process_row(troupe_dict, row, cast_index=None):
     if row[1] in troupe_dict:
         data = troupe_dict[row[1]]
     else:
-        data = {}
+        data = TroupeRecord.TroupeRecord()
 
     set_first_valid_url(data, 'site', row[2].replace('https', 'http'))
     set_first_valid_url(data, 'photo', row[19].replace('https', 'http'))
@@ -112,7 +199,7 @@ def process_row(troupe_dict, row):
     if set_longest_string(data, 'deal', row[13]):
         data['deal_year'] = row[22]
 
-    collate_cast(data, 'cast', row[4])
+    collate_cast(data, 'cast', row[4], cast_index, row[1])
 
     set_start_year(data, 'start_year', row[22])
     set_end_year(data, 'end_year', row[22])
@@ -122,34 +209,198 @@ def process_row(troupe_dict, row):
     return data
 
 
-def process_troupe_data(filename):
-    table = load_troupe_info(filename)
-    troupe_dict = {}
+def collate_rows(table, troupe_dict=None, cast_index=None):
+    if troupe_dict is None:
+        troupe_dict = {}
+    collate = TroupeProfile.timed("collate", process_row)
     for row in table:
         if row[1]:
-            troupe_dict[row[1]] = process_row(troupe_dict, row)
+            troupe_dict[row[1]] = collate(troupe_dict, row, cast_index)
     return troupe_dict
 
 
-def load_template_files():
-    import os
-    import glob
-    templates = {}
-    saved_path = os.getcwd()
-    os.chdir(".\\templates")
-    for file_name in glob.glob("*_template.wiki"):
-        field_name = file_name.replace("_template.wiki", "")
-        file_handle = open(file_name)
-        templates[field_name] = file_handle.read().decode('utf-8')
-    os.chdir(saved_path)
-    return templates
+# folds troupe data collated from later rows into data, with the same
+# result as collating all the rows in order: the earlier URL wins, the
+# later of two equally long strings wins, and the earlier of two equal
+# years wins
+def merge_troupe_data(data, later_data):
+    for field_name in ('site', 'photo'):
+        if not field_name in data and field_name in later_data:
+            data[field_name] = later_data[field_name]
+
+    for field_name in ('video', 'cast'):
+        if field_name in later_data:
+            data[field_name] = data.get(field_name, frozenset()) | \
+                later_data[field_name]
+
+    for field_name in ('blurb', 'deal'):
+        if field_name in later_data and \
+                set_longest_string(data, field_name, later_data[field_name]):
+            data[field_name + '_year'] = later_data[field_name + '_year']
+
+    if 'start_year' in later_data:
+        set_start_year(data, 'start_year', later_data['start_year'])
+        set_end_year(data, 'end_year', later_data['end_year'])
+
+    if 'performed_before' in later_data and \
+            data.get('performed_before') != 'y':
+        data['performed_before'] = later_data['performed_before']
+
+    return data
+
+
+# troupe dicts collated from consecutive runs of rows, merged in order
+def merge_troupe_dicts(troupe_dicts):
+    merged = {}
+    for troupe_dict in troupe_dicts:
+        for troupe_name, troupe_data in troupe_dict.iteritems():
+            if troupe_name in merged:
+                merge_troupe_data(merged[troupe_name], troupe_data)
+            else:
+                merged[troupe_name] = troupe_data
+    return merged
+
+
+# "rows" merges one row at a time with process_row; "columns" computes the
+# same merges for all troupes at once with NumPy (see TroupeColumns)
+COLLATION_ENGINES = ("rows", "columns")
+
+
+def collate_table(table, engine="rows", cast_index=None):
+    if engine == "columns":
+        import TroupeColumns
+        return TroupeColumns.collate_columns(table, cast_index)
+    if engine != "rows":
+        raise ValueError("unknown collation engine: %r" % engine)
+    return collate_rows(table, cast_index=cast_index)
+
+
+# near-duplicate spellings of one troupe, within the table and against
+# extant_troupes.txt, are renamed to a single name (see TroupeNames).
+# Returns the renamed rows and the name -> resolved name mapping.
+def merge_troupe_names(table):
+    import collections
+    import TroupeNames
+    table = list(table)
+    name_counts = collections.OrderedDict()
+    for row in table:
+        if row[1]:
+            name_counts[row[1]] = name_counts.get(row[1], 0) + 1
+    resolved = TroupeNames.resolve_names(name_counts,
+                                         get_extant_troupe_names())
+    return TroupeNames.renamed_rows(table, resolved), resolved
+
+
+def collate_troupe_file(item):
+    filename, engine = item
+    return collate_table(load_troupe_info(filename), engine)
+
+
+# each file is collated in its own worker process, and the partial troupe
+# dicts are merged in file order as they come back
+def process_troupe_files(filenames, engine="rows", jobs=1):
+    import multiprocessing
+    pool = multiprocessing.Pool(max(1, min(jobs, len(filenames))),
+                                TroupeProfile.init_worker,
+                                (TroupeProfile.enabled,))
+    try:
+        return merge_troupe_dicts(TroupeProfile.profiled_imap(
+            pool, collate_troupe_file,
+            [(filename, engine) for filename in filenames]))
+    finally:
+        pool.close()
+        pool.join()
+
+
+# the input files source names, or None if it's rows
+def source_file_names(source):
+    if isinstance(source, basestring):
+        return [source]
+    if isinstance(source, (list, tuple)) and \
+            all(isinstance(item, basestring) for item in source):
+        return list(source)
+    return None
+
+
+# the troupe store source names, or None if it isn't one
+def source_store(source):
+    filenames = source_file_names(source)
+    if filenames is None or len(filenames) != 1:
+        return None
+    import TroupeStore
+    return filenames[0] if TroupeStore.is_store(filenames[0]) else None
+
+
+# source is a file name; a list of files, collated as if their rows were
+# one spreadsheet (in parallel, given more than one job); any iterable of
+# rows shaped like load_troupe_info's (see troupe_table); or a troupe dict
+# that's already collated, which is passed straight through, or one saved
+# in a troupe store (see TroupeStore), which is already collated, so
+# the engine doesn't apply.  The stages below all take a source, so a run
+# that does several collates just once.
+# With a state file, only troupes whose rows changed since the last run
+# are re-collated (see TroupeState), always with the rows engine.
+# A CastIndex, if given, is filled with performer -> troupes along the way.
+def process_troupe_data(source, state_file=None, engine="rows",
+                        cast_index=None, merge_names=False, jobs=1):
+    if isinstance(source, dict):
+        if cast_index is not None:
+            cast_index.add_troupes(source)
+        return source
+    filenames = source_file_names(source)
+    store_file = source_store(filenames)
+    if store_file:
+        import TroupeStore
+        if merge_names:
+            raise ValueError("name merging can't be used with a troupe "
+                             "store")
+        if state_file:
+            raise ValueError("a state file can't follow a troupe store")
+        return process_troupe_data(TroupeStore.load_store(store_file),
+                                   cast_index=cast_index)
+    if state_file:
+        if merge_names:
+            raise ValueError("name merging can't be used with a state file")
+        if filenames is None or len(filenames) != 1:
+            raise ValueError("a state file can only follow one input file")
+        import TroupeState
+        troupe_dict, _ = TroupeState.update_troupe_data(filenames[0],
+                                                        state_file)
+        if cast_index is not None:
+            cast_index.add_troupes(troupe_dict)
+        return troupe_dict
+    # near-duplicate names are resolved across all the rows at once, so
+    # merging names needs them in one stream
+    if filenames is None:
+        table = source
+    elif len(filenames) > 1 and jobs > 1 and not merge_names:
+        troupe_dict = process_troupe_files(filenames, engine, jobs)
+        if cast_index is not None:
+            cast_index.add_troupes(troupe_dict)
+        return troupe_dict
+    else:
+        table = load_troupe_files(filenames)
+    if merge_names:
+        table, _ = merge_troupe_names(table)
+    return collate_table(table, engine, cast_index)
+
+
+# compiled once per process and reloaded only when a template file changes
+def load_template_files(template_dir=None):
+    import TroupeTemplates
+    return TroupeTemplates.load_templates(template_dir)
 
 
 def fix_carriage_returns(string):
     return string.replace('\n', '\n\n')
 
 
-def create_troupe_page(troupe_name, troupe_data, templates):
+# everything the templates need goes into a render context built from a
+# copy of the troupe's data, so rendering leaves the troupe record as it was.
+# related is the troupe's (other troupe, performers shared) pairs, for
+# templates with a related section (see troupe_relations).
+def create_troupe_page(troupe_name, troupe_data, templates, related=None):
+    troupe_data = dict(troupe_data.items())
     troupe_data['name'] = troupe_name
     troupe_data['blurb_section'] = ""
     troupe_data['deal_section'] = ""
@@ -157,6 +408,7 @@ def create_troupe_page(troupe_name, troupe_data, templates):
     troupe_data['cast_list'] = ""
     troupe_data['media_section'] = ""
     troupe_data['more_info_section'] = ""
+    troupe_data['related_section'] = ""
 
     show_summary = False
 
@@ -164,27 +416,35 @@ def create_troupe_page(troupe_name, troupe_data, templates):
         show_summary = True
         troupe_data['blurb'] = fix_carriage_returns(troupe_data['blurb'])
         troupe_data['blurb_section'] = \
-            templates['blurb'].format(**troupe_data)
+            templates['blurb'].render(troupe_data)
 
     if 'deal' in troupe_data and troupe_data['deal']:
         show_summary = True
         troupe_data['deal'] = fix_carriage_returns(troupe_data['deal'])
         troupe_data['deal_section'] = \
-            templates['deal'].format(**troupe_data)
+            templates['deal'].render(troupe_data)
 
     if show_summary:
         troupe_data['summary_section'] = \
-            templates['summary'].format(**troupe_data)
+            templates['summary'].render(troupe_data)
 
     if 'site' in troupe_data and troupe_data['site']:
         troupe_data['more_info_section'] = \
-            templates['more_info'].format(**troupe_data)
+            templates['more_info'].render(troupe_data)
 
     if 'cast' in troupe_data:
         troupe_data['cast_list'] = \
             "{{ Unbulleted list | [[" + \
             "]] | [[".join(sorted(troupe_data['cast'])) + "]] }}"
 
+    if related and 'related' in templates:
+        troupe_data['related_list'] = \
+            "\n".join(["* [[" + other + "]] (" + str(shared) + " shared " +
+                       ("performer" if shared == 1 else "performers") + ")"
+                       for other, shared in related])
+        troupe_data['related_section'] = \
+            templates['related'].render(troupe_data)
+
     troupe_data['is_or_was'] = "was"
 
     if not 'start_year' in troupe_data:
@@ -204,10 +464,11 @@ def create_troupe_page(troupe_name, troupe_data, templates):
 
     if 'video' in troupe_data:
         troupe_data['video_list'] = \
-            "\n".join({"* [" + url + " Video #" + str(index + 1) + "]"
-                       for index, url in enumerate(troupe_data['video'])})
+            "\n".join(["* [" + url + " Video #" + str(index + 1) + "]"
+                       for index, url in
+                       enumerate(sorted(troupe_data['video']))])
         troupe_data['media_section'] = \
-            templates['media'].format(**troupe_data)
+            templates['media'].render(troupe_data)
 
     troupe_data['other_categories'] = ""
 
@@ -222,7 +483,7 @@ def create_troupe_page(troupe_name, troupe_data, templates):
     else:
         troupe_data['other_categories'] += "\n[[Category:Never Performed]]"
 
-    return templates["troupe"].format(**troupe_data)
+    return templates["troupe"].render(troupe_data)
 
 
 # direct access to the page generator, for testing
@@ -232,11 +493,15 @@ def create_test_page(troupe_name, troupe_data):
     return create_troupe_page(troupe_name, troupe_data, templates)
 
 
-def create_troupe_pages(filename):
-    troupe_dict = process_troupe_data(filename)
+def create_troupe_pages(source, state_file=None, engine="rows",
+                        merge_names=False):
+    troupe_dict = process_troupe_data(source, state_file, engine,
+                                      merge_names=merge_names)
     templates = load_template_files()
-    pages_dict = {troupe_name: create_troupe_page(troupe_name, troupe_data,
-                  templates)
+    related = troupe_relations(troupe_dict, templates) or {}
+    render = TroupeProfile.timed("render", create_troupe_page)
+    pages_dict = {troupe_name: render(troupe_name, troupe_data, templates,
+                                      related.get(troupe_name))
                   for troupe_name, troupe_data in troupe_dict.iteritems()}
     return(pages_dict)
 
@@ -247,42 +512,138 @@ def troupe_name_to_file_name(troupe_name, subdir, extension):
         extension
 
 
-def download_troupe_pics(filename):
-    troupe_dict = process_troupe_data(filename)
+# photos already on disk are revalidated against the manifest rather than
+# downloaded again (see PhotoDownloader)
+def download_troupe_pics(source, state_file=None, jobs=None, timeout=None):
+    import os
+    import PhotoDownloader
+    troupe_dict = process_troupe_data(source, state_file)
+    photos = []
     for troupe_name, troupe_data in troupe_dict.iteritems():
         if 'photo' in troupe_data:
-            import os
-            import urllib
             _, file_extension = os.path.splitext(troupe_data['photo'])
             file_name = troupe_name_to_file_name(troupe_name, "pics",
                                                  file_extension)
-            try:
-                urllib.urlretrieve(troupe_data['photo'], file_name)
-            except:
-                e = sys.exc_info()[0]
-                print( "<p>Error: %s</p>" % e )
+            photos.append((troupe_data['photo'], file_name))
 
+    with TroupeProfile.stage("download") as timer:
+        report = PhotoDownloader.download_photos(
+            photos, troupe_name_to_file_name("manifest", "pics", ".json"),
+            jobs or PhotoDownloader.DEFAULT_JOBS,
+            timeout or PhotoDownloader.DEFAULT_TIMEOUT)
+        timer.count(photos=len(photos), failed=len(report['failed']))
+    PhotoDownloader.print_report(report)
+    return report
 
-# delete all the files in the output-pages directory
-def init_output_directories():
-    import os
 
-    for root, dirs, files in os.walk('.\\output\\pages'):
-        for f in files:
-            os.unlink(os.path.join(root, f))
+LINK_CACHE_FILE = ".\\output\\link_cache.json"
+LINK_FIELDS = ('site', 'photo', 'video')
+
+
+# url -> [(troupe name, field name)] for every link the troupe pages show
+def troupe_links(troupe_dict):
+    links = {}
+    for troupe_name, troupe_data in troupe_dict.iteritems():
+        for field_name in LINK_FIELDS:
+            if field_name not in troupe_data:
+                continue
+            urls = troupe_data[field_name]
+            if field_name != 'video':
+                urls = [urls]
+            for url in urls:
+                links.setdefault(url, []).append((troupe_name, field_name))
+    return links
+
+
+# each distinct link is checked once, and only if its cached result is
+# older than ttl seconds (see LinkChecker)
+def check_troupe_links(troupe_dict, jobs=None, timeout=None, ttl=None):
+    import LinkChecker
+    links = troupe_links(troupe_dict)
+    with TroupeProfile.stage("links") as timer:
+        report = LinkChecker.check_links(
+            links, LINK_CACHE_FILE, jobs or LinkChecker.DEFAULT_JOBS,
+            timeout or LinkChecker.DEFAULT_TIMEOUT,
+            LinkChecker.DEFAULT_TTL if ttl is None else ttl)
+        timer.count(links=len(links), checked=len(report['checked']),
+                    dead=len(report['dead']))
+    return links, report
+
+
+# troupe_dict without the links in dead_urls; records that lose nothing
+# are shared rather than copied
+def drop_dead_links(troupe_dict, dead_urls):
+    dead_urls = set(dead_urls)
+    live_dict = {}
+    for troupe_name, troupe_data in troupe_dict.iteritems():
+        dead_fields = [field_name for field_name in ('site', 'photo')
+                       if troupe_data.get(field_name) in dead_urls]
+        videos = troupe_data.get('video', frozenset())
+        if dead_fields or not videos.isdisjoint(dead_urls):
+            troupe_data = troupe_data.copy()
+            for field_name in dead_fields:
+                del troupe_data[field_name]
+            if videos - dead_urls:
+                troupe_data['video'] = videos - dead_urls
+            elif videos:
+                del troupe_data['video']
+        live_dict[troupe_name] = troupe_data
+    return live_dict
+
+
+def without_dead_links(troupe_dict):
+    import LinkChecker
+    _, report = check_troupe_links(troupe_dict)
+    LinkChecker.print_report(report)
+    return drop_dead_links(troupe_dict, [url for url, _ in report['dead']])
+
+
+def print_dead_links(source, state_file=None, jobs=None, timeout=None,
+                     ttl=None):
+    import LinkChecker
+    troupe_dict = process_troupe_data(source, state_file)
+    links, report = check_troupe_links(troupe_dict, jobs, timeout, ttl)
+    lines = sorted(u"%s: %s %s is dead (%s)" % (troupe_name, field_name,
+                                                url, error)
+                   for url, error in report['dead']
+                   for troupe_name, field_name in links[url])
+    for line in lines:
+        print(line.encode('utf8'))
+    LinkChecker.print_report(report)
+    return 1 if report['dead'] else 0
 
 
 def standardize_troupe_name(string):
     return "".join(x for x in string if x.isalnum()).lower()
 
 
+EXTANT_TROUPES_FILE = "extant_troupes.txt"
+
+
 def get_extant_troupes():
-    file_handle = open("extant_troupes.txt", "r")
+    file_handle = open(EXTANT_TROUPES_FILE, "r")
     extant_troupes = {standardize_troupe_name(troupe_name)
                       for troupe_name in file_handle}
     return extant_troupes
 
 
+def get_extant_troupe_names():
+    with open(EXTANT_TROUPES_FILE, "r") as file_handle:
+        return [troupe_name.strip() for troupe_name in file_handle
+                if troupe_name.strip()]
+
+
+def print_duplicate_names(filename):
+    import TroupeNames
+    if not isinstance(filename, (list, tuple)):
+        filename = [filename]
+    _, resolved = merge_troupe_names(load_troupe_files(filename))
+    for canonical, names in TroupeNames.duplicate_report(resolved):
+        print(canonical.encode('utf8'))
+        for name in names:
+            print(("    " + repr(name)).encode('utf8'))
+
+
 def is_extant_troupe(troupe_name, extant_troupes):
     return standardize_troupe_name(troupe_name) in extant_troupes
 
@@ -291,29 +652,721 @@ def never_performed(troupe_page):
     return troupe_page.find("[[Category:Never Performed]]") >= 0
 
 
-def output_troupe_pages(filename):
-    init_output_directories()
-    pages_dict = create_troupe_pages(filename)
-    extant_troupes = get_extant_troupes()
-    for troupe_name, troupe_page in pages_dict.iteritems():
-        from unidecode import unidecode
+def troupe_page_subdir(troupe_name, troupe_page, extant_troupes):
+    if is_extant_troupe(troupe_name, extant_troupes):
+        return "pages\\extant"
+    elif never_performed(troupe_page):
+        return "pages\\never"
+    else:
+        return "pages"
+
 
-        if is_extant_troupe(troupe_name, extant_troupes):
-            subdir = "pages\\extant"
-        elif never_performed(troupe_page):
-            subdir = "pages\\never"
+# modules the per-page functions need, imported with the first page
+# rather than at startup or again for every page
+page_modules = {}
+
+
+def page_module(name):
+    try:
+        return page_modules[name]
+    except KeyError:
+        page_modules[name] = __import__(name)
+        return page_modules[name]
+
+
+# renders one troupe to its output subdirectory and transliterated text
+def render_troupe_text(troupe_name, troupe_data, templates, extant_troupes,
+                       related=None):
+    render = TroupeProfile.timed("render", create_troupe_page)
+    transliterate = TroupeProfile.timed("transliterate",
+                                        page_module("unidecode").unidecode)
+    troupe_page = render(troupe_name, troupe_data, templates, related)
+    subdir = troupe_page_subdir(troupe_name, troupe_page, extant_troupes)
+    return subdir, transliterate(troupe_page)
+
+
+# renders one troupe to its output file name and transliterated text
+def render_troupe_file(troupe_name, troupe_data, templates, extant_troupes,
+                       related=None):
+    subdir, text = render_troupe_text(troupe_name, troupe_data, templates,
+                                      extant_troupes, related)
+    return troupe_name_to_file_name(troupe_name, subdir, ".wiki"), text
+
+
+# save troupe page to file name, unless it already holds that text
+# (see PageWriter); returns the page's status and hash
+def write_troupe_file(file_name, text, previous_hash=None):
+    with TroupeProfile.stage("write") as timer:
+        status, digest = page_module("PageWriter").write_page(
+            file_name, text, previous_hash)
+        if status != 'unchanged':
+            timer.count(bytes=len(text))
+        timer.count(**{status: 1})
+    return status, digest
+
+
+# templates, extant troupes, the page manifest's hashes and related troupes
+# for the page workers, set once per process
+page_worker_context = {}
+
+
+def init_page_worker(templates, extant_troupes, page_hashes=None,
+                     related=None):
+    page_worker_context['templates'] = templates
+    page_worker_context['extant_troupes'] = extant_troupes
+    page_worker_context['page_hashes'] = page_hashes or {}
+    page_worker_context['related'] = related or {}
+
+
+def init_page_pool(templates, extant_troupes, page_hashes, related,
+                   profiling):
+    TroupeProfile.init_worker(profiling)
+    init_page_worker(templates, extant_troupes, page_hashes, related)
+
+
+def render_troupe_item(item):
+    troupe_name, troupe_data = item
+    return render_troupe_file(troupe_name, troupe_data,
+                              page_worker_context['templates'],
+                              page_worker_context['extant_troupes'],
+                              page_worker_context['related'].get(troupe_name))
+
+
+def dump_troupe_item(item):
+    troupe_name, troupe_data = item
+    subdir, text = render_troupe_text(
+        troupe_name, troupe_data, page_worker_context['templates'],
+        page_worker_context['extant_troupes'],
+        page_worker_context['related'].get(troupe_name))
+    return subdir, troupe_name, text
+
+
+def output_troupe_item(item):
+    file_name, text = render_troupe_item(item)
+    status, digest = write_troupe_file(
+        file_name, text, page_worker_context['page_hashes'].get(file_name))
+    return file_name, status, digest
+
+
+# troupes handed to the page pool at a time when they're streamed in, as
+# the pool would otherwise read ahead through the whole stream
+STREAM_BATCH = 1000
+
+
+# yields worker's result for every (troupe_name, troupe_data) pair as it
+# comes, either working here or spread across a pool of jobs processes in
+# chunks.  troupe_dict may also be an iterator of those pairs (see
+# page_troupes).
+def iter_troupe_pages(worker, troupe_dict, templates, extant_troupes,
+                      jobs=1, page_hashes=None, related=None):
+    if isinstance(troupe_dict, dict):
+        items = troupe_dict.items()
+        batches = [items]
+        chunk_size = max(1, min(len(items) // (jobs * 4), 1000))
+    else:
+        import itertools
+        items = iter(troupe_dict)
+        batches = iter(lambda: list(itertools.islice(items, STREAM_BATCH)),
+                       [])
+        chunk_size = max(1, STREAM_BATCH // (jobs * 4))
+    if jobs <= 1:
+        init_page_worker(templates, extant_troupes, page_hashes, related)
+        for item in items:
+            yield worker(item)
+        return
+
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs, init_page_pool,
+                                (templates, extant_troupes, page_hashes,
+                                 related, TroupeProfile.enabled))
+    try:
+        for batch in batches:
+            for result in TroupeProfile.profiled_imap(pool, worker, batch,
+                                                      chunk_size):
+                yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def map_troupe_pages(worker, troupe_dict, templates, extant_troupes, jobs=1,
+                     page_hashes=None, related=None):
+    return list(iter_troupe_pages(worker, troupe_dict, templates,
+                                  extant_troupes, jobs, page_hashes, related))
+
+
+RELATED_TROUPES = 5
+
+
+RELATED_WARNING = ("warning: troupes collated one at a time can't be "
+                   "related, so their pages go without related troupes\n")
+
+
+# troupe name -> the (other troupe, performers shared) pairs for its
+# related troupes section, or None when the templates have no such
+# section.  Streamed troupes go without too, with a warning, as relating
+# troupes takes every troupe's cast at once (see TroupeRelations).
+def troupe_relations(troupe_dict, templates, limit=RELATED_TROUPES):
+    if 'related' not in templates:
+        return None
+    if not isinstance(troupe_dict, dict):
+        import sys
+        sys.stderr.write(RELATED_WARNING)
+        return None
+    import TroupeRelations
+    with TroupeProfile.stage("relate") as timer:
+        related = TroupeRelations.related_troupes(troupe_dict, limit)
+        timer.count(troupes=len(related))
+    return related
+
+
+# the troupes the page stages render: the collated troupe dict, less its
+# dead links with drop_dead, or with buffer_rows, (troupe_name,
+# troupe_data) pairs collated one at a time in bounded memory (see
+# TroupeSort), which rules out everything needing all the troupes at once.
+# A troupe store is already collated, so it's loaded rather than sorted.
+def page_troupes(source, state_file=None, engine="rows", merge_names=False,
+                 jobs=1, drop_dead=False, buffer_rows=None):
+    if buffer_rows and not isinstance(source, dict) and \
+            not source_store(source):
+        if state_file or merge_names or drop_dead:
+            raise ValueError("bounded-memory collation can't be used with a "
+                             "state file, name merging or dropping dead "
+                             "links")
+        import TroupeSort
+        filenames = source_file_names(source)
+        table = source if filenames is None else load_troupe_files(filenames)
+        return TroupeSort.iter_troupes(table, buffer_rows)
+    troupe_dict = process_troupe_data(source, state_file, engine,
+                                      merge_names=merge_names, jobs=jobs)
+    if drop_dead:
+        troupe_dict = without_dead_links(troupe_dict)
+    return troupe_dict
+
+
+# pages are only rewritten when their text changes, and only pages of
+# troupes that are gone are removed (see PageWriter)
+def output_troupe_pages(source, state_file=None, jobs=1, engine="rows",
+                        merge_names=False, drop_dead=False,
+                        buffer_rows=None):
+    import PageWriter
+    troupe_dict = page_troupes(source, state_file, engine, merge_names, jobs,
+                               drop_dead, buffer_rows)
+    templates = load_template_files()
+    extant_troupes = get_extant_troupes()
+    manifest = PageWriter.load_manifest()
+    results = map_troupe_pages(output_troupe_item, troupe_dict, templates,
+                               extant_troupes, jobs, manifest,
+                               troupe_relations(troupe_dict, templates))
+    report = PageWriter.update_manifest(manifest, results)
+    PageWriter.save_manifest(manifest)
+    PageWriter.print_report(report)
+    return report
+
+
+WIKI_PASSWORD_VARIABLE = "TROUPE_WIKI_PASSWORD"
+
+
+# pages are rendered as for a dump and edited into the wiki a batch at a
+# time, skipping the ones it already has (see WikiPublisher).  Extant
+# troupes already have pages kept up by hand, so they're left out unless
+# include_extant is set.
+def publish_troupe_pages(source, api_url, user=None, password=None,
+                         state_file=None, jobs=None, engine="rows",
+                         merge_names=False, drop_dead=False, buffer_rows=None,
+                         include_extant=False, batch_size=None,
+                         summary=None):
+    import WikiPublisher
+    troupe_dict = page_troupes(source, state_file, engine, merge_names,
+                               drop_dead=drop_dead, buffer_rows=buffer_rows)
+    templates = load_template_files()
+    pages = ((title.strip(), text) for subdir, title, text in
+             iter_troupe_pages(dump_troupe_item, troupe_dict, templates,
+                               get_extant_troupes(),
+                               related=troupe_relations(troupe_dict,
+                                                        templates))
+             if include_extant or subdir != "pages\\extant")
+    with TroupeProfile.stage("publish") as timer:
+        report = WikiPublisher.publish_pages(
+            pages, api_url, user, password,
+            jobs or WikiPublisher.DEFAULT_JOBS,
+            batch_size or WikiPublisher.DEFAULT_BATCH,
+            summary or WikiPublisher.SUMMARY)
+        timer.count(**dict((status, len(titles))
+                           for status, titles in report.items()))
+    WikiPublisher.print_report(report)
+    return report
+
+
+# output subdirectory -> dump file name, without extension
+DUMP_NAMES = {"pages": "troupes", "pages\\extant": "troupes_extant",
+              "pages\\never": "troupes_never"}
+
+
+def troupe_dump_files(compress=False):
+    extension = ".xml.gz" if compress else ".xml"
+    return dict((subdir, ".\\output\\" + name + extension)
+                for subdir, name in DUMP_NAMES.items())
+
+
+# every page goes into one Special:Import XML dump per output subdirectory
+# instead of a .wiki file each, streamed as it's rendered (see WikiDump)
+def output_troupe_dumps(source, state_file=None, jobs=1, engine="rows",
+                        merge_names=False, compress=False, drop_dead=False,
+                        buffer_rows=None):
+    import WikiDump
+    troupe_dict = page_troupes(source, state_file, engine, merge_names, jobs,
+                               drop_dead, buffer_rows)
+    templates = load_template_files()
+    extant_troupes = get_extant_troupes()
+    pages = iter_troupe_pages(dump_troupe_item, troupe_dict, templates,
+                              extant_troupes, jobs,
+                              related=troupe_relations(troupe_dict,
+                                                       templates))
+    counts = WikiDump.write_dumps(pages, troupe_dump_files(compress),
+                                  compress)
+    for file_name, pages_written in sorted(counts.items()):
+        print("%s: %d pages" % (file_name, pages_written))
+    return counts
+
+
+# cells in each spreadsheet column that collation ignores unless they
+# hold a link
+LINK_COLUMNS = ((2, 'site'), (19, 'photo'), (20, 'video'))
+
+
+# cells of one row that collation would ignore or choke on
+def row_problems(row):
+    problems = []
+    year = row[22].strip()
+    if year and not year.isdigit():
+        problems.append("year %r isn't a number" % row[22])
+    for index, field_name in LINK_COLUMNS:
+        if row[index] and not is_url(row[index]):
+            problems.append("%s %r isn't a link, so it's ignored" %
+                            (field_name, row[index]))
+    return problems
+
+
+# (troupe name, problem) for every named row; a state file still current
+# for the one input file supplies its saved rows without a reread
+def check_troupe_rows(filenames, state_file=None):
+    troupe_rows = None
+    if state_file and len(filenames) == 1:
+        import TroupeState
+        troupe_rows = TroupeState.cached_rows(filenames[0], state_file)
+    if troupe_rows is None:
+        rows = (row for row in load_troupe_files(filenames) if row[1])
+    else:
+        rows = (row for troupe_name in sorted(troupe_rows)
+                for _, row in troupe_rows[troupe_name])
+    return [(row[1], problem) for row in rows
+            for problem in row_problems(row)]
+
+
+def troupe_stats(troupe_dict):
+    """[(description, count)] summarizing the collated troupes."""
+    cast_index = CastIndex.CastIndex()
+    cast_index.add_troupes(troupe_dict)
+    troupes = troupe_dict.values()
+
+    def having(field_name):
+        return sum(1 for troupe_data in troupes
+                   if troupe_data.get(field_name))
+
+    return [("troupes", len(troupe_dict)),
+            ("performers", len(cast_index)),
+            ("duos", sum(1 for troupe_data in troupes
+                         if len(troupe_data.get('cast', ())) == 2)),
+            ("with a site", having('site')),
+            ("with a photo", having('photo')),
+            ("with video", having('video')),
+            ("with a blurb", having('blurb')),
+            ("with a deal", having('deal')),
+            ("performed before", sum(1 for troupe_data in troupes if
+                                     troupe_data.get('performed_before') ==
+                                     'y'))]
+
+
+def print_troupe_stats(source, state_file=None, engine="rows",
+                       merge_names=False, jobs=1):
+    troupe_dict = process_troupe_data(source, state_file, engine,
+                                      merge_names=merge_names, jobs=jobs)
+    for description, count in troupe_stats(troupe_dict):
+        print("%-18s %d" % (description, count))
+
+
+TROUPE_STORE_FILE = ".\\output\\troupes.db"
+
+
+# collated troupes go into a SQLite store for indexed queries, which later
+# runs can read in place of the spreadsheets (see TroupeStore)
+def save_troupe_store(source, store_file=TROUPE_STORE_FILE, state_file=None,
+                      engine="rows", merge_names=False, jobs=1):
+    import TroupeStore
+    troupe_dict = process_troupe_data(source, state_file, engine,
+                                      merge_names=merge_names, jobs=jobs)
+    with TroupeProfile.stage("store") as timer:
+        with TroupeStore.TroupeStore(store_file) as store:
+            store.save_troupes(troupe_dict, get_extant_troupes())
+            performers = len(store.performers())
+        timer.count(troupes=len(troupe_dict))
+    print("%s: %d troupes, %d performers" % (store_file, len(troupe_dict),
+                                             performers))
+
+
+def print_store_query(store_file=TROUPE_STORE_FILE, active_in=None,
+                      performer=None, classification=None):
+    import TroupeStore
+    if not TroupeStore.is_store(store_file):
+        raise ValueError("%s isn't a troupe store" % store_file)
+    if isinstance(performer, bytes):
+        performer = performer.decode('utf8')
+    with TroupeStore.TroupeStore(store_file) as store:
+        troupe_names = store.troupe_names(active_in, performer,
+                                          classification)
+    for troupe_name in troupe_names:
+        print(troupe_name.encode('utf8'))
+
+
+def print_troupe_problems(filenames, state_file=None):
+    problems = check_troupe_rows(filenames, state_file)
+    for troupe_name, problem in problems:
+        print((u"%s: %s" % (troupe_name, problem)).encode('utf8'))
+    print("%d problems found" % len(problems))
+    return 1 if problems else 0
+
+
+SUBCOMMANDS = ("pages", "pics", "stats", "check", "check-links", "store",
+               "query", "publish", "preview")
+
+
+def add_profile_argument(parser):
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write a JSON report of per-stage timings, "
+                        "counts and peak memory to FILE")
+
+
+def add_input_arguments(parser, nargs="+"):
+    parser.add_argument("filename", nargs=nargs,
+                        help="applications spreadsheets, or directories of "
+                        "them, collated as one in the order given")
+    parser.add_argument("--state", help="file for remembering collated "
+                        "troupes between runs, so reruns only redo "
+                        "troupes whose rows changed")
+    add_profile_argument(parser)
+
+
+def add_collation_arguments(parser):
+    parser.add_argument("--jobs", type=int, metavar="N",
+                        help="collate input files and render and write "
+                        "pages across N processes")
+    parser.add_argument("--engine", choices=COLLATION_ENGINES,
+                        default="rows", help="how rows are collated into "
+                        "troupes (columns needs NumPy)")
+    parser.add_argument("--merge-names", action="store_true",
+                        help="collate near-duplicate troupe names (and "
+                        "near matches of extant troupes) as one troupe")
+
+
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(description="Turn troupe applications "
+                                     "into AIC Wiki pages.  Without a "
+                                     "subcommand, pages is assumed.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    pages = subparsers.add_parser("pages", help="write a wiki page for "
+                                  "every troupe", description="Write a .wiki "
+                                  "file per troupe, or with --dump MediaWiki "
+                                  "import dumps (troupes.xml, "
+                                  "troupes_extant.xml and "
+                                  "troupes_never.xml).  Each page links the "
+                                  "troupes that share the most performers "
+                                  "with it.  With --buffer-rows, troupes are "
+                                  "collated through an external sort holding "
+                                  "N rows at a time, each page written as "
+                                  "soon as its troupe's rows are in, so "
+                                  "memory use doesn't grow with the input, "
+                                  "but as relating troupes takes every cast "
+                                  "at once, those pages go without related "
+                                  "troupes (with a warning).  A troupe "
+                                  "store can be given in place of the "
+                                  "spreadsheets, but not with --watch or "
+                                  "--list-duplicates.")
+    add_input_arguments(pages)
+    add_collation_arguments(pages)
+    pages.add_argument("--list-duplicates", action="store_true",
+                       help="just list the names --merge-names would merge")
+    pages.add_argument("--dump", action="store_true",
+                       help="write MediaWiki import dumps instead of .wiki "
+                       "files")
+    pages.add_argument("--gzip", action="store_true",
+                       help="gzip-compress the --dump files")
+    pages.add_argument("--drop-dead-links", action="store_true",
+                       help="check links first, as check-links does, and "
+                       "leave dead ones off the pages")
+    pages.add_argument("--pics", action="store_true",
+                       help="download troupe photos too, as pics does, "
+                       "without collating again")
+    pages.add_argument("--buffer-rows", type=int, metavar="N",
+                       help="collate through an external sort holding N "
+                       "rows in memory at a time, writing each page as "
+                       "soon as its troupe is collated")
+    pages.add_argument("--watch", action="store_true",
+                       help="keep running, and regenerate the pages a "
+                       "change to the input, templates or extant troupes "
+                       "list affects")
+    pages.add_argument("--interval", type=float, metavar="SECONDS",
+                       help="how often --watch looks for changes")
+
+    pics = subparsers.add_parser("pics", help="download troupe photos",
+                                 description="Download troupe photos, from "
+                                 "TroupeData.ods unless told otherwise, or "
+                                 "from a troupe store.")
+    add_input_arguments(pics, "*")
+    pics.add_argument("--jobs", type=int, metavar="N",
+                      help="download N photos at a time")
+    pics.add_argument("--timeout", type=float, metavar="SECONDS",
+                      help="network timeout for photo downloads")
+
+    stats = subparsers.add_parser("stats", help="count what the collated "
+                                  "troupes have", description="Count the "
+                                  "troupes, performers and duos, and the "
+                                  "troupes with a site, photo, video, blurb "
+                                  "or deal or that have performed before, "
+                                  "from the spreadsheets or a troupe store.")
+    add_input_arguments(stats)
+    add_collation_arguments(stats)
+
+    check = subparsers.add_parser("check", help="list cells collation "
+                                  "would ignore or choke on",
+                                  description="List the cells collation "
+                                  "would ignore or choke on, exiting with "
+                                  "status 1 if there are any.")
+    add_input_arguments(check)
+
+    links = subparsers.add_parser("check-links", help="list dead site, "
+                                  "photo and video links",
+                                  description="List the troupes' dead site, "
+                                  "photo and video links, from the "
+                                  "spreadsheets or a troupe store, "
+                                  "rechecking only links checked more than "
+                                  "--ttl hours ago, and exit with status 1 "
+                                  "if there are any.")
+    add_input_arguments(links)
+    links.add_argument("--jobs", type=int, metavar="N",
+                       help="check N links at a time")
+    links.add_argument("--timeout", type=float, metavar="SECONDS",
+                       help="network timeout for each request")
+    links.add_argument("--ttl", type=float, metavar="HOURS",
+                       help="recheck links whose cached result is older "
+                       "than this (a week unless told otherwise)")
+
+    store = subparsers.add_parser("store", help="save the collated troupes "
+                                  "in a SQLite database",
+                                  description="Save the collated troupes in "
+                                  "a SQLite database, which query searches "
+                                  "and which pics, stats, check-links, "
+                                  "store, publish and pages take in place "
+                                  "of the spreadsheets.")
+    add_input_arguments(store)
+    add_collation_arguments(store)
+    store.add_argument("--db", default=TROUPE_STORE_FILE, metavar="FILE",
+                       help="troupe store to write")
+
+    query = subparsers.add_parser("query", help="list the troupes in a "
+                                  "store that match every filter given",
+                                  description="List the troupes in a "
+                                  "troupe store that match every filter "
+                                  "given, by year, performer and "
+                                  "classification.")
+    query.add_argument("--db", default=TROUPE_STORE_FILE, metavar="FILE",
+                       help="troupe store to search")
+    query.add_argument("--active-in", type=int, metavar="YEAR",
+                       help="troupes active in YEAR")
+    query.add_argument("--performer", metavar="NAME",
+                       help="troupes NAME has been in")
+    query.add_argument("--class", dest="classification",
+                       choices=("extant", "never", "performed"),
+                       help="troupes whose pages go to extant, never or "
+                       "neither")
+    add_profile_argument(query)
+
+    publish = subparsers.add_parser("publish", help="edit the pages into a "
+                                    "wiki through its API",
+                                    description="Edit the pages straight "
+                                    "into a wiki through its api.php, "
+                                    "leaving alone pages that are already "
+                                    "up to date and, unless "
+                                    "--include-extant is given, the "
+                                    "hand-kept pages of extant troupes.  "
+                                    "The input can be a troupe store.")
+    add_input_arguments(publish)
+    publish.add_argument("--api", required=True, metavar="URL",
+                         help="the wiki's api.php")
+    publish.add_argument("--user", help="account to log in as, with its "
+                         "password in $" + WIKI_PASSWORD_VARIABLE)
+    publish.add_argument("--jobs", type=int, metavar="N",
+                         help="make N edits at a time")
+    publish.add_argument("--batch", type=int, metavar="N",
+                         help="pages whose current revisions are looked up "
+                         "in one query")
+    publish.add_argument("--include-extant", action="store_true",
+                         help="publish extant troupes' pages too")
+    publish.add_argument("--summary", help="edit summary")
+    publish.add_argument("--engine", choices=COLLATION_ENGINES,
+                         default="rows", help="how rows are collated into "
+                         "troupes (columns needs NumPy)")
+    publish.add_argument("--merge-names", action="store_true",
+                         help="collate near-duplicate troupe names as one "
+                         "troupe")
+    publish.add_argument("--drop-dead-links", action="store_true",
+                         help="leave dead links off the pages")
+    publish.add_argument("--buffer-rows", type=int, metavar="N",
+                         help="collate through an external sort holding N "
+                         "rows in memory at a time")
+
+    preview = subparsers.add_parser("preview", help="serve the pages on "
+                                    "localhost, rendering each on demand",
+                                    description="Serve the pages of the "
+                                    "spreadsheets (not a troupe store) on "
+                                    "localhost, rendering each one when "
+                                    "it's opened and again only once its "
+                                    "rows or the templates change, with a "
+                                    "search by name.")
+    preview.add_argument("filename", nargs="+",
+                         help="applications spreadsheets, or directories of "
+                         "them, collated as one")
+    preview.add_argument("--port", type=int, metavar="N",
+                         help="port to serve on (8000 unless told otherwise)")
+    preview.add_argument("--merge-names", action="store_true",
+                         help="collate near-duplicate troupe names as one "
+                         "troupe")
+    add_profile_argument(preview)
+    return parser
+
+
+def parse_arguments(argv):
+    argv = list(argv)
+    # the command line from before subcommands still means "pages"
+    if argv and argv[0] not in SUBCOMMANDS and \
+            argv[0] not in ("-h", "--help"):
+        argv.insert(0, "pages")
+    return build_parser().parse_args(argv)
+
+
+def run_command(args):
+    if args.command == "query":
+        print_store_query(args.db, args.active_in, args.performer,
+                          args.classification)
+        return 0
+    if args.command == "pics":
+        download_troupe_pics(input_file_names(args.filename) or
+                             "TroupeData.ods", args.state, args.jobs,
+                             args.timeout)
+        return 0
+
+    filenames = input_file_names(args.filename)
+    if args.command == "check":
+        return print_troupe_problems(filenames, args.state)
+    if args.command == "check-links":
+        return print_dead_links(filenames, args.state, args.jobs,
+                                args.timeout, None if args.ttl is None
+                                else args.ttl * 60 * 60)
+    if args.command == "stats":
+        print_troupe_stats(filenames, args.state, args.engine,
+                           args.merge_names, args.jobs or 1)
+    elif args.command == "store":
+        save_troupe_store(filenames, args.db, args.state, args.engine,
+                          args.merge_names, args.jobs or 1)
+    elif args.command == "publish":
+        import os
+        report = publish_troupe_pages(
+            filenames, args.api, args.user,
+            os.environ.get(WIKI_PASSWORD_VARIABLE), args.state, args.jobs,
+            args.engine, args.merge_names, args.drop_dead_links,
+            args.buffer_rows, args.include_extant, args.batch, args.summary)
+        return 1 if report['failed'] else 0
+    elif args.command == "preview":
+        import PreviewServer
+        PreviewServer.serve(filenames, args.merge_names,
+                            args.port or PreviewServer.DEFAULT_PORT)
+    elif args.list_duplicates:
+        print_duplicate_names(filenames)
+    elif args.watch:
+        import TroupeWatcher
+        TroupeWatcher.watch(filenames, args.merge_names, args.jobs or 1,
+                            args.interval or TroupeWatcher.DEFAULT_INTERVAL)
+    else:
+        jobs = args.jobs or 1
+        # streamed troupes are collated by the page stage as it goes
+        source = filenames
+        if not args.buffer_rows:
+            source = process_troupe_data(filenames, args.state, args.engine,
+                                         merge_names=args.merge_names,
+                                         jobs=jobs)
+        if args.dump:
+            output_troupe_dumps(source, jobs=jobs, compress=args.gzip,
+                                drop_dead=args.drop_dead_links,
+                                buffer_rows=args.buffer_rows)
         else:
-            subdir = "pages"
+            output_troupe_pages(source, jobs=jobs,
+                                drop_dead=args.drop_dead_links,
+                                buffer_rows=args.buffer_rows)
+        if args.pics:
+            download_troupe_pics(source)
+    return 0
+
+
+# the option or subcommand in args that reads spreadsheet rows itself, so
+# a troupe store can't stand in for them, or None
+def row_reader(args):
+    if args.command in ("check", "preview"):
+        return args.command
+    if args.command == "pages" and args.watch:
+        return "--watch"
+    if args.command == "pages" and args.list_duplicates:
+        return "--list-duplicates"
+    return None
+
+
+def main(argv=None):
+    import sys
+    args = parse_arguments(sys.argv[1:] if argv is None else argv)
+    if row_reader(args):
+        import TroupeStore
+        for filename in args.filename:
+            if TroupeStore.is_store(filename):
+                build_parser().error("%s is a troupe store, and %s needs "
+                                     "the spreadsheets" %
+                                     (filename, row_reader(args)))
+    if args.command == "pages" and args.watch and \
+            (args.state or args.dump or args.drop_dead_links or args.pics):
+        build_parser().error("--watch keeps its own state and only writes "
+                             "pages")
+    if args.command == "pages" and args.buffer_rows and \
+            (args.state or args.merge_names or args.drop_dead_links or
+             args.pics):
+        build_parser().error("--buffer-rows can't be used with --state, "
+                             "--merge-names, --drop-dead-links or --pics")
+    if args.command == "publish":
+        import os
+        if args.user and WIKI_PASSWORD_VARIABLE not in os.environ:
+            build_parser().error("--user needs the password in $" +
+                                 WIKI_PASSWORD_VARIABLE)
+        if args.buffer_rows and \
+                (args.state or args.merge_names or args.drop_dead_links):
+            build_parser().error("--buffer-rows can't be used with --state, "
+                                 "--merge-names or --drop-dead-links")
+    if args.profile:
+        TroupeProfile.enable()
+    status = run_command(args)
+    if args.profile:
+        TroupeProfile.write_report(args.profile)
+    return status
 
-        file_name = troupe_name_to_file_name(troupe_name, subdir,
-                                             ".wiki")
-        # save troupe page to file name
-        with open(file_name, "w") as text_file:
-            text_file.write(unidecode(troupe_page))
 
 if __name__ == '__main__':
     import sys
-    if sys.argv[1:]:
-        output_troupe_pages(sys.argv[1])
-    else:
-        download_troupe_pics("TroupeData.ods")
+    sys.exit(main())
@@ -1,12 +1,29 @@
+import GenerateTroupeData
 import ProcessTroupeData
+import TroupeRecord
+import TroupeTemplates
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
 
 
 class ValidateDatabaseProcessor(unittest.TestCase):
 
+    # each fixture is parsed once; later checks pass its collated troupes,
+    # which process_troupe_data hands straight back
+    collated = {}
+
     def validate_troupe_data(self, file_name, troupe_name, troupe_data,
                              num_troupes=None):
-        dict = ProcessTroupeData.process_troupe_data(file_name)
+        if file_name not in self.collated:
+            self.collated[file_name] = \
+                ProcessTroupeData.process_troupe_data(file_name)
+        dict = ProcessTroupeData.process_troupe_data(
+            self.collated[file_name])
 
         self.assertTrue(troupe_name in dict)
         dict_data = dict[troupe_name]
@@ -117,6 +134,45 @@ class ValidateDatabaseProcessor(unittest.TestCase):
                                   test_deal)
 
 
+class ValidateInMemoryRows(unittest.TestCase):
+
+    def test_rows_match_file(self):
+        """Rows already read should collate just as their file does."""
+
+        rows = list(ProcessTroupeData.load_troupe_info("test/Casts.ods"))
+        expected = ProcessTroupeData.process_troupe_data("test/Casts.ods")
+        self.assertEqual(ProcessTroupeData.process_troupe_data(rows),
+                         expected)
+        self.assertEqual(ProcessTroupeData.process_troupe_data(iter(rows)),
+                         expected)
+        self.assertTrue(ProcessTroupeData.process_troupe_data(expected)
+                        is expected)
+
+    def test_troupe_table(self):
+        """Applications built in memory should collate like real ones."""
+
+        table = ProcessTroupeData.troupe_table([
+            {'name': "The Bills", 'cast': "Ann, Bob", 'year': "2010",
+             'video': "www.v1"},
+            {'name': "The Bills", 'year': "2012", 'video': "www.v2",
+             'performed_before': "Yes"}])
+        troupe_data = ProcessTroupeData.process_troupe_data(table)["The Bills"]
+        self.assertEqual(troupe_data['cast'], {"Ann", "Bob"})
+        self.assertEqual(troupe_data['video'], {"www.v1", "www.v2"})
+        self.assertEqual((troupe_data['start_year'], troupe_data['end_year'],
+                          troupe_data['performed_before']),
+                         ("2010", "2012", "y"))
+        self.assertRaises(TypeError, ProcessTroupeData.troupe_row, "x",
+                          email="x@example.com")
+
+    def test_state_needs_a_file(self):
+        """A state file can't follow rows."""
+
+        with self.assertRaises(ValueError):
+            ProcessTroupeData.process_troupe_data(
+                [ProcessTroupeData.troupe_row("x")], "state.pickle")
+
+
 class ValidatePageGenerator(unittest.TestCase):
 
     def validate_page_inclusions(self, troupe_data, yes_strings={},
@@ -210,6 +266,31 @@ class ValidatePageGenerator(unittest.TestCase):
                        "Video #2"}
         self.validate_page_inclusions(troupe_info, yes_strings)
 
+    def test_video_order(self):
+        """Videos should always be listed in the same order."""
+
+        first = ProcessTroupeData.create_test_page(
+            "troupe", {"video": {"video2", "video1", "video3"}})
+        second = ProcessTroupeData.create_test_page(
+            "troupe", {"video": {"video3", "video1", "video2"}})
+        self.assertEqual(first, second)
+        self.assertTrue(first.find("video1 Video #1") <
+                        first.find("video2 Video #2") <
+                        first.find("video3 Video #3"))
+
+    def test_related_troupes(self):
+        """Related troupes should be listed with the performers shared."""
+
+        templates = ProcessTroupeData.load_template_files()
+        page = ProcessTroupeData.create_troupe_page(
+            "troupe", {}, templates, [(u"The Bills", 2), (u"Teacups", 1)])
+        self.assertTrue(u"== Related Troupes ==" in page)
+        self.assertTrue(u"* [[The Bills]] (2 shared performers)\n"
+                        u"* [[Teacups]] (1 shared performer)" in page)
+        self.assertTrue(u"== Related Troupes ==" not in
+                        ProcessTroupeData.create_troupe_page("troupe", {},
+                                                             templates))
+
     def test_site(self):
         """We should show the troupe's web site, if available."""
 
@@ -249,5 +330,208 @@ class ValidatePageGenerator(unittest.TestCase):
         self.validate_page_inclusions(troupe_info, yes_strings, no_strings)
 
 
+class ValidateParallelPages(unittest.TestCase):
+
+    templates = TroupeTemplates.compile_templates({
+        'blurb': u"{blurb}", 'deal': u"{deal}",
+        'summary': u"{blurb_section}{deal_section}",
+        'more_info': u"{site}", 'media': u"{video_list}",
+        'troupe': u"{name} {years} {cast_list}{summary_section}"
+                  u"{media_section}{other_categories}"})
+
+    def render_pages(self, jobs):
+        troupe_dict = ProcessTroupeData.process_troupe_data(
+            "test/PerformedBefore.ods")
+        return ProcessTroupeData.map_troupe_pages(
+            ProcessTroupeData.render_troupe_item, troupe_dict,
+            self.templates, {"notroupe"}, jobs)
+
+    def test_parallel_matches_serial(self):
+        """Rendering across processes should give the same files."""
+
+        serial = self.render_pages(1)
+        self.assertEqual(sorted(serial), sorted(self.render_pages(3)))
+        self.assertTrue(any("extant" in file_name and "notroupe" in file_name
+                            for file_name, _ in serial))
+
+
+class ValidateMultipleFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        rows = self.rows = list(
+            GenerateTroupeData.generate_rows(400, 0.1, seed=3))
+        self.whole = os.path.join(self.temp_dir, "whole.ods")
+        GenerateTroupeData.write_ods(self.whole, rows, 10)
+        self.parts = []
+        for index, part in enumerate((rows[1:150], rows[150:151],
+                                      rows[151:])):
+            file_name = os.path.join(self.temp_dir, "part%d.ods" % index)
+            GenerateTroupeData.write_ods(file_name, [rows[0]] + part, 10)
+            self.parts.append(file_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_parallel_matches_concatenation(self):
+        """Files collated apart and merged should match one big file."""
+
+        whole = ProcessTroupeData.process_troupe_data(self.whole)
+        self.assertEqual(ProcessTroupeData.process_troupe_data(self.parts),
+                         whole)
+        self.assertEqual(ProcessTroupeData.process_troupe_data(
+            self.parts, jobs=3), whole)
+        self.assertEqual(ProcessTroupeData.merge_troupe_dicts(
+            ProcessTroupeData.process_troupe_data(part)
+            for part in self.parts), whole)
+
+    def test_generated_rows(self):
+        """Generated rows should collate without being written out."""
+
+        self.assertEqual(ProcessTroupeData.process_troupe_data(self.rows[1:]),
+                         ProcessTroupeData.process_troupe_data(self.whole))
+
+    def test_fixture_files(self):
+        """Merging should hold for the hand-made fixtures too."""
+
+        fixtures = ["test/TwoRows.ods", "test/StartEndYears.ods",
+                    "test/BlurbDealYears.ods", "test/LongerStrings.ods",
+                    "test/VideoSet.ods", "test/PerformedBefore.ods"]
+        self.assertEqual(
+            ProcessTroupeData.process_troupe_data(fixtures, jobs=2),
+            ProcessTroupeData.process_troupe_data(fixtures))
+
+    def test_input_directory(self):
+        """A directory should stand for its .ods files, in name order."""
+
+        self.assertEqual(
+            ProcessTroupeData.input_file_names([self.temp_dir]),
+            sorted(self.parts + [self.whole]))
+
+    def test_state_needs_one_file(self):
+        """A state file can't follow several input files."""
+
+        with self.assertRaises(ValueError):
+            ProcessTroupeData.process_troupe_data(self.parts, "state.pickle")
+
+
+class ValidateDeadLinks(unittest.TestCase):
+
+    def test_drop_dead_links(self):
+        """Dead links should come off copies of just the troupes using them."""
+
+        troupe_dict = {
+            "a": TroupeRecord.TroupeRecord({'site': "www.a.com",
+                                            'video': frozenset(["v1", "v2"])}),
+            "b": TroupeRecord.TroupeRecord({'photo': "www.b.com/b.jpg",
+                                            'video': frozenset(["v2"])}),
+            "c": TroupeRecord.TroupeRecord({'site': "www.c.com"})}
+        links = ProcessTroupeData.troupe_links(troupe_dict)
+        self.assertEqual(len(links), 5)
+        self.assertEqual(sorted(links["v2"]), [("a", "video"), ("b", "video")])
+
+        live = ProcessTroupeData.drop_dead_links(
+            troupe_dict, ["www.a.com", "www.b.com/b.jpg", "v2"])
+        self.assertEqual(live["a"], {'video': frozenset(["v1"])})
+        self.assertEqual(live["b"], {})
+        self.assertTrue(live["c"] is troupe_dict["c"])
+        self.assertEqual(troupe_dict["a"]['site'], "www.a.com")
+
+
+class ValidateCommandLine(unittest.TestCase):
+
+    # seconds a quick subcommand may take, interpreter start included
+    STARTUP_BUDGET = 0.5
+    HEAVY_MODULES = ("unidecode", "numpy", "multiprocessing", "httplib",
+                     "PhotoDownloader", "LinkChecker", "WikiPublisher",
+                     "PreviewServer", "TroupeTemplates", "TroupeNames",
+                     "sqlite3")
+
+    def run_python(self, code):
+        return subprocess.check_output([sys.executable, "-c", code])
+
+    def test_subcommands(self):
+        """Subcommands should parse, and the old command line mean pages."""
+
+        args = ProcessTroupeData.parse_arguments(["check", "a.ods"])
+        self.assertEqual((args.command, args.filename), ("check", ["a.ods"]))
+        args = ProcessTroupeData.parse_arguments(["a.ods", "--jobs", "2"])
+        self.assertEqual((args.command, args.jobs), ("pages", 2))
+        args = ProcessTroupeData.parse_arguments(["check-links", "a.ods",
+                                                  "--ttl", "1.5"])
+        self.assertEqual((args.command, args.ttl), ("check-links", 1.5))
+        args = ProcessTroupeData.parse_arguments(["query", "--class", "never",
+                                                  "--active-in", "2013"])
+        self.assertEqual((args.classification, args.active_in),
+                         ("never", 2013))
+        with open(os.devnull, "w") as devnull:
+            stderr, sys.stderr = sys.stderr, devnull
+            try:
+                self.assertRaises(SystemExit,
+                                  ProcessTroupeData.parse_arguments, [])
+            finally:
+                sys.stderr = stderr
+
+    def test_check(self):
+        """check should list the link cells collation ignores."""
+
+        problems = ProcessTroupeData.check_troupe_rows(
+            ["test/IgnoreInvalidURLs.ods"])
+        self.assertEqual([field for _, field in problems if "site" in field],
+                         ["site u'site1' isn't a link, so it's ignored"])
+        self.assertEqual(ProcessTroupeData.check_troupe_rows(
+            ["test/OneRow.ods"]), [])
+
+    def test_stats(self):
+        """stats should count troupes and performers."""
+
+        stats = dict(ProcessTroupeData.troupe_stats(
+            ProcessTroupeData.process_troupe_data("test/Casts.ods")))
+        self.assertEqual(stats["troupes"], 3)
+        self.assertTrue(stats["performers"] > 1)
+
+    def test_lazy_imports(self):
+        """Quick subcommands shouldn't load the heavy modules."""
+
+        loaded = self.run_python(
+            "import sys, ProcessTroupeData\n"
+            "sys.stdout = open('%s', 'w')\n"
+            "ProcessTroupeData.main(['check', 'test/OneRow.ods'])\n"
+            "ProcessTroupeData.main(['stats', 'test/OneRow.ods'])\n"
+            "sys.stdout = sys.__stdout__\n"
+            "print(' '.join(name for name in %r if name in sys.modules))"
+            % (os.devnull, self.HEAVY_MODULES))
+        self.assertEqual(loaded.strip(), "")
+
+    def test_buffered_pages(self):
+        """pages --buffer-rows should run with the default templates,
+        warning that the pages go without related troupes."""
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            shutil.copytree("templates", os.path.join(temp_dir, "templates"))
+            shutil.copy("extant_troupes.txt", temp_dir)
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath("ProcessTroupeData.py"),
+                 "pages", os.path.abspath("test/OneRow.ods"),
+                 "--buffer-rows", "100"], cwd=temp_dir,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdout, stderr = process.communicate()
+        finally:
+            shutil.rmtree(temp_dir)
+        self.assertEqual(process.returncode, 0, stderr)
+        self.assertEqual(stderr, ProcessTroupeData.RELATED_WARNING)
+        self.assertTrue(stdout.startswith("Pages: 1 added"), stdout)
+
+    def test_startup_budget(self):
+        """check on a small file should return almost at once."""
+
+        with open(os.devnull, "w") as devnull:
+            start = time.time()
+            subprocess.call([sys.executable, "ProcessTroupeData.py", "check",
+                             "test/OneRow.ods"], stdout=devnull)
+            self.assertTrue(time.time() - start < self.STARTUP_BUDGET)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
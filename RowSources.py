@@ -0,0 +1,242 @@
+"""Row Sources
+
+Where load_troupe_info gets its rows from.  Every source streams one sheet
+as lists of cell strings, header row included, shaped the way ODSReader
+shapes them: empty cells are "", cells whose text starts with "#" are
+comments that take up no column, and with a columns selection each row is
+max(columns) + 1 wide with the unselected cells left "".
+
+  ods    ODSReader, streaming content.xml out of the zip
+  csv    the csv module (tsv is the same with tabs); a CSV file holds one
+         sheet, so it's read whatever sheet name is asked for
+  xlsx   streaming the named sheet's XML out of the zip, with its shared
+         strings table (the one part that has to be held in memory)
+
+The format is worked out from what's inside a zip archive, and from the
+file extension otherwise (a first line with tabs in it means tsv).
+"""
+
+import os
+import sys
+import zipfile
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+FORMATS = ("ods", "csv", "tsv", "xlsx")
+EXTENSIONS = (".ods", ".csv", ".tsv", ".xlsx")
+
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_NS = \
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+SHEET = SHEET_NS + "sheet"
+SHEET_DATA = SHEET_NS + "sheetData"
+ROW = SHEET_NS + "row"
+CELL = SHEET_NS + "c"
+VALUE = SHEET_NS + "v"
+TEXT = SHEET_NS + "t"
+STRING_ITEM = SHEET_NS + "si"
+INLINE_STRING = SHEET_NS + "is"
+PHONETIC_RUN = SHEET_NS + "rPh"
+RELATIONSHIP = PACKAGE_NS + "Relationship"
+
+
+def detect_format(filename):
+    if zipfile.is_zipfile(filename):
+        archive = zipfile.ZipFile(filename)
+        try:
+            names = set(archive.namelist())
+        finally:
+            archive.close()
+        if "content.xml" in names:
+            return "ods"
+        if "xl/workbook.xml" in names:
+            return "xlsx"
+        raise ValueError("%s isn't a spreadsheet archive" % filename)
+
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in (".tsv", ".tab"):
+        return "tsv"
+    if extension == ".csv":
+        return "csv"
+    with open(filename, "rb") as file_handle:
+        first_line = file_handle.readline()
+    return "tsv" if b"\t" in first_line else "csv"
+
+
+def iter_rows(filename, sheet_name="avail", columns=None, source_format=None):
+    """Yields the rows of sheet_name in filename, detecting its format
+    unless source_format (one of FORMATS) says what it is."""
+    source_format = source_format or detect_format(filename)
+    if source_format == "ods":
+        from ODSReader import ODSReader
+        return ODSReader(filename).iterSheet(sheet_name, columns)
+    if source_format == "csv":
+        return iter_delimited_rows(filename, ",", columns)
+    if source_format == "tsv":
+        return iter_delimited_rows(filename, "\t", columns)
+    if source_format == "xlsx":
+        return iter_xlsx_rows(filename, sheet_name, columns)
+    raise ValueError("unknown row source format: %r" % source_format)
+
+
+# comment cells dropped, then cut down to the selected columns
+def shape_row(cells, columns=None, width=None):
+    cells = [cell for cell in cells if not (cell and cell[0] == "#")]
+    if columns is None:
+        return cells
+    row = [""] * width
+    for index in columns:
+        if index < len(cells):
+            row[index] = cells[index]
+    return row
+
+
+def selection_width(columns):
+    return max(columns) + 1 if columns is not None else None
+
+
+# Python 2's csv module only reads bytes
+def open_delimited(filename):
+    if sys.version_info[0] < 3:
+        return open(filename, "rb")
+    return open(filename, newline="", encoding="utf8")
+
+
+def decode_cell(cell):
+    if not cell:
+        return ""
+    if isinstance(cell, bytes):
+        cell = cell.decode("utf8")
+    return cell.replace(u"\r\n", u"\n")
+
+
+def iter_delimited_rows(filename, delimiter, columns=None):
+    import csv
+    width = selection_width(columns)
+    file_handle = open_delimited(filename)
+    try:
+        first = True
+        for cells in csv.reader(file_handle, delimiter=delimiter):
+            if not cells:
+                continue
+            cells = [decode_cell(cell) for cell in cells]
+            if first:
+                # Excel starts its UTF-8 exports with a byte order mark
+                cells[0] = cells[0].lstrip(u"\ufeff")
+                first = False
+            yield shape_row(cells, columns, width)
+    finally:
+        file_handle.close()
+
+
+# "AB12" -> 27 (columns count from 0)
+def column_index(reference):
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord("A") + 1
+    return index - 1
+
+
+def xlsx_sheet_path(archive, sheet_name):
+    workbook = ElementTree.parse(archive.open("xl/workbook.xml")).getroot()
+    for sheet in workbook.iter(SHEET):
+        if sheet.get("name") == sheet_name:
+            relationship_id = sheet.get(RELATIONSHIP_NS + "id")
+            break
+    else:
+        raise KeyError(sheet_name)
+
+    relationships = ElementTree.parse(
+        archive.open("xl/_rels/workbook.xml.rels")).getroot()
+    for relationship in relationships.iter(RELATIONSHIP):
+        if relationship.get("Id") == relationship_id:
+            target = relationship.get("Target")
+            if target.startswith("/"):
+                return target[1:]
+            return "xl/" + target
+    raise KeyError(sheet_name)
+
+
+# the text of a shared or inline string, leaving out phonetic guides
+def string_text(item):
+    texts = []
+    for child in item:
+        if child.tag == TEXT:
+            texts.append(child.text or u"")
+        elif child.tag != PHONETIC_RUN:
+            texts.extend(text.text or u"" for text in child.iter(TEXT))
+    return u"".join(texts)
+
+
+def load_shared_strings(archive):
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    content = archive.open("xl/sharedStrings.xml")
+    try:
+        for _, elem in ElementTree.iterparse(content):
+            if elem.tag == STRING_ITEM:
+                strings.append(string_text(elem))
+                elem.clear()
+    finally:
+        content.close()
+    return strings
+
+
+def cell_value(cell, shared_strings):
+    cell_type = cell.get("t")
+    if cell_type == "inlineStr":
+        inline = cell.find(INLINE_STRING)
+        return string_text(inline) if inline is not None else ""
+    value = cell.find(VALUE)
+    if value is None or not value.text:
+        return ""
+    if cell_type == "s":
+        return shared_strings[int(value.text)]
+    if cell_type == "b":
+        return "TRUE" if value.text == "1" else "FALSE"
+    return value.text
+
+
+def iter_xlsx_rows(filename, sheet_name, columns=None):
+    width = selection_width(columns)
+    archive = zipfile.ZipFile(filename)
+    try:
+        sheet_path = xlsx_sheet_path(archive, sheet_name)
+        shared_strings = load_shared_strings(archive)
+        sheet_data = None
+        cells = []
+        content = archive.open(sheet_path)
+        try:
+            for event, elem in ElementTree.iterparse(content,
+                                                     ("start", "end")):
+                if event == "start":
+                    if elem.tag == SHEET_DATA:
+                        sheet_data = elem
+                    continue
+                if elem.tag == CELL:
+                    reference = elem.get("r")
+                    index = column_index(reference) if reference \
+                        else len(cells)
+                    if index >= len(cells):
+                        cells.extend([""] * (index - len(cells) + 1))
+                    cells[index] = cell_value(elem, shared_strings)
+                elif elem.tag == ROW:
+                    if cells:
+                        yield shape_row(cells, columns, width)
+                    cells = []
+                    # drop finished rows so memory stays flat
+                    elem.clear()
+                    if sheet_data is not None:
+                        sheet_data.remove(elem)
+        finally:
+            content.close()
+    finally:
+        archive.close()
@@ -0,0 +1,80 @@
+import GenerateTroupeData
+import ProcessTroupeData
+import RowSources
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class ValidateRowSources(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.rows = list(GenerateTroupeData.generate_rows(120, 0.2, seed=5))
+        self.files = {}
+        for source_format in RowSources.FORMATS:
+            file_name = os.path.join(self.temp_dir, "troupes." + source_format)
+            GenerateTroupeData.write_rows(file_name, self.rows, 10)
+            self.files[source_format] = file_name
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, text):
+        file_name = os.path.join(self.temp_dir, name)
+        with open(file_name, "wb") as file_handle:
+            file_handle.write(text)
+        return file_name
+
+    def test_detect_format(self):
+        """Formats should be told apart by contents, then extension."""
+
+        for source_format, file_name in self.files.items():
+            self.assertEqual(RowSources.detect_format(file_name),
+                             source_format)
+        self.assertEqual(RowSources.detect_format(
+            self.write_file("export.txt", b"a\tb\n1\t2\n")), "tsv")
+
+    def test_same_rows(self):
+        """Every format should give the rows ODSReader gives."""
+
+        columns = ProcessTroupeData.TROUPE_COLUMNS
+        expected = list(RowSources.iter_rows(self.files["ods"], "avail",
+                                             columns))
+        self.assertEqual(len(expected), 121)
+        for source_format in ("csv", "tsv", "xlsx"):
+            self.assertEqual(list(RowSources.iter_rows(
+                self.files[source_format], "avail", columns)), expected)
+            self.assertEqual(list(RowSources.iter_rows(
+                self.files[source_format]))[1], self.rows[1])
+
+    def test_same_troupes(self):
+        """The collated troupes shouldn't depend on the input format."""
+
+        expected = ProcessTroupeData.process_troupe_data(self.files["ods"])
+        for source_format in ("csv", "tsv", "xlsx"):
+            self.assertEqual(ProcessTroupeData.process_troupe_data(
+                self.files[source_format]), expected)
+
+    def test_csv_cells(self):
+        """CSV cells should lose the BOM and comment cells, like ODS."""
+
+        file_name = self.write_file(
+            "quirks.csv", b'\xef\xbb\xbfName,#note,Cast\r\n'
+            b'"Pe\xc3\xb1a","#x","A\r\nB",\r\n\r\n')
+        self.assertEqual(list(RowSources.iter_rows(file_name, "avail")),
+                         [[u"Name", u"Cast"], [u"Pe\xf1a", u"A\nB", ""]])
+        self.assertEqual(list(RowSources.iter_rows(file_name, "avail",
+                                                   (0, 2)))[1],
+                         [u"Pe\xf1a", "", ""])
+
+    def test_missing_sheet(self):
+        """Asking an XLSX file for a sheet it lacks should raise KeyError."""
+
+        self.assertRaises(KeyError, list, RowSources.iter_rows(
+            self.files["xlsx"], "no such sheet"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
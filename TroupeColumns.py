@@ -0,0 +1,241 @@
+"""Troupe Columns
+
+A columnar alternative to collate_rows.  The columns process_row reads are
+pulled out into NumPy arrays, rows are grouped by troupe name once with a
+stable sort, and each field's merge rule is computed for every troupe at
+once with ufunc.reduceat over the group boundaries:
+
+  site, photo        first valid URL      minimum row position
+  video              set of valid URLs    set union per troupe
+  blurb, deal        longest, latest tie  maximum length, then position
+  cast               set of names         set union per troupe
+  start/end year     first min/max year   minimum/maximum, then position
+  performed_before   sticky 'y'           logical or
+
+Per-value work (URL checks, year parsing, cast splitting, yes/no answers)
+is done once per distinct string rather than once per row.  The result
+is exactly the troupe_dict collate_rows builds from the same rows.  As
+there, a year that isn't a number ("2013-14") is kept as it is, and only
+raises ValueError for a troupe with another year to compare it with.
+
+NumPy is only needed when this engine is used.
+"""
+
+import ProcessTroupeData
+import TroupeRecord
+
+NAME, SITE, CAST, BLURB, PERFORMED, DEAL, PHOTO, VIDEO, YEAR = \
+    ProcessTroupeData.TROUPE_COLUMNS
+
+
+def fix_url(string):
+    return string.replace('https', 'http')
+
+
+def answered_yes(string):
+    data = {}
+    ProcessTroupeData.set_yes_no_field(data, 'answer', string)
+    return data['answer'] == 'y'
+
+
+class Groups(object):
+    """Rows grouped by troupe, keeping spreadsheet order inside a group."""
+
+    def __init__(self, numpy, names):
+        self.numpy = numpy
+        # number troupes by first appearance; a dict is much quicker than
+        # sorting an object array of names
+        codes = {}
+        inverse = numpy.fromiter((codes.setdefault(name, len(codes))
+                                  for name in names), numpy.intp, len(names))
+        self.names = sorted(codes, key=codes.__getitem__)
+        self.order = numpy.argsort(inverse, kind='mergesort')
+        group_ids = inverse[self.order]
+        self.starts = numpy.concatenate(
+            ([0], numpy.flatnonzero(numpy.diff(group_ids)) + 1))
+        self.group_of_row = group_ids
+
+    def sorted(self, values):
+        return values[self.order]
+
+    # the spreadsheet position of the first (or last) row in each group
+    # where mask holds, or -1 where it never does
+    def position_where(self, mask, last=False):
+        numpy = self.numpy
+        positions = self.order
+        if last:
+            marked = numpy.where(mask[self.order], positions, -1)
+            return numpy.maximum.reduceat(marked, self.starts)
+        sentinel = len(positions)
+        marked = numpy.where(mask[self.order], positions, sentinel)
+        found = numpy.minimum.reduceat(marked, self.starts)
+        return numpy.where(found == sentinel, -1, found)
+
+    def broadcast(self, group_values):
+        # group value for each row, in spreadsheet order
+        numpy = self.numpy
+        result = numpy.empty(len(self.order), group_values.dtype)
+        result[self.order] = group_values[self.group_of_row]
+        return result
+
+
+# column index -> list of that column's values, for rows with a name
+def load_columns(table):
+    columns = dict((index, []) for index in ProcessTroupeData.TROUPE_COLUMNS)
+    for row in table:
+        if row[NAME]:
+            for index, values in columns.items():
+                values.append(row[index])
+    return columns
+
+
+# function applied once per distinct value, then spread back over the rows
+def per_value(function, values):
+    results = dict((value, function(value)) for value in set(values))
+    return list(map(results.__getitem__, values))
+
+
+def mapped(numpy, function, values, dtype):
+    return numpy.fromiter(per_value(function, values), dtype, len(values))
+
+
+def first_url(numpy, groups, column):
+    fixed = per_value(fix_url, column)
+    valid = mapped(numpy, ProcessTroupeData.is_url, fixed, bool)
+    return fixed, valid, groups.position_where(valid)
+
+
+def longest(numpy, groups, column):
+    lengths = numpy.fromiter(map(len, column), int, len(column))
+    longest_length = numpy.maximum.reduceat(groups.sorted(lengths),
+                                            groups.starts)
+    is_longest = (lengths > 0) & (lengths == groups.broadcast(longest_length))
+    return groups.position_where(is_longest, last=True)
+
+
+# the year as a number, or None where it isn't one
+def year_number(year):
+    try:
+        return int(year)
+    except ValueError:
+        return None
+
+
+# collate_rows only parses a troupe's years to compare them, so a year
+# that isn't a number is an error just for troupes with more than one year
+def check_years(numpy, groups, year_strings, present, numeric):
+    bad = present & ~numeric
+    if not bad.any():
+        return
+    counts = numpy.add.reduceat(groups.sorted(present.astype(int)),
+                                groups.starts)
+    positions = numpy.flatnonzero(bad & (groups.broadcast(counts) > 1))
+    if len(positions):
+        # the ValueError collate_rows would raise
+        int(year_strings[positions[0]])
+
+
+def extreme_year(numpy, groups, years, present, reducer, empty):
+    values = numpy.where(present, years, empty)
+    extreme = reducer.reduceat(groups.sorted(values), groups.starts)
+    return groups.position_where(present &
+                                 (values == groups.broadcast(extreme)))
+
+
+# frozenset union of each group's present sets (or None); a group with
+# only one set keeps that set rather than a copy
+def set_unions(groups, sets, present):
+    unions = []
+    order = groups.order.tolist()
+    present = present.tolist()
+    starts = groups.starts.tolist()
+    for start, end in zip(starts, starts[1:] + [len(order)]):
+        union = None
+        copied = False
+        for position in order[start:end]:
+            if present[position]:
+                if union is None:
+                    union = sets[position]
+                    continue
+                if not copied:
+                    union = set(union)
+                    copied = True
+                union |= sets[position]
+        unions.append(frozenset(union) if copied else union)
+    return unions
+
+
+def collate_columns(table, cast_index=None):
+    """Returns the same troupe_dict as collate_rows(table), filling
+    cast_index (a CastIndex) from the collated casts if one is given."""
+    import numpy
+
+    columns = load_columns(table)
+    if not columns[NAME]:
+        return {}
+    groups = Groups(numpy, columns[NAME])
+
+    site, _, site_at = first_url(numpy, groups, columns[SITE])
+    photo, _, photo_at = first_url(numpy, groups, columns[PHOTO])
+    video, video_valid, _ = first_url(numpy, groups, columns[VIDEO])
+    video_sets = [frozenset([url]) for url in video]
+    videos = set_unions(groups, video_sets, video_valid)
+
+    blurb_at = longest(numpy, groups, columns[BLURB])
+    deal_at = longest(numpy, groups, columns[DEAL])
+
+    cast_present = numpy.fromiter(map(bool, columns[CAST]), bool,
+                                  len(columns[CAST]))
+    cast_sets = per_value(lambda value: value and
+                          ProcessTroupeData.parse_cast(value), columns[CAST])
+    casts = set_unions(groups, cast_sets, cast_present)
+
+    year_strings = columns[YEAR]
+    year_present = numpy.fromiter(map(bool, year_strings), bool,
+                                  len(year_strings))
+    year_numbers = per_value(year_number, year_strings)
+    numeric = numpy.fromiter((number is not None for number in year_numbers),
+                             bool, len(year_numbers))
+    check_years(numpy, groups, year_strings, year_present, numeric)
+    years = numpy.fromiter((number or 0 for number in year_numbers),
+                           numpy.int64, len(year_numbers))
+    start_at = extreme_year(numpy, groups, years, year_present,
+                            numpy.minimum, numpy.iinfo(numpy.int64).max)
+    end_at = extreme_year(numpy, groups, years, year_present,
+                          numpy.maximum, numpy.iinfo(numpy.int64).min)
+
+    yes = mapped(numpy, answered_yes, columns[PERFORMED], bool)
+    performed = numpy.logical_or.reduceat(groups.sorted(yes), groups.starts)
+
+    # plain lists index far faster than NumPy arrays one element at a time
+    site_at, photo_at, blurb_at, deal_at, start_at, end_at, performed = [
+        positions.tolist() for positions in (site_at, photo_at, blurb_at,
+                                             deal_at, start_at, end_at,
+                                             performed)]
+
+    troupe_dict = {}
+    for group, troupe_name in enumerate(groups.names):
+        data = TroupeRecord.TroupeRecord()
+        if site_at[group] >= 0:
+            data['site'] = site[site_at[group]]
+        if photo_at[group] >= 0:
+            data['photo'] = photo[photo_at[group]]
+        if videos[group] is not None:
+            data['video'] = videos[group]
+        if blurb_at[group] >= 0:
+            data['blurb'] = columns[BLURB][blurb_at[group]]
+            data['blurb_year'] = year_strings[blurb_at[group]]
+        if deal_at[group] >= 0:
+            data['deal'] = columns[DEAL][deal_at[group]]
+            data['deal_year'] = year_strings[deal_at[group]]
+        if casts[group] is not None:
+            data['cast'] = casts[group]
+        if start_at[group] >= 0:
+            data['start_year'] = year_strings[start_at[group]]
+            data['end_year'] = year_strings[end_at[group]]
+        data['performed_before'] = 'y' if performed[group] else 'n'
+        troupe_dict[troupe_name] = data
+
+    if cast_index is not None:
+        cast_index.add_troupes(troupe_dict)
+    return troupe_dict
@@ -0,0 +1,90 @@
+import CastIndex
+import GenerateTroupeData
+import ProcessTroupeData
+import TroupeColumns
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "the columns engine needs NumPy")
+class ValidateColumnsEngine(unittest.TestCase):
+
+    def assert_engines_agree(self, file_name):
+        table = list(ProcessTroupeData.load_troupe_info(file_name))
+        self.assertEqual(TroupeColumns.collate_columns(table),
+                         ProcessTroupeData.collate_rows(table))
+
+    def test_fixtures(self):
+        """Both engines should collate every fixture identically."""
+
+        for file_name in glob.glob("test/*.ods"):
+            self.assert_engines_agree(file_name)
+
+    def test_generated_data(self):
+        """Both engines should agree on messier generated data too."""
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(temp_dir, "troupes.ods")
+            GenerateTroupeData.generate_ods(file_name, 400, unique_ratio=0.2,
+                                            blank_columns=10, seed=7)
+            self.assert_engines_agree(file_name)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_cast_index(self):
+        """Both engines should build the same performer index."""
+
+        table = list(ProcessTroupeData.load_troupe_info("test/Casts.ods"))
+        row_index = CastIndex.CastIndex()
+        column_index = CastIndex.CastIndex()
+        ProcessTroupeData.collate_rows(table, cast_index=row_index)
+        TroupeColumns.collate_columns(table, column_index)
+        self.assertEqual(row_index.performer_troupes,
+                         column_index.performer_troupes)
+
+    def test_irregular_years(self):
+        """A year that isn't a number should only be an error, in either
+        engine, for a troupe with another year to compare it with."""
+
+        table = ProcessTroupeData.troupe_table([
+            {'name': "Robots", 'blurb': "Beep."},
+            {'name': "Wizards", 'year': "2013-14", 'deal': "Two shows."},
+            {'name': "Wizards", 'cast': "Ann"},
+            {'name': "Llamas", 'year': "2012"},
+            {'name': "Llamas", 'year': "2011"}])
+        self.assertEqual(TroupeColumns.collate_columns(table),
+                         ProcessTroupeData.collate_rows(table))
+        self.assertEqual(
+            TroupeColumns.collate_columns(table)["Wizards"]['start_year'],
+            "2013-14")
+        table.append(ProcessTroupeData.troupe_row("Wizards", year="2014"))
+        self.assertRaises(ValueError, ProcessTroupeData.collate_rows, table)
+        self.assertRaises(ValueError, TroupeColumns.collate_columns, table)
+
+    def test_empty_table(self):
+        """No named rows should give no troupes."""
+
+        self.assertEqual(TroupeColumns.collate_columns([[""] * 23]), {})
+
+    def test_engine_selection(self):
+        """process_troupe_data should run whichever engine it's asked for."""
+
+        self.assertEqual(
+            ProcessTroupeData.process_troupe_data("test/Casts.ods",
+                                                  engine="columns"),
+            ProcessTroupeData.process_troupe_data("test/Casts.ods"))
+        self.assertRaises(ValueError, ProcessTroupeData.process_troupe_data,
+                          "test/Casts.ods", engine="bogus")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,208 @@
+"""Troupe Names
+
+Finds troupe names that are probably the same troupe written differently
+("The $3 Bills", "$3 Bills", "$3 Bills "), within the input and against
+extant_troupes.txt, without comparing every name with every other.
+
+Names are reduced to a key (lowercase, leading article dropped, letters
+and digits only).  Equal keys always match.  Otherwise two keys within
+edit distance d of each other share at least max(len) - 3d of their
+character trigrams, so each key is indexed under only its 3d + 1 rarest
+trigrams (a prefix filter): any near match has to turn up under one of
+them, and only those candidates are checked with a bounded Levenshtein
+distance.  Trigrams are also blocked by the digits in the key, since
+names whose numbers differ ("Robots 1", "Robots 2") never match.
+"""
+
+ARTICLES = ("the", "a", "an")
+GRAM_SIZE = 3
+
+
+def name_key(name):
+    words = name.lower().split()
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    return "".join(x for x in "".join(words) if x.isalnum())
+
+
+# edits allowed between two keys of this length
+def allowed_distance(length):
+    if length < 5:
+        return 0
+    if length < 10:
+        return 1
+    return 2
+
+
+# the key's trigrams, numbered so a repeated trigram counts twice
+def key_grams(key):
+    padded = "^" + key + "$"
+    grams = [padded[index:index + GRAM_SIZE]
+             for index in range(len(padded) - GRAM_SIZE + 1)]
+    if len(set(grams)) == len(grams):
+        return grams
+    seen = {}
+    numbered = []
+    for gram in grams:
+        seen[gram] = seen.get(gram, 0) + 1
+        numbered.append(gram + str(seen[gram]) if seen[gram] > 1 else gram)
+    return numbered
+
+
+def key_digits(key):
+    return "".join(x for x in key if x.isdigit())
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 as soon as it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, a_char in enumerate(a, 1):
+        current = [i]
+        for j, b_char in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (a_char != b_char)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class NameIndex(object):
+    """Troupe names indexed by key and by their keys' rarest trigrams.
+
+    Trigram rarity is fixed when the index is built, so names added later
+    are still ordered consistently with the ones already indexed.
+    """
+
+    def __init__(self, names=()):
+        names = list(names)
+        self.names = {}     # key -> names with that key, in order added
+        self.postings = {}  # (digits, trigram) -> keys with it in prefix
+        self.prefixes = {}  # key -> its postings, once worked out
+        self.frequencies = {}
+        for key in set(name_key(name) for name in names):
+            for gram in key_grams(key):
+                self.frequencies[gram] = self.frequencies.get(gram, 0) + 1
+        for name in names:
+            self.add(name)
+
+    def prefix(self, key):
+        if key in self.prefixes:
+            return self.prefixes[key]
+        distance = allowed_distance(len(key))
+        if not distance:
+            return []
+        frequencies = self.frequencies
+        grams = sorted((frequencies.get(gram, 0), gram)
+                       for gram in key_grams(key))
+        digits = key_digits(key)
+        return [(digits, gram)
+                for _, gram in grams[:GRAM_SIZE * distance + 1]]
+
+    def add(self, name):
+        key = name_key(name)
+        if key not in self.names:
+            self.names[key] = []
+            self.prefixes[key] = self.prefix(key)
+            for posting in self.prefixes[key]:
+                self.postings.setdefault(posting, []).append(key)
+        if name not in self.names[key]:
+            self.names[key].append(name)
+
+    def similar_keys(self, key):
+        """Indexed keys that name the same troupe as key, closest first."""
+        matches = [key] if key in self.names else []
+        candidates = set()
+        for posting in self.prefix(key):
+            candidates.update(self.postings.get(posting, ()))
+        candidates.discard(key)
+
+        distance = allowed_distance(len(key))
+        near = []
+        for other in candidates:
+            limit = min(distance, allowed_distance(len(other)))
+            other_distance = edit_distance(key, other, limit)
+            if other_distance <= limit:
+                near.append((other_distance, other))
+        return matches + [other for _, other in sorted(near)]
+
+    def lookup(self, name):
+        """Indexed names that are probably the same troupe as name."""
+        return [match for key in self.similar_keys(name_key(name))
+                for match in self.names[key]]
+
+
+def group_names(names):
+    """Splits names into lists of probable duplicates, in first-seen order
+    (a name with no duplicates is a group of one)."""
+    names = list(names)
+    index = NameIndex(names)
+    parent = {}
+
+    def find(key):
+        while parent.get(key, key) != key:
+            key = parent[key]
+        return key
+
+    for key in index.names:
+        for other in index.similar_keys(key):
+            root, other_root = find(key), find(other)
+            if root != other_root:
+                parent[other_root] = root
+
+    groups = {}
+    order = []
+    for name in names:
+        root = find(name_key(name))
+        if root not in groups:
+            groups[root] = []
+            order.append(root)
+        if name not in groups[root]:
+            groups[root].append(name)
+    return [groups[root] for root in order]
+
+
+def resolve_names(name_counts, extant_names=()):
+    """Maps every name in name_counts (name -> number of rows) to the name
+    its troupe should be collated under.
+
+    A group of probable duplicates that matches an extant troupe takes the
+    extant spelling; otherwise it takes its most used spelling, with
+    surrounding whitespace dropped.
+    """
+    extant_index = NameIndex(name.strip() for name in extant_names
+                             if name.strip())
+    order = sorted(name_counts, key=lambda name: -name_counts[name])
+    resolved = {}
+    for group in group_names(order):
+        canonical = None
+        for name in group:
+            matches = extant_index.lookup(name)
+            if matches:
+                canonical = matches[0]
+                break
+        if canonical is None:
+            canonical = group[0].strip()
+        for name in group:
+            resolved[name] = canonical
+    return resolved
+
+
+def renamed_rows(table, resolved):
+    for row in table:
+        if row[1] and resolved.get(row[1], row[1]) != row[1]:
+            row = list(row)
+            row[1] = resolved[row[1]]
+        yield row
+
+
+def duplicate_report(resolved):
+    """[(canonical name, [other spellings merged into it])], sorted."""
+    merged = {}
+    for name, canonical in resolved.items():
+        if name != canonical:
+            merged.setdefault(canonical, []).append(name)
+    return sorted((canonical, sorted(names))
+                  for canonical, names in merged.items())
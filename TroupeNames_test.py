@@ -0,0 +1,75 @@
+import ProcessTroupeData
+import TroupeNames
+import unittest
+
+
+class ValidateTroupeNames(unittest.TestCase):
+
+    def test_name_key(self):
+        """Keys should ignore case, a leading article and punctuation."""
+
+        self.assertEqual(TroupeNames.name_key(u"The $3 Bills "), u"3bills")
+        self.assertEqual(TroupeNames.name_key(u"$3 Bills"), u"3bills")
+        self.assertEqual(TroupeNames.name_key(u"The"), u"the")
+
+    def test_group_spellings(self):
+        """Spelling variants of a name should be grouped together."""
+
+        groups = TroupeNames.group_names([u"The $3 Bills", u"Robots",
+                                          u"$3 Bills", u"$3 Bills "])
+        self.assertEqual(groups, [[u"The $3 Bills", u"$3 Bills",
+                                   u"$3 Bills "], [u"Robots"]])
+
+    def test_typo(self):
+        """A long name one typo away should match."""
+
+        index = TroupeNames.NameIndex([u"Midnight Lobsters", u"Tiny Wizards"])
+        self.assertEqual(index.lookup(u"Midnight Lobstrs"),
+                         [u"Midnight Lobsters"])
+        self.assertEqual(index.lookup(u"Tiny Lizards"), [u"Tiny Wizards"])
+        self.assertEqual(index.lookup(u"Golden Pirates"), [])
+
+    def test_numbers_differ(self):
+        """Names whose numbers differ should never match."""
+
+        groups = TroupeNames.group_names([u"Rusty Robots 1",
+                                          u"Rusty Robots 2"])
+        self.assertEqual(len(groups), 2)
+
+    def test_short_names(self):
+        """Short names should only match exactly."""
+
+        self.assertEqual(len(TroupeNames.group_names([u"Bees", u"Beef"])), 2)
+
+    def test_resolve_names(self):
+        """The extant spelling, else the most used one, should win."""
+
+        resolved = TroupeNames.resolve_names(
+            {u"Midnight Lobstrs": 3, u"Midnight Lobsters ": 1,
+             u"Tiny Wizards": 1, u"The Tiny Wizards ": 2},
+            [u"Midnight Lobsters\n"])
+        self.assertEqual(resolved, {
+            u"Midnight Lobstrs": u"Midnight Lobsters",
+            u"Midnight Lobsters ": u"Midnight Lobsters",
+            u"Tiny Wizards": u"The Tiny Wizards",
+            u"The Tiny Wizards ": u"The Tiny Wizards"})
+        self.assertEqual(TroupeNames.duplicate_report(resolved), [
+            (u"Midnight Lobsters", [u"Midnight Lobsters ",
+                                    u"Midnight Lobstrs"]),
+            (u"The Tiny Wizards", [u"The Tiny Wizards ", u"Tiny Wizards"])])
+
+    def test_merge_names(self):
+        """Merging should leave distinct troupes as they were."""
+
+        merged = ProcessTroupeData.process_troupe_data("test/TwoRows.ods",
+                                                       merge_names=True)
+        plain = ProcessTroupeData.process_troupe_data("test/TwoRows.ods")
+        self.assertEqual(merged, plain)
+        with self.assertRaises(ValueError):
+            ProcessTroupeData.process_troupe_data("test/TwoRows.ods",
+                                                  "state.pickle",
+                                                  merge_names=True)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
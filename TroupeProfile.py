@@ -0,0 +1,222 @@
+"""Troupe Profile
+
+Per-stage instrumentation for the pipeline.  Stages record wall time, call
+counts and whatever counters they report (rows, cells, bytes, ...), and
+the whole run records its peak memory.  Profiling is off unless enable()
+is called; while it is off, stage() hands back a shared do-nothing context,
+timed() and timed_iter() return what they were given untouched, and
+count() returns straight away, so the hooks can stay in the code.
+
+Worker processes (--jobs) profile when the parent does: each result
+comes back with the stages the worker recorded for it, which are added
+into the parent's (see profiled_imap).  Peak memory is the parent's own.
+"""
+
+import threading
+import time
+
+enabled = False
+stats = {}
+stats_lock = threading.Lock()
+memory_source = None
+
+
+def enable(trace_memory=True):
+    global enabled, memory_source
+    stats.clear()
+    memory_source = None
+    if trace_memory:
+        try:
+            import tracemalloc
+            tracemalloc.start()
+            memory_source = 'tracemalloc'
+        except ImportError:
+            if peak_rss() is not None:
+                memory_source = 'rss'
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+    if memory_source == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.stop()
+
+
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes everywhere but macOS, which reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def peak_memory():
+    if memory_source == 'tracemalloc':
+        import tracemalloc
+        return tracemalloc.get_traced_memory()[1]
+    if memory_source == 'rss':
+        return peak_rss()
+    return None
+
+
+def record(stage_name, seconds, calls=1, **counters):
+    with stats_lock:
+        stage_stats = stats.setdefault(stage_name,
+                                       {'seconds': 0.0, 'calls': 0})
+        stage_stats['seconds'] += seconds
+        stage_stats['calls'] += calls
+        for counter, amount in counters.items():
+            stage_stats[counter] = stage_stats.get(counter, 0) + amount
+        if memory_source:
+            stage_stats['peak_bytes'] = peak_memory()
+
+
+def count(stage_name, **counters):
+    if not enabled:
+        return
+    record(stage_name, 0.0, 0, **counters)
+
+
+class Stage(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = {}
+
+    def count(self, **counters):
+        for counter, amount in counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.time() - self.start, **self.counters)
+        return False
+
+
+class NullStage(object):
+
+    def count(self, **counters):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_STAGE = NullStage()
+
+
+# with stage("write") as timer: ...; timer.count(bytes=n)
+def stage(name):
+    if not enabled:
+        return NULL_STAGE
+    return Stage(name)
+
+
+# wraps function so every call is timed under stage_name
+def timed(stage_name, function):
+    if not enabled:
+        return function
+
+    def timed_function(*args, **kwargs):
+        start = time.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(stage_name, time.time() - start)
+    return timed_function
+
+
+# wraps a row iterator, timing the first row under first_stage (opening
+# the file and finding the sheet) and the rest under stage_name
+def timed_iter(stage_name, iterable, first_stage=None):
+    if not enabled:
+        return iterable
+    return timed_rows(stage_name, iterable, first_stage or stage_name)
+
+
+def timed_rows(stage_name, iterable, first_stage):
+    iterator = iter(iterable)
+    name = first_stage
+    while True:
+        start = time.time()
+        try:
+            row = next(iterator)
+        except StopIteration:
+            record(name, time.time() - start, 0)
+            return
+        record(name, time.time() - start, 1, rows=1, cells=len(row))
+        name = stage_name
+        yield row
+
+
+# sets a pool worker process profiling (or not) as its parent is, with
+# none of the stats it may have inherited
+def init_worker(parent_enabled):
+    global enabled, memory_source
+    with stats_lock:
+        stats.clear()
+    memory_source = None
+    enabled = parent_enabled
+
+
+# the stats recorded since the last call, for a worker to send back
+def take_stats():
+    with stats_lock:
+        taken = dict(stats)
+        stats.clear()
+    return taken
+
+
+def merge_stats(worker_stats):
+    for stage_name, stage_stats in worker_stats.items():
+        counters = dict(stage_stats)
+        seconds = counters.pop('seconds')
+        calls = counters.pop('calls')
+        counters.pop('peak_bytes', None)
+        record(stage_name, seconds, calls, **counters)
+
+
+def profiled_call(call):
+    function, item = call
+    return function(item), take_stats()
+
+
+def merged_results(results):
+    for result, worker_stats in results:
+        merge_stats(worker_stats)
+        yield result
+
+
+# pool.imap(function, items, chunk_size), adding the stages the workers
+# record into this process's stats as their results come in.  The pool's
+# workers must have run init_worker(enabled).
+def profiled_imap(pool, function, items, chunk_size=1):
+    if not enabled:
+        return pool.imap(function, items, chunk_size)
+    return merged_results(pool.imap(profiled_call,
+                                    ((function, item) for item in items),
+                                    chunk_size))
+
+
+def report():
+    with stats_lock:
+        return {'stages': dict((name, dict(stage_stats))
+                               for name, stage_stats in stats.items()),
+                'peak_bytes': peak_memory(),
+                'memory_source': memory_source}
+
+
+def write_report(file_name):
+    import json
+    with open(file_name, 'w') as file_handle:
+        json.dump(report(), file_handle, indent=1, sort_keys=True)
@@ -0,0 +1,64 @@
+import ProcessTroupeData
+import TroupeProfile
+import unittest
+
+
+class ValidateTroupeProfile(unittest.TestCase):
+
+    def tearDown(self):
+        TroupeProfile.disable()
+
+    def test_disabled_hooks_are_free(self):
+        """With profiling off the hooks should hand back what they got."""
+
+        rows = [[1], [2]]
+        self.assertTrue(TroupeProfile.timed("x", len) is len)
+        self.assertTrue(TroupeProfile.timed_iter("x", rows) is rows)
+        self.assertTrue(TroupeProfile.stage("x") is TroupeProfile.NULL_STAGE)
+
+    def test_pipeline_stages(self):
+        """Reading and collating should be reported with their counts."""
+
+        TroupeProfile.enable()
+        ProcessTroupeData.process_troupe_data("test/Casts.ods")
+        stages = TroupeProfile.report()['stages']
+        self.assertTrue(stages['load']['bytes'] > 0)
+        self.assertEqual(stages['load']['rows'], 1)  # the header row
+        self.assertEqual(stages['read']['rows'], 9)
+        self.assertEqual(stages['read']['cells'], 9 * 23)
+        self.assertEqual(stages['collate']['calls'], 7)
+        self.assertTrue(stages['collate']['seconds'] >= 0)
+
+    def test_worker_stages(self):
+        """Stages run in --jobs worker processes should be reported as if
+        they'd run here."""
+
+        def profile(jobs):
+            TroupeProfile.enable(trace_memory=False)
+            troupe_dict = ProcessTroupeData.process_troupe_data(
+                ["test/Casts.ods", "test/OneRow.ods"], jobs=jobs)
+            ProcessTroupeData.map_troupe_pages(
+                ProcessTroupeData.render_troupe_item, troupe_dict,
+                ProcessTroupeData.load_template_files(), set(), jobs)
+            stages = TroupeProfile.report()['stages']
+            return [(name, stages[name]['calls'], stages[name].get('rows'))
+                    for name in ("read", "collate", "render",
+                                 "transliterate")]
+
+        self.assertEqual(profile(2), profile(1))
+
+    def test_stage_counters(self):
+        """Stage blocks should add up their calls and counters."""
+
+        TroupeProfile.enable(trace_memory=False)
+        for size in (3, 4):
+            with TroupeProfile.stage("write") as timer:
+                timer.count(bytes=size)
+        report = TroupeProfile.report()
+        self.assertEqual(report['stages']['write']['calls'], 2)
+        self.assertEqual(report['stages']['write']['bytes'], 7)
+        self.assertEqual(report['peak_bytes'], None)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,112 @@
+"""Troupe Record
+
+The collated data for one troupe.  A plain dict per troupe costs about a
+kilobyte once it holds a dozen keys; a TroupeRecord keeps the same fields
+in __slots__, a small fraction of that.  Year strings are interned, so
+every troupe that started in 2010 shares one "2010", and casts and video
+lists are frozensets, which the cast parser's interned sets can be
+shared into without copying.
+
+Records still read and write like the dicts they replace (data['cast'],
+'site' in data, data.get(...), dict(data), comparison with a dict), so
+the merge rules and callers don't need to know the difference.  Only
+FIELDS can be set; presentation keys belong in the render context that
+create_troupe_page builds from a record, not in the record itself.
+"""
+
+FIELDS = ('site', 'photo', 'video', 'blurb', 'blurb_year', 'deal',
+          'deal_year', 'cast', 'start_year', 'end_year', 'performed_before')
+YEAR_FIELDS = frozenset(('blurb_year', 'deal_year', 'start_year',
+                         'end_year'))
+
+year_values = {}
+
+
+def intern_year(year):
+    return year_values.setdefault(year, year)
+
+
+class TroupeRecord(object):
+
+    __slots__ = FIELDS
+
+    def __init__(self, fields=()):
+        if hasattr(fields, 'keys'):
+            fields = [(field_name, fields[field_name])
+                      for field_name in fields.keys()]
+        for field_name, value in fields:
+            self[field_name] = value
+
+    def __getitem__(self, field_name):
+        try:
+            return getattr(self, field_name)
+        except (AttributeError, TypeError):
+            raise KeyError(field_name)
+
+    def __setitem__(self, field_name, value):
+        if field_name not in FIELDS:
+            raise KeyError(field_name)
+        if field_name in YEAR_FIELDS:
+            value = intern_year(value)
+        setattr(self, field_name, value)
+
+    def __delitem__(self, field_name):
+        try:
+            delattr(self, field_name)
+        except (AttributeError, TypeError):
+            raise KeyError(field_name)
+
+    def __contains__(self, field_name):
+        try:
+            getattr(self, field_name)
+        except (AttributeError, TypeError):
+            return False
+        return True
+
+    def get(self, field_name, default=None):
+        try:
+            return self[field_name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [field_name for field_name in FIELDS if field_name in self]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(field_name, getattr(self, field_name))
+                for field_name in self.keys()]
+
+    def values(self):
+        return [getattr(self, field_name) for field_name in self.keys()]
+
+    def copy(self):
+        return TroupeRecord(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (TroupeRecord, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "TroupeRecord(%r)" % dict(self.items())
+
+    # __slots__ classes need these to pickle for the state file and for
+    # worker processes
+    def __getstate__(self):
+        return dict(self.items())
+
+    def __setstate__(self, state):
+        for field_name, value in state.items():
+            self[field_name] = value
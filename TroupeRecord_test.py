@@ -0,0 +1,75 @@
+import ProcessTroupeData
+import TroupeRecord
+import pickle
+import unittest
+
+
+class ValidateTroupeRecord(unittest.TestCase):
+
+    def test_reads_like_a_dict(self):
+        """Records should answer the dict operations callers use."""
+
+        record = TroupeRecord.TroupeRecord({'site': "http://a",
+                                            'cast': frozenset(["A"])})
+        self.assertEqual(record['site'], "http://a")
+        self.assertTrue('cast' in record)
+        self.assertFalse('blurb' in record)
+        self.assertEqual(record.get('blurb', "none"), "none")
+        self.assertRaises(KeyError, lambda: record['blurb'])
+        self.assertEqual(sorted(record), ['cast', 'site'])
+        self.assertEqual(record, {'site': "http://a", 'cast': {"A"}})
+        self.assertEqual({'site': "http://a", 'cast': {"A"}}, record)
+        self.assertNotEqual(record, {'site': "http://a"})
+        del record['site']
+        self.assertEqual(record.keys(), ['cast'])
+
+    def test_only_fields(self):
+        """Presentation keys shouldn't be storable in a record."""
+
+        record = TroupeRecord.TroupeRecord()
+        with self.assertRaises(KeyError):
+            record['blurb_section'] = ""
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_interned_years(self):
+        """Equal years should be one shared string."""
+
+        first = TroupeRecord.TroupeRecord({'start_year': "20" + "10"})
+        second = TroupeRecord.TroupeRecord({'end_year': "201" + "0"})
+        self.assertTrue(first['start_year'] is second['end_year'])
+
+    def test_pickle(self):
+        """Records should survive pickling for state files and workers."""
+
+        record = TroupeRecord.TroupeRecord({'cast': frozenset(["A", "B"]),
+                                            'performed_before': 'y'})
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEqual(pickle.loads(pickle.dumps(record, protocol)),
+                             record)
+
+    def test_collated_records(self):
+        """Collation should build records with frozen sets."""
+
+        troupe_dict = ProcessTroupeData.process_troupe_data(
+            "test/VideoSet.ods")
+        for troupe_data in troupe_dict.values():
+            self.assertTrue(isinstance(troupe_data, TroupeRecord.TroupeRecord))
+            self.assertTrue(isinstance(troupe_data['video'], frozenset))
+
+    def test_rendering_leaves_record(self):
+        """Rendering a page shouldn't change the troupe's data."""
+
+        troupe_dict = ProcessTroupeData.process_troupe_data(
+            "test/BlurbDealYears.ods")
+        templates = ProcessTroupeData.load_template_files()
+        troupe_name, troupe_data = sorted(troupe_dict.items())[0]
+        before = troupe_data.copy()
+        page = ProcessTroupeData.create_troupe_page(troupe_name, troupe_data,
+                                                    templates)
+        self.assertEqual(troupe_data, before)
+        self.assertEqual(ProcessTroupeData.create_troupe_page(
+            troupe_name, troupe_data, templates), page)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
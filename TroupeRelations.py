@@ -0,0 +1,72 @@
+"""Troupe Relations
+
+Related troupes, ranked by how many performers they share.  Comparing
+every troupe's cast with every other troupe's is quadratic in the number
+of troupes.  Instead, the performer -> troupes index (see CastIndex) gives
+each troupe's row of the sparse troupe-troupe co-occurrence matrix
+directly: every performer in its cast adds one to each other troupe
+they've been in.  Only troupes that share someone get an entry, and each
+row is cut down to its top few as soon as it's counted, so memory stays
+at a few entries per troupe.
+
+The work is the sum, over performers, of the square of the number of
+troupes they've been in.  That grows with the number of cast memberships
+as long as nobody is in a sizeable share of all the troupes.  Performers
+listed in more than MAX_PERFORMER_TROUPES troupes (a house player, or a
+cast cell like "TBA") would relate everything to everything, so they're
+left out of the counts.
+"""
+
+import heapq
+
+import CastIndex
+
+DEFAULT_LIMIT = 5
+MAX_PERFORMER_TROUPES = 100
+
+
+# most shared first, ties by name so pages don't churn between runs
+def top_related(counts, limit):
+    ranked = heapq.nsmallest(limit, ((-shared, troupe_name)
+                                     for troupe_name, shared
+                                     in counts.items()))
+    return [(troupe_name, -negated) for negated, troupe_name in ranked]
+
+
+def shared_performers(troupe_name, cast, performer_troupes,
+                      max_troupes=MAX_PERFORMER_TROUPES):
+    """troupe_name's row of the co-occurrence matrix: other troupe ->
+    performers it shares with cast."""
+    counts = {}
+    for performer in cast:
+        troupes = performer_troupes.get(performer, ())
+        if len(troupes) > max_troupes:
+            continue
+        for other in troupes:
+            counts[other] = counts.get(other, 0) + 1
+    counts.pop(troupe_name, None)
+    return counts
+
+
+def related_troupes(troupe_dict, limit=DEFAULT_LIMIT, cast_index=None,
+                    max_troupes=MAX_PERFORMER_TROUPES):
+    """troupe name -> up to limit (other troupe, performers shared) pairs,
+    most shared first, for every troupe that shares a performer.  Pass the
+    CastIndex built during collation, if there is one, to save building
+    it again."""
+    if cast_index is None:
+        cast_index = CastIndex.CastIndex()
+        cast_index.add_troupes(troupe_dict)
+    performer_troupes = cast_index.performer_troupes
+    related = {}
+    for troupe_name, troupe_data in troupe_dict.items():
+        counts = shared_performers(troupe_name, troupe_data.get('cast', ()),
+                                   performer_troupes, max_troupes)
+        if counts:
+            related[troupe_name] = top_related(counts, limit)
+    return related
+
+
+def cast_memberships(troupe_dict):
+    return sum(len(troupe_data.get('cast', ()))
+               for troupe_data in troupe_dict.values())
@@ -0,0 +1,81 @@
+import GenerateTroupeData
+import ProcessTroupeData
+import TroupeRelations
+import sys
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class ValidateTroupeRelations(unittest.TestCase):
+
+    def setUp(self):
+        self.troupe_dict = ProcessTroupeData.process_troupe_data(
+            ProcessTroupeData.troupe_table([
+                {'name': "Bills", 'cast': "Ann, Bo, Cy"},
+                {'name': "Llamas", 'cast': "Ann, Bo"},
+                {'name': "Teacups", 'cast': "Cy"},
+                {'name': "Robots", 'cast': "Ann"},
+                {'name': "Wizards", 'cast': "Dee"},
+                {'name': "Ghosts"}]))
+
+    def test_ranked_and_limited(self):
+        """Troupes sharing the most performers come first, ties by name."""
+
+        related = TroupeRelations.related_troupes(self.troupe_dict, 2)
+        self.assertEqual(related["Bills"], [("Llamas", 2), ("Robots", 1)])
+        self.assertEqual(related["Robots"], [("Bills", 1), ("Llamas", 1)])
+        self.assertEqual(related["Teacups"], [("Bills", 1)])
+        self.assertFalse("Wizards" in related or "Ghosts" in related)
+
+    def test_busy_performers(self):
+        """Performers in too many troupes shouldn't relate them all."""
+
+        related = TroupeRelations.related_troupes(self.troupe_dict,
+                                                  max_troupes=2)
+        self.assertEqual(related["Bills"], [("Llamas", 1), ("Teacups", 1)])
+        self.assertFalse("Robots" in related)
+
+    def test_matches_pairwise(self):
+        """The index should count what comparing every pair of casts does."""
+
+        troupe_dict = ProcessTroupeData.process_troupe_data(
+            list(GenerateTroupeData.generate_rows(600, 0.3, seed=3))[1:])
+        related = TroupeRelations.related_troupes(troupe_dict, 1000)
+        for troupe_name, troupe_data in troupe_dict.items():
+            cast = troupe_data.get('cast', frozenset())
+            shared = sorted((-len(cast & other_data.get('cast', ())), other)
+                            for other, other_data in troupe_dict.items()
+                            if other != troupe_name and
+                            cast & other_data.get('cast', frozenset()))
+            self.assertEqual(related.get(troupe_name, []),
+                             [(other, -count) for count, other in shared])
+
+    def test_only_for_related_sections(self):
+        """Troupes are only related for templates with a related section,
+        and never when they're streamed, which is warned about."""
+
+        templates = ProcessTroupeData.load_template_files()
+        self.assertEqual(
+            ProcessTroupeData.troupe_relations(self.troupe_dict, templates,
+                                               1)["Bills"], [("Llamas", 2)])
+        self.assertEqual(ProcessTroupeData.troupe_relations(
+            self.troupe_dict, {'troupe': templates['troupe']}), None)
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            self.assertEqual(ProcessTroupeData.troupe_relations(
+                iter(self.troupe_dict.items()), templates), None)
+            self.assertEqual(ProcessTroupeData.troupe_relations(
+                iter(self.troupe_dict.items()),
+                {'troupe': templates['troupe']}), None)
+            warnings = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(warnings, ProcessTroupeData.RELATED_WARNING)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
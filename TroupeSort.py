@@ -0,0 +1,116 @@
+"""Troupe Sort
+
+Collation in bounded memory, for inputs whose troupes don't fit in RAM.
+A troupe isn't finished until every row has gone by, since rows come in no
+particular order, so rather than building one big troupe dict the rows are
+put into troupe order first.  They're read buffer_rows at a time, cut down
+to the columns collation uses, sorted by troupe name and spilled to a
+temporary run file; the runs are then merged with a heap, a few dozen at
+a time, which brings each troupe's rows together in their spreadsheet
+order.  A troupe is collated as soon as its last row is merged, and can be
+rendered and written straight away, so peak memory is set by the buffer
+rather than by the size of the input.
+"""
+
+import heapq
+import itertools
+import marshal
+import os
+import tempfile
+
+import ProcessTroupeData
+
+DEFAULT_BUFFER_ROWS = 100000
+# runs merged at once, and so files open at once
+MAX_MERGE_RUNS = 64
+
+ROW_WIDTH = max(ProcessTroupeData.TROUPE_COLUMNS) + 1
+
+
+# (troupe name, row number, the cells collation uses)
+def spill_entry(row_number, row):
+    return (row[1], row_number,
+            tuple(row[index] for index in ProcessTroupeData.TROUPE_COLUMNS))
+
+
+def restore_row(cells):
+    row = [""] * ROW_WIDTH
+    for index, cell in zip(ProcessTroupeData.TROUPE_COLUMNS, cells):
+        row[index] = cell
+    return row
+
+
+def write_run(entries, temp_dir):
+    handle, run_file = tempfile.mkstemp(prefix="run", dir=temp_dir)
+    with os.fdopen(handle, "wb") as file_handle:
+        for entry in entries:
+            marshal.dump(entry, file_handle)
+    return run_file
+
+
+def read_run(run_file):
+    with open(run_file, "rb") as file_handle:
+        while True:
+            try:
+                yield marshal.load(file_handle)
+            except EOFError:
+                return
+
+
+# sorted runs of at most buffer_rows entries each
+def spill_runs(table, buffer_rows, temp_dir):
+    runs = []
+    named_rows = ((row_number, row) for row_number, row in enumerate(table)
+                  if row[1])
+    while True:
+        buffer = [spill_entry(row_number, row) for row_number, row
+                  in itertools.islice(named_rows, buffer_rows)]
+        if not buffer:
+            return runs
+        buffer.sort()
+        runs.append(write_run(buffer, temp_dir))
+        # let it go before the next buffer fills, not after
+        del buffer
+
+
+# merges runs MAX_MERGE_RUNS at a time until one merge can take them all
+def merge_runs(runs, temp_dir):
+    while len(runs) > MAX_MERGE_RUNS:
+        merged = []
+        for start in range(0, len(runs), MAX_MERGE_RUNS):
+            group = runs[start:start + MAX_MERGE_RUNS]
+            merged.append(write_run(
+                heapq.merge(*[read_run(run) for run in group]), temp_dir))
+            for run in group:
+                os.remove(run)
+        runs = merged
+    return heapq.merge(*[read_run(run) for run in runs])
+
+
+def sorted_troupe_rows(table, buffer_rows=DEFAULT_BUFFER_ROWS, temp_dir=None):
+    """Yields the named rows of table grouped by troupe, in troupe name
+    order, with each troupe's rows in table order, holding no more than
+    buffer_rows of them in memory.  Run files go in a directory made
+    under temp_dir (the system's temporary directory by default), which
+    is removed once the rows have all been yielded."""
+    import shutil
+    run_dir = tempfile.mkdtemp(prefix="troupesort", dir=temp_dir)
+    try:
+        runs = spill_runs(table, max(1, buffer_rows), run_dir)
+        for _, _, cells in merge_runs(runs, run_dir):
+            yield restore_row(cells)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def iter_troupes(table, buffer_rows=DEFAULT_BUFFER_ROWS, temp_dir=None,
+                 cast_index=None):
+    """Yields (troupe_name, troupe_data) for every troupe in table, in name
+    order, each collated with the rows engine as soon as its rows have
+    all been merged."""
+    rows = sorted_troupe_rows(table, buffer_rows, temp_dir)
+    for troupe_name, troupe_rows in itertools.groupby(
+            rows, lambda row: row[1]):
+        troupe_dict = ProcessTroupeData.collate_rows(troupe_rows,
+                                                     cast_index=cast_index)
+        yield troupe_name, troupe_dict[troupe_name]
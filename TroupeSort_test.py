@@ -0,0 +1,62 @@
+import GenerateTroupeData
+import ProcessTroupeData
+import TroupeSort
+import TroupeTemplates
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class ValidateTroupeSort(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.rows = list(GenerateTroupeData.generate_rows(400, 0.2,
+                                                          seed=7))[1:]
+        self.rows[5][1] = ""  # unnamed rows are left out
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_rows_grouped_in_order(self):
+        """Rows should come back by troupe, each troupe's in table order."""
+
+        expected = [TroupeSort.restore_row(TroupeSort.spill_entry(0, row)[2])
+                    for row in sorted((row for row in self.rows if row[1]),
+                                      key=lambda row: row[1])]
+        self.assertEqual(list(TroupeSort.sorted_troupe_rows(
+            self.rows, 30, self.temp_dir)), expected)
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_matches_in_memory_collation(self):
+        """Any buffer size should collate the same troupes as a dict."""
+
+        expected = ProcessTroupeData.process_troupe_data(self.rows)
+        for buffer_rows in (1000, 30, 1):  # one run, a few, multiple passes
+            troupes = list(TroupeSort.iter_troupes(self.rows, buffer_rows))
+            self.assertEqual([name for name, _ in troupes], sorted(expected))
+            self.assertEqual(dict(troupes), expected)
+
+    def test_streamed_pages(self):
+        """Streamed troupes should render the pages a dict does."""
+
+        templates = TroupeTemplates.compile_templates({
+            'blurb': u"{blurb}", 'deal': u"{deal}",
+            'summary': u"{blurb_section}{deal_section}",
+            'more_info': u"{site}", 'media': u"{video_list}",
+            'troupe': u"{name} {years} {cast_list}{summary_section}"
+                      u"{media_section}{other_categories}"})
+        expected = sorted(ProcessTroupeData.map_troupe_pages(
+            ProcessTroupeData.render_troupe_item,
+            ProcessTroupeData.process_troupe_data(self.rows), templates,
+            set()))
+        for jobs in (1, 2):
+            self.assertEqual(sorted(ProcessTroupeData.map_troupe_pages(
+                ProcessTroupeData.render_troupe_item,
+                ProcessTroupeData.page_troupes(self.rows, buffer_rows=50),
+                templates, set(), jobs)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
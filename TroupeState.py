@@ -0,0 +1,151 @@
+"""Troupe State
+
+Remembers, between runs, the collated troupe dictionary for a spreadsheet
+along with the rows each troupe was built from.  A rerun on an unchanged
+file returns the saved troupes without parsing anything; a rerun on an
+edited file re-collates only the troupes whose rows were added, changed or
+removed, through the same process_row merge rules as a full run.
+"""
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# bump this whenever the collation rules or the troupe records change, so
+# old state is ignored
+STATE_VERSION = 2
+
+
+def file_stat(filename):
+    import os
+    stat = os.stat(filename)
+    return (stat.st_size, stat.st_mtime)
+
+
+def file_fingerprint(filename):
+    import hashlib
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as file_handle:
+        for chunk in iter(lambda: file_handle.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_hash(row):
+    import hashlib
+    return hashlib.sha1(u"\x1f".join(row).encode('utf8')).hexdigest()
+
+
+def load_state(state_file):
+    import os
+    import ProcessTroupeData
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, 'rb') as file_handle:
+            state = pickle.load(file_handle)
+    except (EOFError, pickle.UnpicklingError):
+        return None
+    if state.get('version') != STATE_VERSION or \
+            state.get('columns') != ProcessTroupeData.TROUPE_COLUMNS:
+        return None
+    return state
+
+
+def save_state(state_file, state):
+    with open(state_file, 'wb') as file_handle:
+        pickle.dump(state, file_handle, pickle.HIGHEST_PROTOCOL)
+
+
+# troupe name -> list of (row hash, row), in spreadsheet order
+def group_rows(table):
+    troupe_rows = {}
+    for row in table:
+        if row[1]:
+            row = tuple(row)
+            troupe_rows.setdefault(row[1], []).append((row_hash(row), row))
+    return troupe_rows
+
+
+def no_changes():
+    return {'added': set(), 'changed': set(), 'removed': set(),
+            'rows_added': 0, 'rows_removed': 0}
+
+
+def diff_troupe_rows(old_rows, new_rows):
+    from collections import Counter
+    changes = no_changes()
+    for troupe_name in set(old_rows) | set(new_rows):
+        old_hashes = [h for h, _ in old_rows.get(troupe_name, [])]
+        new_hashes = [h for h, _ in new_rows.get(troupe_name, [])]
+        if old_hashes == new_hashes:
+            continue
+        old_count = Counter(old_hashes)
+        new_count = Counter(new_hashes)
+        changes['rows_added'] += sum((new_count - old_count).values())
+        changes['rows_removed'] += sum((old_count - new_count).values())
+        if not old_hashes:
+            changes['added'].add(troupe_name)
+        elif not new_hashes:
+            changes['removed'].add(troupe_name)
+        else:
+            changes['changed'].add(troupe_name)
+    return changes
+
+
+def cached_rows(filename, state_file):
+    """The rows state_file saved for filename, grouped as by group_rows,
+    if filename hasn't changed since; otherwise None."""
+    state = load_state(state_file)
+    if state and (state['stat'] == file_stat(filename) or
+                  state['fingerprint'] == file_fingerprint(filename)):
+        return state['troupe_rows']
+    return None
+
+
+def update_troupe_data(filename, state_file):
+    """Returns (troupe_dict, changes) for filename, reusing state_file.
+
+    changes holds the sets of 'added', 'changed' and 'removed' troupe
+    names, plus 'rows_added'/'rows_removed' counts, relative to the last
+    run that saved state_file.  A row edited in place counts as one row
+    removed and one row added.
+    """
+    import ProcessTroupeData
+
+    state = load_state(state_file)
+    stat = file_stat(filename)
+    if state and state['stat'] == stat:
+        return state['troupe_dict'], no_changes()
+
+    fingerprint = file_fingerprint(filename)
+    if state and state['fingerprint'] == fingerprint:
+        state['stat'] = stat
+        save_state(state_file, state)
+        return state['troupe_dict'], no_changes()
+
+    new_rows = group_rows(ProcessTroupeData.load_troupe_info(filename))
+    if state:
+        old_rows = state['troupe_rows']
+        troupe_dict = state['troupe_dict']
+    else:
+        old_rows = {}
+        troupe_dict = {}
+
+    changes = diff_troupe_rows(old_rows, new_rows)
+
+    for troupe_name in changes['removed']:
+        del troupe_dict[troupe_name]
+    for troupe_name in changes['added'] | changes['changed']:
+        troupe_dict.pop(troupe_name, None)
+        ProcessTroupeData.collate_rows(
+            [row for _, row in new_rows[troupe_name]], troupe_dict)
+
+    save_state(state_file, {'version': STATE_VERSION,
+                            'columns': ProcessTroupeData.TROUPE_COLUMNS,
+                            'stat': stat,
+                            'fingerprint': fingerprint,
+                            'troupe_rows': new_rows,
+                            'troupe_dict': troupe_dict})
+    return troupe_dict, changes
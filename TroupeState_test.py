@@ -0,0 +1,77 @@
+import ProcessTroupeData
+import TroupeState
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class ValidateTroupeState(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.temp_dir, "input.ods")
+        self.state_file = os.path.join(self.temp_dir, "state")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def use_input(self, fixture):
+        shutil.copyfile(fixture, self.input_file)
+        # make sure the quick size/mtime check can't mistake it for the old
+        os.utime(self.input_file, (0, os.path.getmtime(fixture) + 1))
+
+    def test_first_run_matches_full_run(self):
+        """With no saved state we should collate everything."""
+
+        self.use_input("test/Casts.ods")
+        troupe_dict, changes = TroupeState.update_troupe_data(
+            self.input_file, self.state_file)
+        self.assertEqual(troupe_dict,
+                         ProcessTroupeData.process_troupe_data(
+                             "test/Casts.ods"))
+        self.assertEqual(changes['added'],
+                         {"separators", "whitespace", "union"})
+        self.assertEqual(changes['rows_added'], 7)
+
+    def test_unchanged_rerun(self):
+        """Rerunning on the same file should report no changes."""
+
+        self.use_input("test/Casts.ods")
+        first, _ = TroupeState.update_troupe_data(self.input_file,
+                                                  self.state_file)
+        second, changes = TroupeState.update_troupe_data(self.input_file,
+                                                         self.state_file)
+        self.assertEqual(first, second)
+        self.assertEqual(changes, TroupeState.no_changes())
+
+    def test_changed_rows(self):
+        """Only troupes whose rows changed should be re-collated."""
+
+        self.use_input("test/OneRow.ods")
+        TroupeState.update_troupe_data(self.input_file, self.state_file)
+        self.use_input("test/TwoRows.ods")
+        troupe_dict, changes = TroupeState.update_troupe_data(
+            self.input_file, self.state_file)
+        self.assertEqual(troupe_dict,
+                         ProcessTroupeData.process_troupe_data(
+                             "test/TwoRows.ods"))
+        self.assertEqual(changes['changed'], {"name1"})
+        self.assertEqual(changes['rows_added'], 2)
+        self.assertEqual(changes['rows_removed'], 1)
+
+    def test_removed_troupes(self):
+        """Troupes that lost all their rows should be dropped."""
+
+        self.use_input("test/Casts.ods")
+        TroupeState.update_troupe_data(self.input_file, self.state_file)
+        self.use_input("test/OneRow.ods")
+        troupe_dict, changes = TroupeState.update_troupe_data(
+            self.input_file, self.state_file)
+        self.assertEqual(set(troupe_dict), {"name1"})
+        self.assertEqual(changes['removed'],
+                         {"separators", "whitespace", "union"})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,227 @@
+"""Troupe Store
+
+Keeps collated troupes in a SQLite database, so questions like "which
+troupes were active in 2013" or "which troupes has this performer been
+in" are indexed lookups rather than another pass over the spreadsheet.
+Each troupe is a row of the troupes table, with its cast and videos
+normalized into child tables of one row per performer or link.  Years are
+stored as the text they were given, alongside the start and end years as
+numbers (NULL when they aren't one) for the year range index; there are
+also indexes on performers and on each troupe's classification, which is
+where its page goes:
+
+  extant     on extant_troupes.txt
+  never      never performed
+  performed  everything else
+
+A saved store also stands in for the spreadsheet on later runs:
+process_troupe_data reads the troupes straight back out of one.
+"""
+
+import TroupeRecord
+
+# bump this whenever the schema changes; a store from another version has
+# to be written again
+STORE_VERSION = 2
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+CLASSIFICATIONS = ("extant", "never", "performed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS troupes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    site TEXT,
+    photo TEXT,
+    blurb TEXT,
+    blurb_year TEXT,
+    deal TEXT,
+    deal_year TEXT,
+    start_year TEXT,
+    end_year TEXT,
+    performed_before TEXT,
+    start_number INTEGER,
+    end_number INTEGER,
+    classification TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cast_members (
+    troupe_id INTEGER NOT NULL REFERENCES troupes (id) ON DELETE CASCADE,
+    performer TEXT NOT NULL,
+    PRIMARY KEY (troupe_id, performer)
+);
+CREATE TABLE IF NOT EXISTS videos (
+    troupe_id INTEGER NOT NULL REFERENCES troupes (id) ON DELETE CASCADE,
+    url TEXT NOT NULL,
+    PRIMARY KEY (troupe_id, url)
+);
+CREATE INDEX IF NOT EXISTS troupe_years ON troupes (start_number,
+                                                    end_number);
+CREATE INDEX IF NOT EXISTS troupe_classes ON troupes (classification);
+CREATE INDEX IF NOT EXISTS cast_performers ON cast_members (performer);
+"""
+
+# the troupe data fields, saved as they are (NULL when missing), then the
+# columns worked out from them
+TROUPE_COLUMNS = ('id', 'name', 'site', 'photo', 'blurb', 'blurb_year',
+                  'deal', 'deal_year', 'start_year', 'end_year',
+                  'performed_before', 'start_number', 'end_number',
+                  'classification')
+FIELD_COLUMNS = TROUPE_COLUMNS[2:11]
+
+
+# just a look at the header, so telling a store from a spreadsheet doesn't
+# need sqlite3
+def is_store(filename):
+    try:
+        with open(filename, "rb") as file_handle:
+            return file_handle.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except IOError:
+        return False
+
+
+# the page subdirectory troupe_page_subdir would pick, without the page
+def classify_troupe(troupe_name, troupe_data, extant_troupes):
+    import ProcessTroupeData
+    if ProcessTroupeData.is_extant_troupe(troupe_name, extant_troupes):
+        return "extant"
+    if troupe_data.get('performed_before') != 'y':
+        return "never"
+    return "performed"
+
+
+# a year the spreadsheet gave as something other than a number ("2013-14")
+# is kept, but can't be searched by
+def year_number(year):
+    return int(year) if year and year.strip().isdigit() else None
+
+
+# the troupes table row for one troupe, in TROUPE_COLUMNS order
+def troupe_row(troupe_id, troupe_name, troupe_data, extant_troupes):
+    row = [troupe_id, troupe_name]
+    row.extend(troupe_data.get(column) for column in FIELD_COLUMNS)
+    row.append(year_number(troupe_data.get('start_year')))
+    row.append(year_number(troupe_data.get('end_year')))
+    row.append(classify_troupe(troupe_name, troupe_data, extant_troupes))
+    return row
+
+
+class TroupeStore(object):
+    """One store database.
+
+    with TroupeStore("troupes.db") as store:
+        store.save_troupes(troupe_dict, extant_troupes)
+        store.troupe_names(active_in=2013, performer="Ann Adams")
+    """
+
+    def __init__(self, filename):
+        import sqlite3
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, STORE_VERSION):
+            self.connection.close()
+            raise ValueError("%s is a version %d troupe store, not version %d"
+                             % (filename, version, STORE_VERSION))
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute("PRAGMA user_version = %d" %
+                                    STORE_VERSION)
+
+    def save_troupes(self, troupe_dict, extant_troupes=frozenset()):
+        """Replaces the stored troupes with troupe_dict, in one
+        transaction of bulk inserts."""
+        troupe_ids = dict((troupe_name, troupe_id) for troupe_id, troupe_name
+                          in enumerate(sorted(troupe_dict), 1))
+        with self.connection:
+            for table in ("videos", "cast_members", "troupes"):
+                self.connection.execute("DELETE FROM %s" % table)
+            self.connection.executemany(
+                "INSERT INTO troupes (%s) VALUES (%s)" % (
+                    ", ".join(TROUPE_COLUMNS),
+                    ", ".join("?" * len(TROUPE_COLUMNS))),
+                (troupe_row(troupe_ids[troupe_name], troupe_name,
+                            troupe_data, extant_troupes)
+                 for troupe_name, troupe_data in troupe_dict.items()))
+            self.connection.executemany(
+                "INSERT INTO cast_members (troupe_id, performer) "
+                "VALUES (?, ?)",
+                ((troupe_ids[troupe_name], performer)
+                 for troupe_name, troupe_data in troupe_dict.items()
+                 for performer in troupe_data.get('cast', ())))
+            self.connection.executemany(
+                "INSERT INTO videos (troupe_id, url) VALUES (?, ?)",
+                ((troupe_ids[troupe_name], url)
+                 for troupe_name, troupe_data in troupe_dict.items()
+                 for url in troupe_data.get('video', ())))
+
+    def load_troupes(self):
+        """The stored troupes, as the troupe dict they were saved from."""
+        import CastIndex
+        troupe_dict = {}
+        troupe_names = {}
+        for row in self.connection.execute(
+                "SELECT id, name, %s FROM troupes" % ", ".join(FIELD_COLUMNS)):
+            troupe_data = TroupeRecord.TroupeRecord()
+            for column, value in zip(FIELD_COLUMNS, row[2:]):
+                if value is not None:
+                    troupe_data[column] = value
+            troupe_names[row[0]] = row[1]
+            troupe_dict[row[1]] = troupe_data
+
+        for field_name, query, intern in (
+                ('cast', "SELECT troupe_id, performer FROM cast_members",
+                 CastIndex.intern_name),
+                ('video', "SELECT troupe_id, url FROM videos", None)):
+            collected = {}
+            for troupe_id, value in self.connection.execute(query):
+                collected.setdefault(troupe_id, []).append(
+                    intern(value) if intern else value)
+            for troupe_id, values in collected.items():
+                troupe_dict[troupe_names[troupe_id]][field_name] = \
+                    frozenset(values)
+        return troupe_dict
+
+    def troupe_names(self, active_in=None, performer=None,
+                     classification=None):
+        """Sorted names of the troupes matching every filter given: active
+        in the year active_in, with performer in the cast, and with the
+        given classification (one of CLASSIFICATIONS)."""
+        conditions = []
+        parameters = []
+        if active_in is not None:
+            conditions.append("start_number <= ? AND end_number >= ?")
+            parameters.extend([active_in, active_in])
+        if performer is not None:
+            conditions.append("id IN (SELECT troupe_id FROM cast_members "
+                              "WHERE performer = ?)")
+            parameters.append(performer)
+        if classification is not None:
+            if classification not in CLASSIFICATIONS:
+                raise ValueError("unknown classification: %r" %
+                                 classification)
+            conditions.append("classification = ?")
+            parameters.append(classification)
+        query = "SELECT name FROM troupes"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return [name for name, in self.connection.execute(
+            query + " ORDER BY name", parameters)]
+
+    def performers(self):
+        return [performer for performer, in self.connection.execute(
+            "SELECT DISTINCT performer FROM cast_members ORDER BY performer")]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def load_store(filename):
+    with TroupeStore(filename) as store:
+        return store.load_troupes()
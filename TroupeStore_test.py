@@ -0,0 +1,148 @@
+import GenerateTroupeData
+import ProcessTroupeData
+import TroupeStore
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+
+class ValidateTroupeStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_file = os.path.join(self.temp_dir, "troupes.db")
+        self.troupe_dict = ProcessTroupeData.process_troupe_data(
+            ProcessTroupeData.troupe_table([
+                {'name': "Bills", 'cast': "Ann, Bob", 'year': "2010",
+                 'video': "www.v1", 'performed_before': "yes"},
+                {'name': "Bills", 'cast': "Ann, Cy", 'year': "2014"},
+                {'name': "Lobsters", 'cast': "Bob", 'year': "2013",
+                 'site': "www.lobsters.com", 'blurb': "Claws."},
+                {'name': "Teacups", 'cast': "Cy", 'year': "2009",
+                 'performed_before': "yes"}]))
+        with TroupeStore.TroupeStore(self.store_file) as store:
+            store.save_troupes(self.troupe_dict, {"teacups"})
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_round_trip(self):
+        """Loading should give back the troupes that were saved."""
+
+        self.assertEqual(TroupeStore.load_store(self.store_file),
+                         self.troupe_dict)
+
+        rows = list(GenerateTroupeData.generate_rows(300, seed=4))[1:]
+        troupe_dict = ProcessTroupeData.process_troupe_data(rows)
+        with TroupeStore.TroupeStore(self.store_file) as store:
+            store.save_troupes(troupe_dict)
+        self.assertEqual(TroupeStore.load_store(self.store_file), troupe_dict)
+
+    def test_irregular_years(self):
+        """Years that are blank or not a number should be saved as they
+        are, and pages render from the store as from the spreadsheet."""
+
+        troupe_dict = ProcessTroupeData.process_troupe_data(
+            ProcessTroupeData.troupe_table([
+                {'name': "Robots", 'blurb': "Beep."},
+                {'name': "Wizards", 'year': "2013-14", 'deal': "Two shows."},
+                {'name': "Llamas", 'year': "2012"}]))
+        self.assertEqual(troupe_dict["Robots"]['blurb_year'], '')
+        with TroupeStore.TroupeStore(self.store_file) as store:
+            store.save_troupes(troupe_dict)
+            self.assertEqual(store.troupe_names(active_in=2013), [])
+            self.assertEqual(store.troupe_names(active_in=2012), ["Llamas"])
+        loaded = TroupeStore.load_store(self.store_file)
+        self.assertEqual(loaded, troupe_dict)
+        templates = ProcessTroupeData.load_template_files()
+        for troupe_name in troupe_dict:
+            self.assertEqual(
+                ProcessTroupeData.create_troupe_page(
+                    troupe_name, loaded[troupe_name], templates),
+                ProcessTroupeData.create_troupe_page(
+                    troupe_name, troupe_dict[troupe_name], templates))
+
+    def test_queries(self):
+        """Filters should match on year range, performer and class."""
+
+        with TroupeStore.TroupeStore(self.store_file) as store:
+            self.assertEqual(store.troupe_names(active_in=2013),
+                             ["Bills", "Lobsters"])
+            self.assertEqual(store.troupe_names(performer="Bob"),
+                             ["Bills", "Lobsters"])
+            self.assertEqual(store.troupe_names(performer="Cy",
+                                                active_in=2012), ["Bills"])
+            self.assertEqual(store.troupe_names(classification="extant"),
+                             ["Teacups"])
+            self.assertEqual(store.troupe_names(classification="never"),
+                             ["Lobsters"])
+            self.assertEqual(store.performers(), ["Ann", "Bob", "Cy"])
+            self.assertRaises(ValueError, store.troupe_names,
+                              classification="active")
+
+    def test_indexed_lookups(self):
+        """Year and performer lookups should use their indexes."""
+
+        with TroupeStore.TroupeStore(self.store_file) as store:
+            for query, index in (
+                    ("SELECT name FROM troupes WHERE start_number <= 2013 "
+                     "AND end_number >= 2013", "troupe_years"),
+                    ("SELECT troupe_id FROM cast_members WHERE "
+                     "performer = 'Bob'", "cast_performers")):
+                plan = " ".join(str(row[-1]) for row in
+                                store.connection.execute(
+                                    "EXPLAIN QUERY PLAN " + query))
+                self.assertTrue(index in plan, plan)
+
+    def test_store_as_source(self):
+        """process_troupe_data should read a store like a spreadsheet."""
+
+        self.assertEqual(
+            ProcessTroupeData.process_troupe_data(self.store_file),
+            self.troupe_dict)
+        self.assertFalse(TroupeStore.is_store("test/OneRow.ods"))
+        self.assertEqual(ProcessTroupeData.page_troupes(self.store_file,
+                                                        buffer_rows=10),
+                         self.troupe_dict)
+        self.assertRaises(ValueError, ProcessTroupeData.process_troupe_data,
+                          self.store_file, merge_names=True)
+        self.assertRaises(ValueError, ProcessTroupeData.process_troupe_data,
+                          self.store_file, "state.pickle")
+
+    def test_row_readers_refuse_stores(self):
+        """Modes that read spreadsheet rows should refuse a store."""
+
+        import sys
+        import PreviewServer
+        import TroupeWatcher
+        self.assertRaises(ValueError, TroupeWatcher.TroupeWatcher,
+                          [self.store_file])
+        self.assertRaises(ValueError, PreviewServer.TroupePreview,
+                          [self.store_file])
+        with open(os.devnull, "w") as devnull:
+            stderr, sys.stderr = sys.stderr, devnull
+            try:
+                for argv in (["check", self.store_file],
+                             ["pages", self.store_file, "--watch"],
+                             ["pages", self.store_file, "--list-duplicates"],
+                             ["preview", self.store_file]):
+                    self.assertRaises(SystemExit, ProcessTroupeData.main,
+                                      argv)
+            finally:
+                sys.stderr = stderr
+
+    def test_other_version(self):
+        """A store from another schema version shouldn't be opened."""
+
+        connection = sqlite3.connect(self.store_file)
+        connection.execute("PRAGMA user_version = %d" %
+                           (TroupeStore.STORE_VERSION + 1))
+        connection.close()
+        self.assertRaises(ValueError, TroupeStore.TroupeStore,
+                          self.store_file)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,100 @@
+"""Troupe Templates
+
+Loads templates/*_template.wiki once per process and compiles each into a
+CompiledTemplate that knows exactly which fields it uses, so rendering a
+page looks up only those fields instead of splatting the whole troupe
+dictionary into str.format.  The cache is keyed by template directory and
+reloads when any template file is added, removed or modified.
+"""
+
+import glob
+import os
+import re
+import string
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "templates")
+TEMPLATE_SUFFIX = "_template.wiki"
+
+# template directory -> (file mtimes, compiled templates)
+template_cache = {}
+
+
+class CompiledTemplate(object):
+    """A str.format template split up front into literals and fields."""
+
+    def __init__(self, text):
+        self.text = text
+        self.parts = []
+        fields = []
+        formatter = string.Formatter()
+        for literal, field_name, format_spec, conversion in \
+                formatter.parse(text):
+            if literal:
+                self.parts.append((literal, None, None, None))
+            if field_name is None:
+                continue
+            if not re.match(r'\w+$', field_name):
+                raise ValueError("unsupported template field: %r" %
+                                 field_name)
+            self.parts.append((None, field_name, format_spec, conversion))
+            if field_name not in fields:
+                fields.append(field_name)
+        self.fields = tuple(fields)
+
+    def render(self, data):
+        pieces = []
+        for literal, field_name, format_spec, conversion in self.parts:
+            if literal is not None:
+                pieces.append(literal)
+                continue
+            value = data[field_name]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            if format_spec or not isinstance(value, string_types):
+                value = format(value, format_spec)
+            pieces.append(value)
+        return u"".join(pieces)
+
+    # drop-in for the plain template strings this replaces
+    def format(self, **data):
+        return self.render(data)
+
+
+def compile_templates(texts):
+    return {name: CompiledTemplate(text) for name, text in texts.items()}
+
+
+def template_mtimes(template_dir):
+    pattern = os.path.join(template_dir, "*" + TEMPLATE_SUFFIX)
+    return {file_name: os.path.getmtime(file_name)
+            for file_name in glob.glob(pattern)}
+
+
+def read_templates(file_names):
+    texts = {}
+    for file_name in file_names:
+        field_name = os.path.basename(file_name)[:-len(TEMPLATE_SUFFIX)]
+        with open(file_name) as file_handle:
+            texts[field_name] = file_handle.read().decode('utf-8')
+    return texts
+
+
+def load_templates(template_dir=None):
+    """Returns the compiled templates in template_dir (default: templates/
+    next to this module), from the cache unless a file changed."""
+    template_dir = os.path.abspath(template_dir or TEMPLATE_DIR)
+    mtimes = template_mtimes(template_dir)
+    cached = template_cache.get(template_dir)
+    if cached and cached[0] == mtimes:
+        return cached[1]
+    templates = compile_templates(read_templates(mtimes))
+    template_cache[template_dir] = (mtimes, templates)
+    return templates
@@ -0,0 +1,60 @@
+import TroupeTemplates
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class ValidateTroupeTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_template(self, name, text, mtime):
+        file_name = os.path.join(self.temp_dir, name + "_template.wiki")
+        with open(file_name, "w") as file_handle:
+            file_handle.write(text)
+        os.utime(file_name, (mtime, mtime))
+
+    def test_compiled_matches_format(self):
+        """Compiled templates should render exactly like str.format."""
+
+        text = u"{{{{Box|{name}}}}} {years} '''{name}''' {count:>3}"
+        data = {"name": u"La Pe\xf1a", "years": "2010-2012", "count": 7,
+                "unused": "x"}
+        template = TroupeTemplates.CompiledTemplate(text)
+        self.assertEqual(template.fields, ("name", "years", "count"))
+        self.assertEqual(template.render(data), text.format(**data))
+
+    def test_cache_and_invalidation(self):
+        """Templates should load once and reload when a file changes."""
+
+        self.write_template("summary", "== {title} ==", 1000)
+        first = TroupeTemplates.load_templates(self.temp_dir)
+        self.assertTrue(TroupeTemplates.load_templates(self.temp_dir) is first)
+        self.assertEqual(first["summary"].render({"title": "A"}), "== A ==")
+
+        self.write_template("summary", "=== {title} ===", 2000)
+        second = TroupeTemplates.load_templates(self.temp_dir)
+        self.assertEqual(second["summary"].render({"title": "A"}),
+                         "=== A ===")
+
+    def test_repo_templates(self):
+        """The shipped templates should load from any working directory."""
+
+        saved_path = os.getcwd()
+        os.chdir(self.temp_dir)
+        try:
+            templates = TroupeTemplates.load_templates()
+        finally:
+            os.chdir(saved_path)
+        self.assertEqual(set(templates), {"blurb", "deal", "media",
+                                          "more_info", "related", "summary",
+                                          "troupe"})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,204 @@
+"""Troupe Watcher
+
+Keeps the page pipeline warm while the spreadsheet, the templates or
+extant_troupes.txt are being edited.  The parsed rows of every input file,
+the collated troupes, the compiled templates and the extant index stay in
+memory between checks, and each check redoes only what the change touched:
+
+  input file     that file is reread; troupes whose rows were added,
+                 changed or removed are re-collated (with the row diff
+                 TroupeState uses) and their pages rewritten, along
+                 with the pages of troupes whose related troupes changed
+  extant list    pages of troupes that moved in or out of it are rewritten
+  templates      every page is re-rendered, though PageWriter still only
+                 writes the ones whose text changed
+
+Changes are found by polling modification times, so nothing beyond the
+standard library is needed.  Each update reports how long it took and
+how long after the file was saved its pages were on disk.
+"""
+
+import os
+import time
+
+import ProcessTroupeData
+
+DEFAULT_INTERVAL = 1.0
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+class TroupeWatcher(object):
+    """Warm state for one set of input files; check() brings the pages up
+    to date with whatever changed since the last check."""
+
+    def __init__(self, filenames, merge_names=False, jobs=1,
+                 template_dir=None):
+        import PageWriter
+        import TroupeStore
+        self.filenames = list(filenames)
+        for filename in self.filenames:
+            if TroupeStore.is_store(filename):
+                raise ValueError("%s is a troupe store; watching needs the "
+                                 "spreadsheets" % filename)
+        self.merge_names = merge_names
+        self.jobs = jobs
+        self.template_dir = template_dir
+        self.signatures = {}   # watched path -> (mtime, size)
+        self.file_rows = {}    # input file -> its rows, as last read
+        self.troupe_rows = {}  # troupe name -> [(row hash, row)]
+        self.troupe_dict = {}
+        self.page_files = {}   # troupe name -> its page's file name
+        self.templates = None
+        self.extant_troupes = None
+        self.related = {}      # troupe name -> its related troupes
+        self.manifest = PageWriter.load_manifest()
+
+    def changed_paths(self, paths):
+        changed = []
+        for path in paths:
+            signature = file_signature(path)
+            if signature != self.signatures.get(path):
+                self.signatures[path] = signature
+                changed.append(path)
+        return changed
+
+    def update_rows(self, changed_files):
+        import TroupeState
+        # read everything that changed before touching any state, so a
+        # file caught half saved leaves the last good pages in place
+        new_file_rows = dict(
+            (filename, list(ProcessTroupeData.load_troupe_info(filename)))
+            for filename in changed_files)
+        self.file_rows.update(new_file_rows)
+
+        table = [row for filename in self.filenames
+                 for row in self.file_rows.get(filename, ())]
+        if self.merge_names:
+            table, _ = ProcessTroupeData.merge_troupe_names(table)
+        new_rows = TroupeState.group_rows(table)
+        changes = TroupeState.diff_troupe_rows(self.troupe_rows, new_rows)
+
+        for troupe_name in changes['removed']:
+            del self.troupe_dict[troupe_name]
+        for troupe_name in changes['added'] | changes['changed']:
+            self.troupe_dict.pop(troupe_name, None)
+            ProcessTroupeData.collate_rows(
+                [row for _, row in new_rows[troupe_name]], self.troupe_dict)
+        self.troupe_rows = new_rows
+        return changes['added'] | changes['changed'] | changes['removed']
+
+    def update_extant(self):
+        old_extant = self.extant_troupes
+        self.extant_troupes = ProcessTroupeData.get_extant_troupes()
+        if old_extant is None:
+            return set()
+        moved = old_extant ^ self.extant_troupes
+        return set(troupe_name for troupe_name in self.troupe_dict
+                   if ProcessTroupeData.standardize_troupe_name(troupe_name)
+                   in moved)
+
+    def check(self):
+        """Returns a report of the update, or None if nothing changed."""
+        import TroupeTemplates
+        import PageWriter
+
+        first = self.templates is None
+        changed_files = self.changed_paths(self.filenames)
+        extant_changed = self.changed_paths(
+            [ProcessTroupeData.EXTANT_TROUPES_FILE])
+        templates = ProcessTroupeData.load_template_files(self.template_dir)
+        templates_changed = templates is not self.templates
+        if not (changed_files or extant_changed or templates_changed):
+            return None
+
+        start = time.time()
+        changed_at = [self.signatures[path][0]
+                      for path in changed_files + extant_changed
+                      if self.signatures[path]]
+        if templates_changed:
+            changed_at.extend(TroupeTemplates.template_mtimes(
+                self.template_dir or TroupeTemplates.TEMPLATE_DIR).values())
+
+        affected = set()
+        # merged names can resolve to extant spellings, so a new extant
+        # list can rename troupes too
+        rows_changed = changed_files or (extant_changed and self.merge_names)
+        if rows_changed:
+            affected |= self.update_rows(changed_files)
+        if extant_changed or first:
+            affected |= self.update_extant()
+        self.templates = templates
+        full = first or templates_changed
+        if rows_changed or full:
+            related = ProcessTroupeData.troupe_relations(self.troupe_dict,
+                                                         templates) or {}
+            affected |= set(troupe_name for troupe_name in
+                            set(related) | set(self.related)
+                            if related.get(troupe_name) !=
+                            self.related.get(troupe_name))
+            self.related = related
+        if full:
+            affected = set(self.troupe_dict)
+
+        replaced = None
+        if not full:
+            replaced = [self.page_files.pop(troupe_name)
+                        for troupe_name in affected
+                        if troupe_name in self.page_files]
+        rendered = dict((troupe_name, self.troupe_dict[troupe_name])
+                        for troupe_name in affected
+                        if troupe_name in self.troupe_dict)
+        results = ProcessTroupeData.map_troupe_pages(
+            ProcessTroupeData.output_troupe_item, rendered, templates,
+            self.extant_troupes, self.jobs if full else 1, self.manifest,
+            self.related)
+        for troupe_name, (file_name, _, _) in zip(rendered, results):
+            self.page_files[troupe_name] = file_name
+
+        pages = PageWriter.update_manifest(self.manifest, results, replaced)
+        PageWriter.save_manifest(self.manifest)
+        finished = time.time()
+        latency = finished - max(changed_at) if changed_at else None
+        return {'changed': changed_files + extant_changed +
+                (["templates"] if templates_changed else []),
+                'troupes': len(affected),
+                'pages': pages,
+                'seconds': finished - start,
+                'latency': latency}
+
+
+def print_update(report):
+    import PageWriter
+    print("%s changed: %d troupes redone in %.2fs%s" % (
+        ", ".join(report['changed']), report['troupes'], report['seconds'],
+        " (%.2fs after the change)" % report['latency']
+        if report['latency'] is not None else ""))
+    PageWriter.print_report(report['pages'])
+
+
+def watch(filenames, merge_names=False, jobs=1, interval=DEFAULT_INTERVAL):
+    """Regenerates pages whenever an input file, a template or the extant
+    troupes list changes, until interrupted."""
+    watcher = TroupeWatcher(filenames, merge_names, jobs)
+    print("Watching %s (Ctrl-C to stop)" % ", ".join(filenames))
+    try:
+        while True:
+            try:
+                report = watcher.check()
+            except Exception as e:
+                # most likely a file caught half saved; the next save
+                # triggers another try
+                print("Update failed: %s" % (str(e) or e.__class__.__name__))
+            else:
+                if report:
+                    print_update(report)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
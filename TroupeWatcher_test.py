@@ -0,0 +1,141 @@
+import GenerateTroupeData
+import TroupeWatcher
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+
+class ValidateTroupeWatcher(unittest.TestCase):
+
+    def setUp(self):
+        # the tests change directory, and modules imported lazily must
+        # still be found from there
+        self.old_path = sys.path[:]
+        sys.path[:] = [os.path.abspath(path) for path in sys.path]
+        self.old_dir = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+        self.clock = 1000000000
+        os.mkdir("templates")
+        for name in ("blurb", "deal", "summary", "more_info", "media"):
+            self.write_template(name, u"")
+        self.write_template("troupe", u"{name} {years}{other_categories}")
+        self.write_extant([])
+        self.rows = [GenerateTroupeData.HEADERS,
+                     self.row("Tiny Robots", "2010"),
+                     self.row("Blue Llamas", "2011"),
+                     self.row("Blue Llamas", "2012")]
+        self.write_input()
+        self.watcher = TroupeWatcher.TroupeWatcher(["troupes.csv"],
+                                                   template_dir="templates")
+
+    def tearDown(self):
+        os.chdir(self.old_dir)
+        shutil.rmtree(self.temp_dir)
+        sys.path[:] = self.old_path
+
+    def row(self, name, year):
+        row = [""] * len(GenerateTroupeData.HEADERS)
+        row[1] = name
+        row[11] = "Yes"
+        row[22] = year
+        return row
+
+    # gives every write its own (past) modification time, so a rewrite
+    # within the same clock tick still counts as a change
+    def touch(self, file_name):
+        self.clock += 1
+        os.utime(file_name, (self.clock, self.clock))
+
+    def write_template(self, name, text, touch=False):
+        file_name = os.path.join("templates", name + "_template.wiki")
+        with open(file_name, "w") as file_handle:
+            file_handle.write(text.encode('utf-8'))
+        if touch:
+            self.touch(file_name)
+
+    def write_extant(self, names):
+        with open("extant_troupes.txt", "w") as file_handle:
+            file_handle.write("\n".join(names) + "\n")
+        self.touch("extant_troupes.txt")
+
+    def write_input(self):
+        GenerateTroupeData.write_csv("troupes.csv", self.rows)
+        self.touch("troupes.csv")
+
+    def pages(self):
+        return sorted(name for name in os.listdir(".")
+                      if name.endswith(".wiki") and "template" not in name)
+
+    def test_first_check(self):
+        """The first check should write every page, the next nothing."""
+
+        report = self.watcher.check()
+        self.assertEqual(report['troupes'], 2)
+        self.assertEqual(len(report['pages']['added']), 2)
+        self.assertTrue(report['latency'] >= 0)
+        self.assertEqual(self.watcher.check(), None)
+
+    def test_changed_rows(self):
+        """Only troupes whose rows changed should be redone."""
+
+        self.watcher.check()
+        self.rows[3] = self.row("Blue Llamas", "2014")
+        self.rows.append(self.row("Quiet Doctors", "2013"))
+        self.write_input()
+        report = self.watcher.check()
+        self.assertEqual(report['troupes'], 2)
+        self.assertEqual(len(report['pages']['changed']), 1)
+        self.assertEqual(len(report['pages']['added']), 1)
+
+        del self.rows[1]
+        self.write_input()
+        report = self.watcher.check()
+        self.assertEqual(report['troupes'], 1)
+        self.assertEqual(len(report['pages']['removed']), 1)
+        self.assertEqual(len(self.pages()), 2)
+
+    def test_extant_change(self):
+        """A troupe joining the extant list should move its page."""
+
+        self.watcher.check()
+        self.write_extant(["Tiny Robots"])
+        report = self.watcher.check()
+        self.assertEqual(report['troupes'], 1)
+        self.assertEqual(len(report['pages']['added']), 1)
+        self.assertEqual(len(report['pages']['removed']), 1)
+        self.assertTrue(any("extant" in page for page in self.pages()))
+
+    def test_template_change(self):
+        """A template change should re-render every page."""
+
+        self.watcher.check()
+        self.write_template("troupe", u"{name}!", touch=True)
+        report = self.watcher.check()
+        self.assertEqual(report['troupes'], 2)
+        self.assertEqual(len(report['pages']['changed']), 2)
+
+    def test_related_change(self):
+        """A cast change should also rewrite the pages of troupes it comes
+        to share a performer with."""
+
+        self.write_template("related", u"{related_list}")
+        self.write_template("troupe", u"{name} {years}{related_section}")
+        self.rows[1][4] = "Ann, Bo"
+        self.rows[2][4] = "Cy"
+        self.rows.append(self.row("Quiet Doctors", "2013"))
+        self.rows[-1][4] = "Ann"
+        self.write_input()
+        self.watcher.check()
+        self.rows[2][4] = "Cy, Bo"
+        self.write_input()
+        report = self.watcher.check()
+        # Blue Llamas, and Tiny Robots, which it now shares Bo with
+        self.assertEqual(report['troupes'], 2)
+        self.assertEqual(len(report['pages']['changed']), 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,125 @@
+"""Wiki Dump
+
+Streams troupe pages into MediaWiki XML dumps that Special:Import (or
+importDump.php) takes in one go, instead of thousands of .wiki files.
+Each page is written out as soon as it's rendered, so memory use doesn't
+grow with the number of pages, and dumps can be gzip-compressed on the
+way out.  A dump is written under a temporary name and renamed into
+place when it's complete.
+"""
+
+import time
+from xml.sax.saxutils import escape
+
+import TroupeProfile
+
+EXPORT_NAMESPACE = "http://www.mediawiki.org/xml/export-0.10/"
+CONTRIBUTOR = "TroupeProcessor"
+COMMENT = "Imported from the troupe applications"
+
+DUMP_HEADER = u"""<mediawiki xmlns="%s" version="0.10" xml:lang="en">
+""" % EXPORT_NAMESPACE
+
+PAGE_XML = u"""  <page>
+    <title>%(title)s</title>
+    <ns>0</ns>
+    <revision>
+      <timestamp>%(timestamp)s</timestamp>
+      <contributor>
+        <username>%(contributor)s</username>
+      </contributor>
+      <comment>%(comment)s</comment>
+      <model>wikitext</model>
+      <format>text/x-wiki</format>
+      <text xml:space="preserve" bytes="%(bytes)d">%(text)s</text>
+    </revision>
+  </page>
+"""
+
+DUMP_FOOTER = u"""</mediawiki>
+"""
+
+
+def to_unicode(text):
+    if isinstance(text, bytes):
+        return text.decode('utf8')
+    return text
+
+
+class DumpWriter(object):
+    """One dump file, written page by page.
+
+    with DumpWriter("troupes.xml.gz", compress=True) as dump:
+        dump.write_page(title, text)
+    """
+
+    def __init__(self, file_name, compress=False, timestamp=None,
+                 contributor=CONTRIBUTOR, comment=COMMENT):
+        import gzip
+        self.file_name = file_name
+        self.temp_name = file_name + ".tmp"
+        if compress:
+            self.file_handle = gzip.open(self.temp_name, "wb")
+        else:
+            self.file_handle = open(self.temp_name, "wb")
+        self.revision = {
+            'timestamp': timestamp or time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                                                    time.gmtime()),
+            'contributor': escape(contributor),
+            'comment': escape(comment)}
+        self.pages = 0
+        self.write(DUMP_HEADER)
+
+    def write(self, text):
+        data = text.encode('utf8')
+        self.file_handle.write(data)
+        TroupeProfile.count("write", bytes=len(data))
+
+    def write_page(self, title, text):
+        text = to_unicode(text)
+        page = dict(self.revision, title=escape(to_unicode(title).strip()),
+                    text=escape(text), bytes=len(text.encode('utf8')))
+        self.write(PAGE_XML % page)
+        self.pages += 1
+
+    def close(self):
+        import PageWriter
+        self.write(DUMP_FOOTER)
+        self.file_handle.close()
+        PageWriter.replace_file(self.temp_name, self.file_name)
+
+    def abandon(self):
+        import os
+        self.file_handle.close()
+        if os.path.exists(self.temp_name):
+            os.remove(self.temp_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abandon()
+        return False
+
+
+def write_dumps(pages, dump_files, compress=False, timestamp=None):
+    """Streams (group, title, text) triples into the dump file for each
+    group, as given by dump_files (group -> file name), and returns the
+    number of pages written to each file.  Every dump is written, even
+    one whose group has no pages, so no stale dump is left behind."""
+    dumps = {}
+    try:
+        for group, file_name in dump_files.items():
+            dumps[group] = DumpWriter(file_name, compress, timestamp)
+        for group, title, text in pages:
+            dumps[group].write_page(title, text)
+    except BaseException:
+        for dump in dumps.values():
+            dump.abandon()
+        raise
+    for dump in dumps.values():
+        dump.close()
+    return dict((dump.file_name, dump.pages) for dump in dumps.values())
@@ -0,0 +1,70 @@
+import WikiDump
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+NAMESPACE = "{%s}" % WikiDump.EXPORT_NAMESPACE
+
+
+class ValidateWikiDump(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def dump_file(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def read_pages(self, file_handle):
+        root = ElementTree.parse(file_handle).getroot()
+        return [(page.find(NAMESPACE + "title").text,
+                 page.find(NAMESPACE + "revision/" + NAMESPACE + "text").text)
+                for page in root.findall(NAMESPACE + "page")]
+
+    def test_dump_pages(self):
+        """Pages should round-trip through the dump, markup and all."""
+
+        file_name = self.dump_file("troupes.xml")
+        with WikiDump.DumpWriter(file_name) as dump:
+            dump.write_page(u"La Pe\xf1a ", u"{{Box}} <b>a & b</b>\n")
+            dump.write_page("$3 Bills", "[[Category:Duos]]")
+        with open(file_name, "rb") as file_handle:
+            self.assertEqual(self.read_pages(file_handle), [
+                (u"La Pe\xf1a", u"{{Box}} <b>a & b</b>\n"),
+                ("$3 Bills", "[[Category:Duos]]")])
+        self.assertEqual(os.listdir(self.temp_dir), ["troupes.xml"])
+
+    def test_write_dumps(self):
+        """Each group should get its own dump, compressed if asked."""
+
+        counts = WikiDump.write_dumps(
+            [("a", "One", "1"), ("a", "Two", "2")],
+            {"a": self.dump_file("a.xml.gz"), "b": self.dump_file("b.xml.gz")},
+            compress=True)
+        self.assertEqual(counts, {self.dump_file("a.xml.gz"): 2,
+                                  self.dump_file("b.xml.gz"): 0})
+        with gzip.open(self.dump_file("a.xml.gz")) as file_handle:
+            self.assertEqual(self.read_pages(file_handle),
+                             [("One", "1"), ("Two", "2")])
+        with gzip.open(self.dump_file("b.xml.gz")) as file_handle:
+            self.assertEqual(self.read_pages(file_handle), [])
+
+    def test_failed_dump(self):
+        """A run that fails part way should leave no dump behind."""
+
+        def pages():
+            yield ("a", "One", "1")
+            raise ValueError("render failed")
+
+        with self.assertRaises(ValueError):
+            WikiDump.write_dumps(pages(), {"a": self.dump_file("a.xml")})
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,248 @@
+"""Wiki Publisher
+
+Publishes troupe pages straight to a wiki through the MediaWiki action
+API, instead of pasting them in by hand.  The session logs in once, and
+every request goes over PhotoDownloader's pooled keep-alive connections,
+so publishing thousands of pages doesn't mean thousands of handshakes.
+
+Pages are taken a batch at a time.  The current revision of every page in
+a batch comes back from one multi-title query, and pages whose SHA-1
+already matches the text are skipped.  The rest are edited across a few
+worker threads.  Every request carries maxlag, and when the wiki answers
+that it's lagged, rate limited or overloaded, the request is retried
+after the wait the wiki asked for (or an exponential backoff).
+"""
+
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+
+import PhotoDownloader
+
+try:
+    import httplib
+    from urllib import urlencode
+except ImportError:
+    import http.client as httplib
+    from urllib.parse import urlencode
+
+DEFAULT_JOBS = 4
+DEFAULT_BATCH = 50
+DEFAULT_TIMEOUT = 60
+DEFAULT_MAXLAG = 5
+MAX_RETRIES = 5
+SUMMARY = "Updated from the troupe applications"
+USER_AGENT = "TroupeProcessor (troupe page publisher)"
+
+# error codes that mean "not now" rather than "no"
+RETRY_CODES = ("maxlag", "ratelimited", "readonly")
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Set-Cookie headers come back joined with commas, which cookie expiry
+# dates contain too; split only where a new name=value starts
+COOKIE_SPLIT = re.compile(r",\s*(?=[^;,=\s]+=)")
+
+
+class WikiError(Exception):
+    pass
+
+
+# the text as the wiki would store it: the templates' byte order marks
+# dropped, CRLF line endings made LF and trailing whitespace stripped, so
+# its SHA-1 can match the wiki's
+def wiki_text(text):
+    return text.replace(u"\ufeff", u"").replace(u"\r\n", u"\n").rstrip()
+
+
+def content_hash(text):
+    return hashlib.sha1(wiki_text(text).encode('utf8')).hexdigest()
+
+
+class WikiSession(object):
+    """A logged-in session with one wiki's api.php, safe to share between
+    threads."""
+
+    def __init__(self, api_url, timeout=DEFAULT_TIMEOUT,
+                 maxlag=DEFAULT_MAXLAG, max_retries=MAX_RETRIES):
+        self.api_url = api_url
+        self.maxlag = maxlag
+        self.max_retries = max_retries
+        self.pool = PhotoDownloader.ConnectionPool(timeout)
+        self.cookies = {}
+        self.lock = threading.Lock()
+        self.sleep = time.sleep
+
+    def save_cookies(self, header):
+        with self.lock:
+            for cookie in COOKIE_SPLIT.split(header):
+                name, _, value = cookie.split(";")[0].partition("=")
+                if name.strip():
+                    self.cookies[name.strip()] = value.strip()
+
+    def headers(self):
+        with self.lock:
+            cookie = "; ".join("%s=%s" % item
+                               for item in sorted(self.cookies.items()))
+        headers = {'User-Agent': USER_AGENT,
+                   'Content-Type': "application/x-www-form-urlencoded"}
+        if cookie:
+            headers['Cookie'] = cookie
+        return headers
+
+    def call(self, **params):
+        """POSTs an API request and returns its decoded JSON, retrying
+        while the wiki says to wait.  Raises WikiError for API errors."""
+        params.update(format="json", formatversion="2")
+        if self.maxlag is not None:
+            params['maxlag'] = str(self.maxlag)
+        body = urlencode(sorted(
+            (name, value.encode('utf8') if not isinstance(value, bytes)
+             else value) for name, value in params.items()))
+
+        for attempt in range(self.max_retries + 1):
+            status, headers, content = self.pool.request(
+                'POST', self.api_url, self.headers(), body)
+            if 'set-cookie' in headers:
+                self.save_cookies(headers['set-cookie'])
+            if status in RETRY_STATUSES:
+                code = "HTTP %d" % status
+            elif status != 200:
+                raise WikiError("HTTP %d" % status)
+            else:
+                result = json.loads(content.decode('utf8'))
+                error = result.get('error')
+                if not error:
+                    return result
+                code = error.get('code')
+                if code not in RETRY_CODES:
+                    raise WikiError("%s: %s" % (code, error.get('info')))
+            if attempt < self.max_retries:
+                self.sleep(retry_delay(headers, attempt))
+        raise WikiError("gave up after %d tries (%s)" %
+                        (self.max_retries + 1, code))
+
+    def login(self, user, password):
+        token = self.call(action="query", meta="tokens", type="login")
+        result = self.call(action="login", lgname=user,
+                           lgpassword=password,
+                           lgtoken=token['query']['tokens']['logintoken'])
+        if result['login']['result'] != "Success":
+            raise WikiError("login failed: %s" %
+                            result['login'].get('reason',
+                                                result['login']['result']))
+
+    def csrf_token(self):
+        return self.call(action="query",
+                         meta="tokens")['query']['tokens']['csrftoken']
+
+    def close(self):
+        self.pool.close()
+
+
+def retry_delay(headers, attempt):
+    try:
+        return max(0, int(headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return min(2 ** attempt, 60)
+
+
+def current_hashes(session, titles):
+    """Returns title -> SHA-1 of the wiki's current text, or None for
+    pages the wiki doesn't have, for titles in one query."""
+    result = session.call(action="query", prop="revisions", rvprop="sha1",
+                          titles="|".join(titles))
+    query = result.get('query', {})
+    # the wiki answers with its own spelling of each title ("troupe" ->
+    # "Troupe"), so map its titles back to ours
+    ours = dict((title, title) for title in titles)
+    for normalized in query.get('normalized', ()):
+        ours[normalized['to']] = normalized['from']
+    hashes = dict((title, None) for title in titles)
+    for page in query.get('pages', ()):
+        revisions = page.get('revisions')
+        title = ours.get(page['title'], page['title'])
+        if revisions and not page.get('missing'):
+            hashes[title] = revisions[0].get('sha1')
+    return hashes
+
+
+def edit_page(session, token, title, text, summary):
+    result = session.call(action="edit", title=title, text=text,
+                          summary=summary, bot="1", token=token,
+                          md5=hashlib.md5(text.encode('utf8')).hexdigest())
+    edit = result.get('edit', {})
+    if edit.get('result') != "Success":
+        raise WikiError("edit not saved: %s" % json.dumps(edit))
+    return 'created' if edit.get('new') else 'edited'
+
+
+def batches(pages, batch_size):
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def publish_pages(pages, api_url, user=None, password=None,
+                  jobs=DEFAULT_JOBS, batch_size=DEFAULT_BATCH,
+                  summary=SUMMARY, timeout=DEFAULT_TIMEOUT,
+                  maxlag=DEFAULT_MAXLAG):
+    """Publishes (title, text) pairs, returning a report dict.
+
+    The report lists the titles 'created', 'edited' and left 'unchanged',
+    and the (title, error) pairs that 'failed'.  Without a user, edits are
+    made anonymously.
+    """
+    from multiprocessing.pool import ThreadPool
+
+    session = WikiSession(api_url, timeout, maxlag)
+    threads = ThreadPool(max(1, jobs))
+    report = {'created': [], 'edited': [], 'unchanged': [], 'failed': []}
+    try:
+        if user:
+            session.login(user, password)
+        token = session.csrf_token()
+
+        def publish(page):
+            title, text = page
+            try:
+                return title, edit_page(session, token, title, text, summary)
+            except (WikiError, httplib.HTTPException, socket.error,
+                    ValueError) as e:
+                return title, e
+
+        for batch in batches(pages, batch_size):
+            hashes = current_hashes(session, [title for title, _ in batch])
+            changed = []
+            for title, text in batch:
+                text = wiki_text(text)
+                if hashes[title] == content_hash(text):
+                    report['unchanged'].append(title)
+                else:
+                    changed.append((title, text))
+            for title, result in threads.imap(publish, changed):
+                if isinstance(result, Exception):
+                    report['failed'].append(
+                        (title, str(result) or result.__class__.__name__))
+                else:
+                    report[result].append(title)
+    finally:
+        threads.close()
+        threads.join()
+        session.close()
+    return report
+
+
+def print_report(report):
+    print("Wiki: %d created, %d edited, %d unchanged, %d failed" %
+          (len(report['created']), len(report['edited']),
+           len(report['unchanged']), len(report['failed'])))
+    for title, error in sorted(report['failed']):
+        print((u"  %s: %s" % (title, error)).encode('utf8'))
@@ -0,0 +1,207 @@
+import WikiPublisher
+import hashlib
+import json
+import threading
+import unittest
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+
+
+class FakeWikiHandler(BaseHTTPRequestHandler):
+    """Just enough of api.php: login and CSRF tokens, revision SHA-1s for
+    several titles, and edits, which are refused with maxlag while the
+    server's lag count lasts."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        params = dict((name, values[0].decode("utf8")
+                       if isinstance(values[0], bytes) else values[0])
+                      for name, values in parse_qs(
+                          self.rfile.read(length)).items())
+        server = self.server
+        with server.lock:
+            server.requests.append((params.get("action"), self.client_address))
+            response, headers = self.respond(server, params)
+        body = json.dumps(response).encode("utf8")
+        self.send_response(200)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def logged_in(self):
+        return "session=s3cret" in self.headers.get("Cookie", "")
+
+    def respond(self, server, params):
+        action = params.get("action")
+        if action == "login":
+            if params.get("lgpassword") != "pw":
+                return {"login": {"result": "Failed",
+                                  "reason": "Wrong password"}}, []
+            return {"login": {"result": "Success"}}, [
+                ("Set-Cookie", "session=s3cret; expires=Wed, 21 Oct 2037 "
+                 "07:28:00 GMT; path=/; HttpOnly")]
+        if params.get("meta") == "tokens":
+            if params.get("type") == "login":
+                return {"query": {"tokens": {"logintoken": "L+\\"}}}, []
+            token = "C+\\" if self.logged_in() else "+\\"
+            return {"query": {"tokens": {"csrftoken": token}}}, []
+        if params.get("prop") == "revisions":
+            normalized = []
+            pages = []
+            for title in params["titles"].split("|"):
+                wiki_title = title[0].upper() + title[1:]
+                if wiki_title != title:
+                    normalized.append({"from": title, "to": wiki_title})
+                if wiki_title in server.pages:
+                    pages.append({"title": wiki_title, "revisions": [
+                        {"sha1": hashlib.sha1(server.pages[wiki_title]
+                                              .encode("utf8")).hexdigest()}]})
+                else:
+                    pages.append({"title": wiki_title, "missing": True})
+            return {"query": {"normalized": normalized, "pages": pages}}, []
+        if action == "edit":
+            if server.lag:
+                server.lag -= 1
+                return {"error": {"code": "maxlag",
+                                  "info": "Waiting for a database server"}}, \
+                    [("Retry-After", "0")]
+            if params.get("token") != ("C+\\" if self.logged_in() else "+\\"):
+                return {"error": {"code": "badtoken",
+                                  "info": "Invalid CSRF token."}}, []
+            title = params["title"][0].upper() + params["title"][1:]
+            new = title not in server.pages
+            # MediaWiki saves LF line endings, without trailing whitespace
+            server.pages[title] = params["text"].replace("\r\n",
+                                                         "\n").rstrip()
+            return {"edit": {"result": "Success", "title": title,
+                             "new": new}}, []
+        return {"error": {"code": "badvalue", "info": "?"}}, []
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeWiki(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ValidateWikiPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWiki(("127.0.0.1", 0), FakeWikiHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.pages = {"Bills": u"Old text"}
+        self.server.lag = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.api = "http://127.0.0.1:%d/w/api.php" % \
+            self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def publish(self, pages, **options):
+        options.setdefault("user", "Bot")
+        options.setdefault("password", "pw")
+        return WikiPublisher.publish_pages(pages, self.api, **options)
+
+    def actions(self, action):
+        return [client for name, client in self.server.requests
+                if name == action]
+
+    def test_publish_and_skip(self):
+        """New and changed pages are saved; a rerun edits nothing."""
+
+        pages = [(u"Bills", u"New text\n"), (u"lobsters", u"Claws\n"),
+                 (u"Teacups", u"Tea\n")]
+        report = self.publish(pages)
+        self.assertEqual(sorted(report['created']), [u"Teacups", u"lobsters"])
+        self.assertEqual(report['edited'], [u"Bills"])
+        self.assertEqual(self.server.pages[u"Lobsters"], u"Claws")
+
+        self.server.requests = []
+        report = self.publish(pages)
+        self.assertEqual(sorted(report['unchanged']),
+                         [u"Bills", u"Teacups", u"lobsters"])
+        self.assertEqual(self.actions("edit"), [])
+
+    def test_rendered_text(self):
+        """Pages rendered from the templates, with their byte order marks
+        and CRLF line endings, should match once published."""
+
+        pages = [(u"Teacups", u"\ufeff{{Infobox Troupe\r\n|Name = Teacups"
+                  u"\r\n}}\r\n\ufeff== Media ==\r\n\r\n")]
+        self.assertEqual(self.publish(pages)['created'], [u"Teacups"])
+        self.assertEqual(self.server.pages[u"Teacups"],
+                         u"{{Infobox Troupe\n|Name = Teacups\n}}\n"
+                         u"== Media ==")
+        report = self.publish(pages)
+        self.assertEqual(report['unchanged'], [u"Teacups"])
+        self.assertEqual(len(self.actions("edit")), 1)
+
+    def test_batched_queries(self):
+        """Revisions should be looked up one batch of titles at a time."""
+
+        pages = [(u"Troupe %d" % index, u"text") for index in range(7)]
+        self.publish(pages, batch_size=3)
+        queries = [params for params in self.server.requests
+                   if params[0] == "query"]
+        # login token, CSRF token, then three revision batches
+        self.assertEqual(len(queries), 5)
+
+    def test_keep_alive(self):
+        """Each thread should make all its requests over one connection."""
+
+        self.publish([(u"Troupe %d" % index, u"text") for index in range(5)],
+                     jobs=1)
+        # the main thread's, for logging in and queries, and the worker's
+        clients = set(client for _, client in self.server.requests)
+        self.assertEqual(len(clients), 2)
+        self.assertEqual(len(self.server.requests), 9)
+
+    def test_maxlag_backoff(self):
+        """A lagged wiki should be waited out, not counted as a failure."""
+
+        self.server.lag = 2
+        report = self.publish([(u"Teacups", u"Tea")], jobs=1)
+        self.assertEqual(report['created'], [u"Teacups"])
+        self.assertEqual(len(self.actions("edit")), 3)
+
+        self.server.lag = WikiPublisher.MAX_RETRIES + 1
+        report = self.publish([(u"Wizards", u"Hats")], jobs=1)
+        self.assertEqual(len(report['failed']), 1)
+        self.assertTrue("maxlag" in report['failed'][0][1])
+
+    def test_login_failure(self):
+        """A wrong password should stop publishing before any edit."""
+
+        self.assertRaises(WikiPublisher.WikiError, self.publish,
+                          [(u"Teacups", u"Tea")], password="wrong")
+        self.assertEqual(self.actions("edit"), [])
+
+    def test_cookie_split(self):
+        """Joined Set-Cookie headers split where a new cookie starts."""
+
+        session = WikiPublisher.WikiSession(self.api)
+        session.save_cookies("a=1; expires=Wed, 21 Oct 2037 07:28:00 GMT; "
+                             "path=/, b=2; HttpOnly")
+        self.assertEqual(session.cookies, {"a": "1", "b": "2"})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)